@@ -0,0 +1,151 @@
+import re
+import streamlit as st
+
+# ---------------- PHRASE LISTS ----------------
+# Ops can extend any list without a deploy via secrets.toml:
+#
+#   [answer_phrases]
+#   property_related = ["ask the host"]
+#   unable = ["no details about"]
+PROPERTY_RELATED_PHRASES = [
+    "pass this question to the property manager",
+    "property manager or owner",
+    "contact the property"
+]
+
+NON_PROPERTY_PHRASES = [
+    "not available in the guidebook",
+    "not relevant to the property",
+    "not related to this property",
+    "outside the scope of this guidebook",
+    "not covered in this guidebook"
+]
+
+UNABLE_PHRASES = [
+    "not in the guidebook",
+    "don't have information",
+    "cannot find",
+    "not mentioned",
+    "doesn't contain",
+    "no information about",
+    "not covered",
+    "not included",
+    "i don't know",
+    "i'm not sure",
+    "unable to answer"
+]
+
+# Highest priority first: (config key, defaults, reason template, is_property_related)
+CATEGORIES = [
+    ("property_related", PROPERTY_RELATED_PHRASES, "Property-related: '{}'", True),
+    ("non_property", NON_PROPERTY_PHRASES, "Non-property-related: '{}'", False),
+    ("unable", UNABLE_PHRASES, "Response contained: '{}'", False),
+]
+
+def load_phrase_groups() -> list[list[str]]:
+    """Default phrase lists extended with any [answer_phrases] entries from secrets"""
+    extra = st.secrets.get("answer_phrases", {})
+    groups = []
+    for key, defaults, _, _ in CATEGORIES:
+        phrases = list(defaults)
+        for phrase in extra.get(key, []):
+            phrase = str(phrase).strip().lower()
+            if phrase and phrase not in phrases:
+                phrases.append(phrase)
+        groups.append(phrases)
+    return groups
+
+# ---------------- COMPILER ----------------
+def _trie_pattern(phrases: list[str]) -> str:
+    """Regex for a character trie of the phrases, so shared prefixes are scanned once"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in node.items() if ch != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+# Below this many phrases CPython's C-level `in` scans beat a compiled regex
+# (see bench/classifier_bench.py), so the automaton only kicks in for long lists.
+AUTOMATON_MIN_PHRASES = int(st.secrets.get("ANSWER_AUTOMATON_MIN_PHRASES", 300))
+
+class AnswerClassifier:
+    """
+    Phrase lists compiled once into a priority-ordered matcher.
+
+    Small lists are scanned in priority order with `in`, stopping at the first
+    hit. Long lists use one trie-shaped regex: a plain search rejects replies
+    with no phrase at all (the common, answered case) in a single pass, and only
+    hits get a lookahead pass that sees overlapping phrases so the best
+    (category, list position) rank wins. Both reproduce the original
+    "first list, first phrase" priority rules exactly.
+    """
+
+    def __init__(self, phrase_groups: list[list[str]], use_automaton: bool = None):
+        self.rank = {}
+        for category, phrases in enumerate(phrase_groups):
+            for position, phrase in enumerate(phrases):
+                self.rank.setdefault(phrase.lower(), (category, position))
+        self.ordered = tuple(sorted(self.rank, key=self.rank.get))
+        if use_automaton is None:
+            use_automaton = len(self.rank) >= AUTOMATON_MIN_PHRASES
+        self.use_automaton = use_automaton and bool(self.rank)
+        if self.use_automaton:
+            trie = _trie_pattern(list(self.rank))
+            self.any_pattern = re.compile(trie)
+            # Lookahead makes matches zero-width so overlapping phrases are all seen
+            self.all_pattern = re.compile("(?=(" + trie + "))")
+            # The trie reports the longest phrase at each position; a shorter
+            # phrase that is its prefix also matched there and may outrank it.
+            self.best_at = {
+                phrase: min((self.rank[phrase[:k]], phrase[:k])
+                             for k in range(1, len(phrase) + 1) if phrase[:k] in self.rank)
+                for phrase in self.rank
+            }
+
+    def best_match(self, text: str):
+        """Return (category index, phrase) of the highest-priority phrase in text, or None"""
+        lower = text.lower()
+        if not self.use_automaton:
+            for phrase in self.ordered:
+                if phrase in lower:
+                    return self.rank[phrase][0], phrase
+            return None
+
+        if self.any_pattern.search(lower) is None:
+            return None
+        best = None
+        for match in self.all_pattern.finditer(lower):
+            found = self.best_at.get(match.group(1))
+            if found is not None and (best is None or found < best):
+                best = found
+                if best[0] == (0, 0):
+                    break
+        return (best[0][0], best[1]) if best else None
+
+    def classify(self, response: str) -> tuple[bool, str, bool]:
+        """Returns: (was_answered: bool, reason: str, is_property_related: bool)"""
+        match = self.best_match(response)
+        if match is None:
+            return True, "Answered successfully", False
+        category, phrase = match
+        _, _, template, is_property_related = CATEGORIES[category]
+        return False, template.format(phrase), is_property_related
+
+_classifier = None
+
+def get_classifier() -> AnswerClassifier:
+    """Compiled once per process from the configured phrase lists"""
+    global _classifier
+    if _classifier is None:
+        _classifier = AnswerClassifier(load_phrase_groups())
+    return _classifier
@@ -1,5 +1,8 @@
 import streamlit as st
 from auth import authenticate_user
+from db import begin_rerun
+import metrics
+import profiling
 
 # ---------------- PAGE CONFIG ----------------
 st.set_page_config(
@@ -36,6 +39,9 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Prometheus scrape listener for this process (METRICS_PORT); started once
+metrics.start_metrics_server()
+
 # ---------------- SESSION INIT ----------------
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -52,10 +58,15 @@ params = st.query_params
 if ("guidebook" in params or "id" in params):
     st.session_state.page = "chatbot"
     if st.session_state.page == "chatbot":
+        begin_rerun("chatbot")
         from pages.chatbot import main
-        main()
+        with profiling.rerun("chatbot"):
+            main()
         st.stop()
 
+# Attribute this rerun's DB queries to the page being rendered
+begin_rerun(st.session_state.page if st.session_state.logged_in else "login")
+
 # ---------------- LOGIN PAGE ----------------
 if not st.session_state.logged_in:
     # Hide sidebar on login page
@@ -198,6 +209,20 @@ else:
             st.session_state.page = "chat_sessions"
             st.rerun()
         
+        # Bulk Import (Admin only)
+        if st.session_state.user_type == "admin":
+            if st.button("📥 Bulk Import", use_container_width=True,
+                        type="primary" if st.session_state.page == "bulk_import" else "secondary"):
+                st.session_state.page = "bulk_import"
+                st.rerun()
+        
+        # DB Performance (Admin only)
+        if st.session_state.user_type == "admin":
+            if st.button("🩺 DB Performance", use_container_width=True,
+                        type="primary" if st.session_state.page == "db_stats" else "secondary"):
+                st.session_state.page = "db_stats"
+                st.rerun()
+        
         st.markdown("---")
         
         # User info section
@@ -221,33 +246,51 @@ else:
             st.rerun()
 
     # ---------------- ROUTER (MAIN CONTENT AREA) ----------------
-    if st.session_state.page == "dashboard":
-        from pages.dashboard import show_dashboard
-        show_dashboard()
+    with profiling.rerun(st.session_state.page):
+        if st.session_state.page == "dashboard":
+            from pages.dashboard import show_dashboard
+            show_dashboard()
 
-    elif st.session_state.page == "property_manager":
-        # Admin-only page
-        if st.session_state.user_type == "admin":
-            from pages.property_manager_registration import show_property_manager_page
-            show_property_manager_page()
-        else:
-            st.error("🚫 Access Denied")
-            st.warning("This page is only accessible to administrators.")
-            if st.button("⬅️ Back to Dashboard"):
-                st.session_state.page = "dashboard"
-                st.rerun()
+        elif st.session_state.page == "property_manager":
+            # Admin-only page
+            if st.session_state.user_type == "admin":
+                from pages.property_manager_registration import show_property_manager_page
+                show_property_manager_page()
+            else:
+                st.error("🚫 Access Denied")
+                st.warning("This page is only accessible to administrators.")
+                if st.button("⬅️ Back to Dashboard"):
+                    st.session_state.page = "dashboard"
+                    st.rerun()
 
-    elif st.session_state.page == "property":
-        from pages.property_registration import show_property_page
-        show_property_page()
+        elif st.session_state.page == "property":
+            from pages.property_registration import show_property_page
+            show_property_page()
     
-    elif st.session_state.page == "guidebook":
-        from pages.guidebook_registration import show_guidebook_page
-        show_guidebook_page()
+        elif st.session_state.page == "guidebook":
+            from pages.guidebook_registration import show_guidebook_page
+            show_guidebook_page()
     
-    elif st.session_state.page == "chat_sessions":
-        from pages.page_sessions import show_chat_sessions_page
-        show_chat_sessions_page()
+        elif st.session_state.page == "chat_sessions":
+            from pages.page_sessions import show_chat_sessions_page
+            show_chat_sessions_page()
 
+        elif st.session_state.page == "bulk_import":
+            # Admin-only page
+            if st.session_state.user_type == "admin":
+                from pages.page_bulk_import import show_bulk_import_page
+                show_bulk_import_page()
+            else:
+                st.error("🚫 Access Denied")
+                st.warning("This page is only accessible to administrators.")
 
+        elif st.session_state.page == "db_stats":
+            # Admin-only page
+            if st.session_state.user_type == "admin":
+                from pages.db_stats import show_db_stats_page
+                show_db_stats_page()
+            else:
+                st.error("🚫 Access Denied")
+                st.warning("This page is only accessible to administrators.")
 
+    profiling.show_overlay()
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import db
+from compression import pack
+from transcript_search import posting_rows, postings_statements, SOURCE_MESSAGE, SOURCE_UNANSWERED
+
+try:
+    import aiomysql
+except ImportError:  # optional: only used with ASYNC_DB_DRIVER = "aiomysql"
+    aiomysql = None
+
+ASYNC_DB_POOL_SIZE = int(st.secrets.get("ASYNC_DB_POOL_SIZE", 10))
+# "threads" runs the pymysql helpers on the loop's worker threads (the path
+# the chat load benchmarks measure). "aiomysql" uses a native async pool and
+# needs `pip install aiomysql`; it has not yet been run against MySQL, so it
+# is opt-in.
+ASYNC_DB_DRIVER = st.secrets.get("ASYNC_DB_DRIVER", "threads")
+
+# ---------------- EVENT LOOP ----------------
+# Streamlit scripts are synchronous, so one long-lived loop runs on a daemon
+# thread and owns the connection pool and the AsyncOpenAI client. Pages call
+# run_sync() to submit a coroutine and block for its result.
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                # With the "threads" driver, writes run on these threads; size matches the pool
+                loop.set_default_executor(ThreadPoolExecutor(ASYNC_DB_POOL_SIZE, thread_name_prefix="async-db"))
+                threading.Thread(target=loop.run_forever, name="async-db", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def run_sync(coro, timeout: float = None):
+    """Run a coroutine on the shared loop from synchronous code and return its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+# ---------------- CONNECTION POOL ----------------
+_pool = None
+_pool_lock = None
+
+async def _get_pool():
+    global _pool, _pool_lock
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()  # everything here runs on the one shared loop
+        # create_pool awaits, so without the lock concurrent first writes would each open a pool
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await aiomysql.create_pool(
+                    host=st.secrets["host"],
+                    user="avnadmin",
+                    password=st.secrets["password"],
+                    db="property_management",
+                    port=17028,
+                    charset="utf8mb4",
+                    cursorclass=aiomysql.DictCursor,
+                    autocommit=True,
+                    minsize=1,
+                    maxsize=ASYNC_DB_POOL_SIZE
+                )
+    return _pool
+
+def _use_driver() -> bool:
+    # Benchmarks swap db's connection factory; honour that by using the sync path
+    return (ASYNC_DB_DRIVER == "aiomysql" and aiomysql is not None
+            and db._connection_factory is db._connect)
+
+def _execute_blocking(sql: str, args) -> int:
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, args)
+            lastrowid = cursor.lastrowid
+        conn.commit()
+    finally:
+        conn.close()
+    return lastrowid
+
+async def execute(sql: str, args=None) -> int:
+    """Run one autocommitted write and return the cursor's lastrowid"""
+    if not _use_driver():
+        return await asyncio.to_thread(_execute_blocking, sql, args)
+    pool = await _get_pool()
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(sql, args)
+            db._record_query(sql, (time.perf_counter() - started) * 1000, cursor.rowcount)
+            return cursor.lastrowid
+
+# ---------------- CHAT PERSISTENCE ----------------
+# Async counterparts of the pages/chatbot.py write helpers. Each statement takes
+# its own pooled connection so independent writes can run concurrently.
+async def index_postings(rows: list):
+    """Add search postings (transcript_search.posting_rows) for documents just saved"""
+    for sql, params in postings_statements(rows):
+        await execute(sql, params)
+
+async def save_chat_message(session_id: str, guideid: str, role: str, content: str,
+                            input_tokens: int, output_tokens: int, was_answered: bool = True,
+                            guide_version: int = None) -> int:
+    """Save individual chat message and return its id"""
+    sql = """
+    INSERT INTO chat_messages
+    (session_id, guideid, guide_version, role, content, input_tokens, output_tokens, was_answered)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    message_id = await execute(sql, (session_id, guideid, guide_version, role, pack(content),
+                                     input_tokens, output_tokens, was_answered))
+    await index_postings(posting_rows(SOURCE_MESSAGE, message_id, session_id, guideid, content))
+    return message_id
+
+async def save_chat_messages(rows: list):
+    """
+    Save several messages in one statement so their ids keep the given order.
+    Rows are (session_id, guideid, guide_version, role, content, input_tokens,
+    output_tokens, was_answered).
+    """
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+    sql = f"""
+    INSERT INTO chat_messages
+    (session_id, guideid, guide_version, role, content, input_tokens, output_tokens, was_answered)
+    VALUES {placeholders}
+    """
+    params = []
+    for session_id, guideid, guide_version, role, content, input_tokens, output_tokens, was_answered in rows:
+        params += [session_id, guideid, guide_version, role, pack(content), input_tokens, output_tokens, was_answered]
+    # MySQL reports the first id of a multi-row INSERT; the rest follow it
+    first_id = await execute(sql, params)
+    postings = []
+    for offset, (session_id, guideid, _, _, content, *_) in enumerate(rows):
+        postings += posting_rows(SOURCE_MESSAGE, first_id + offset, session_id, guideid, content)
+    await index_postings(postings)
+
+async def set_message_input_tokens(message_id: int, input_tokens: int, cached: int = 0):
+    """Fill in the token counts of a message saved before the model replied"""
+    await execute("UPDATE chat_messages SET input_tokens = %s, cached_tokens = %s WHERE id = %s",
+                  (input_tokens, cached, message_id))
+
+async def log_unanswered_question(session_id: str, guideid: str, question: str, response: str, reason: str,
+                                  phone: str = None, email: str = None):
+    """Log questions that couldn't be answered with optional contact info"""
+    sql = """
+    INSERT INTO unanswered_questions
+    (session_id, guideid, user_question, ai_response, reason, user_phone, user_email, contact_provided)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    contact_provided = bool(phone or email)
+    question_id = await execute(sql, (session_id, guideid, question, response, reason, phone, email, contact_provided))
+    await index_postings(posting_rows(SOURCE_UNANSWERED, question_id, session_id, guideid, question))
+
+async def update_session_stats(session_id: str, input_tokens: int, output_tokens: int, cached: int = 0):
+    """Update session token statistics"""
+    sql = """
+    UPDATE chat_sessions
+    SET total_messages = total_messages + 1,
+        total_input_tokens = total_input_tokens + %s,
+        total_output_tokens = total_output_tokens + %s,
+        total_cached_tokens = total_cached_tokens + %s
+    WHERE session_id = %s
+    """
+    await execute(sql, (input_tokens, output_tokens, cached, session_id))
@@ -0,0 +1,352 @@
+"""
+End-to-end guest chat load generator.
+
+Drives the real pages.chatbot path (get_guidebook_by_slug, create_chat_session,
+get_session_contact_info, run_chat_turn -> ask_openai/check_if_answered/save_chat_message/...)
+headlessly with many simulated guests, against a SQLite MySQL stand-in and the
+local OpenAI stub. Nothing leaves the machine.
+
+    python -m bench.chat_load --guests 200 --concurrency 50 --guidebooks 40 --turns 5
+    python -m bench.chat_load --baseline bench_results/chat_load-previous.json
+    python -m bench.chat_load --sync-turns     # sequential run_chat_turn, for comparison
+    python -m bench.chat_load --api --stream   # through chat_api.app (in-process), SSE replies
+
+Results are written as JSON (see --out) for regression comparison.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakedb import FakeDatabase, current_counters, use_counters
+from bench.openai_stub import start_stub_server
+
+QUESTIONS = [
+    "What is the WiFi password?",
+    "How do I use the TV remote?",
+    "What time is check-out?",
+    "Where can I park?",
+    "Can I bring my pets?",
+    "Is the pool heater working?",
+    "What's the weather tomorrow?",
+    "Tell me a joke",
+    "Is there a hair dryer?",
+    "How do I turn on the dishwasher?",
+]
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def install_database(fake: FakeDatabase):
+    """Route db.get_connection (and its query instrumentation) to the stand-in"""
+    import db
+    db.set_connection_factory(fake.get_connection)
+
+def seed_guidebooks(fake: FakeDatabase, count: int, guide_chars: int, rng: random.Random) -> list:
+    words = ["wifi", "checkout", "parking", "remote", "towels", "kitchen", "keys", "trash", "quiet", "hours"]
+    slugs = []
+    conn = fake.get_connection()
+    with conn.cursor() as cursor:
+        for i in range(count):
+            slug = f"bench_guide_{i}"
+            text = " ".join(rng.choice(words) for _ in range(guide_chars // 7))
+            cursor.execute(
+                """
+                INSERT OR REPLACE INTO guidebook_registration
+                (guideid, guidebook_title, guide_text, current_version, guide_original_url, guide_chatbot_url,
+                 chatbot_description, qr_code_base64, created_by, created_date)
+                VALUES (%s, %s, %s, 1, %s, %s, %s, %s, %s, %s)
+                """,
+                (f"bench-{i}", f"Bench Guide {i}", text, "https://example.com/guide",
+                 f"http://localhost:8501?guidebook={slug}", "Ask me anything!", "", "bench", datetime.now())
+            )
+            slugs.append(slug)
+    conn.close()
+    return slugs
+
+def new_guest_state(session_id: str) -> types.SimpleNamespace:
+    """The subset of st.session_state that run_chat_turn reads and writes"""
+    return types.SimpleNamespace(
+        session_id=session_id,
+        messages=[],
+        total_input_tokens=0,
+        total_output_tokens=0,
+        awaiting_contact=False,
+        pending_question=None,
+        saved_phone=None,
+        saved_email=None,
+    )
+
+async def measured(counters, coro):
+    """Charge the DB work of an async turn (spread over worker threads) to one guest"""
+    use_counters(counters)
+    return await coro
+
+def run_guest(guest_no: int, slugs: list, args, results: list, lock: threading.Lock):
+    import async_db
+    from pages import chatbot
+
+    rng = random.Random(args.seed * 100003 + guest_no)
+    slug = rng.choice(slugs)
+    client_ip = f"10.0.{guest_no // 250}.{guest_no % 250}"
+
+    counters = current_counters()
+    counters.reset()
+    started = time.perf_counter()
+    guidebook = chatbot.get_guidebook_by_slug(slug)
+    session_id = chatbot.create_chat_session(guidebook['guideid'], "bench")
+    state = new_guest_state(session_id)
+    existing = chatbot.get_session_contact_info(session_id)
+    state.saved_phone = existing.get('user_phone') if existing else None
+    state.saved_email = existing.get('user_email') if existing else None
+    setup = {
+        'kind': 'setup',
+        'latency': time.perf_counter() - started,
+        'queries': counters.queries,
+        'connections': counters.connections,
+    }
+    with lock:
+        results.append(setup)
+
+    for _ in range(args.turns):
+        if args.think_time:
+            time.sleep(rng.expovariate(1.0 / args.think_time))
+        if state.awaiting_contact:
+            # Guests skip the contact form, as the "Skip" button does
+            state.awaiting_contact = False
+            state.pending_question = None
+        counters.reset()
+        started = time.perf_counter()
+        try:
+            question = rng.choice(QUESTIONS)
+            if args.sync_turns:
+                turn = chatbot.run_chat_turn(state, question, guidebook, client_ip)
+            else:
+                turn = async_db.run_sync(measured(counters, chatbot.run_chat_turn_async(state, question, guidebook, client_ip)))
+            error = None
+        except Exception as e:
+            turn, error = {}, repr(e)
+        record = {
+            'kind': 'turn',
+            'latency': time.perf_counter() - started,
+            'queries': counters.queries,
+            'connections': counters.connections,
+            'db_seconds': counters.db_seconds,
+            'input_tokens': turn.get('input_tokens', 0),
+            'cached_tokens': turn.get('cached_tokens', 0),
+            'was_answered': turn.get('was_answered'),
+            'rate_limited': turn.get('rate_limited', False),
+            'error': error,
+        }
+        with lock:
+            results.append(record)
+
+def run_api_guest(guest_no: int, slugs: list, args, results: list, lock: threading.Lock):
+    """run_guest over the JSON chat API (chat_api.app), called in-process"""
+    import chat_api
+    from bench.wsgi_client import WSGIClient
+
+    rng = random.Random(args.seed * 100003 + guest_no)
+    client = WSGIClient(chat_api.app, remote_addr=f"10.0.{guest_no // 250}.{guest_no % 250}")
+
+    started = time.perf_counter()
+    status, _, session = client.post("/api/sessions", {'guidebook': rng.choice(slugs), 'user_identifier': "bench"})
+    with lock:
+        results.append({'kind': 'setup', 'latency': time.perf_counter() - started, 'queries': 0, 'connections': 0})
+    if status != 201:
+        return
+    path = f"/api/sessions/{session['session_id']}"
+
+    for _ in range(args.turns):
+        if args.think_time:
+            time.sleep(rng.expovariate(1.0 / args.think_time))
+        started = time.perf_counter()
+        first_token, turn, error = None, {}, None
+        try:
+            question = rng.choice(QUESTIONS)
+            if args.stream:
+                for event, data in client.events("POST", path + "/messages", {'message': question}):
+                    if event == "delta" and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event == "done":
+                        turn = data
+                    elif event == "error":
+                        error = data['error']
+            else:
+                status, _, turn = client.post(path + "/messages", {'message': question})
+                if status != 200:
+                    turn, error = {}, f"{status}: {turn}"
+            if turn.get('awaiting_contact'):
+                client.post(path + "/contact", {'skip': True})
+        except Exception as e:
+            error = repr(e)
+        record = {
+            'kind': 'turn',
+            'latency': time.perf_counter() - started,
+            'first_token': first_token,
+            'queries': 0,
+            'connections': 0,
+            'db_seconds': 0.0,
+            'was_answered': turn.get('was_answered'),
+            'rate_limited': turn.get('rate_limited', False),
+            'error': error,
+        }
+        with lock:
+            results.append(record)
+
+def prompt_cache_hit_rate(turns: list):
+    """Share of input tokens the stub served from its prompt cache (None over the API, which doesn't report tokens)"""
+    input_tokens = sum(r.get('input_tokens', 0) for r in turns)
+    return round(sum(r.get('cached_tokens', 0) for r in turns) / input_tokens, 3) if input_tokens else None
+
+def summarize(records: list, wall_seconds: float) -> dict:
+    turns = [r for r in records if r['kind'] == 'turn']
+    setups = [r for r in records if r['kind'] == 'setup']
+    ok = [r for r in turns if not r['error']]
+    failed_guests = [r for r in records if r['kind'] == 'guest']
+    latencies = [r['latency'] * 1000 for r in ok]
+    first_tokens = [r['first_token'] * 1000 for r in ok if r.get('first_token') is not None]
+    return {
+        'turns': len(turns),
+        'errors': len(turns) - len(ok),
+        'failed_guests': len(failed_guests),
+        'rate_limited': sum(1 for r in ok if r['rate_limited']),
+        'unanswered': sum(1 for r in ok if r['was_answered'] is False),
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_turns_per_sec': round(len(ok) / wall_seconds, 2) if wall_seconds else 0.0,
+        'turn_latency_ms': {
+            'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(max(latencies), 2) if latencies else 0.0,
+        },
+        'first_token_ms': {
+            'p50': round(percentile(first_tokens, 0.50), 2),
+            'p95': round(percentile(first_tokens, 0.95), 2),
+        } if first_tokens else None,
+        'db_queries_per_turn': round(statistics.fmean(r['queries'] for r in ok), 2) if ok else 0.0,
+        'db_connections_per_turn': round(statistics.fmean(r['connections'] for r in ok), 2) if ok else 0.0,
+        'db_ms_per_turn': round(statistics.fmean(r['db_seconds'] * 1000 for r in ok), 2) if ok else 0.0,
+        'prompt_cache_hit_rate': prompt_cache_hit_rate(ok),
+        'session_setup_ms_p95': round(percentile([r['latency'] * 1000 for r in setups], 0.95), 2),
+        'db_queries_per_session_setup': round(statistics.fmean(r['queries'] for r in setups), 2) if setups else 0.0,
+    }
+
+def compare(current: dict, baseline: dict) -> list:
+    """Human-readable deltas for the headline numbers"""
+    lines = []
+    pairs = [
+        ('p50 ms', current['turn_latency_ms']['p50'], baseline['turn_latency_ms']['p50']),
+        ('p95 ms', current['turn_latency_ms']['p95'], baseline['turn_latency_ms']['p95']),
+        ('p99 ms', current['turn_latency_ms']['p99'], baseline['turn_latency_ms']['p99']),
+        ('turns/s', current['throughput_turns_per_sec'], baseline['throughput_turns_per_sec']),
+        ('queries/turn', current['db_queries_per_turn'], baseline['db_queries_per_turn']),
+        ('connections/turn', current['db_connections_per_turn'], baseline['db_connections_per_turn']),
+    ]
+    for label, now, before in pairs:
+        change = ((now - before) / before * 100) if before else 0.0
+        lines.append(f"{label:>18}: {before:>10} -> {now:>10} ({change:+.1f}%)")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Guest chat load generator")
+    parser.add_argument("--guests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--guidebooks", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=4, help="messages per guest")
+    parser.add_argument("--guide-chars", type=int, default=6000)
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a guest's messages")
+    parser.add_argument("--llm-latency", default="lognormal:-1.2,0.3", help="stub latency spec, see bench.openai_stub")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--connect-ms", type=float, default=20.0, help="simulated MySQL connect/TLS handshake")
+    parser.add_argument("--query-ms", type=float, default=2.0, help="simulated per-statement round trip")
+    parser.add_argument("--sync-turns", action="store_true", help="run turns sequentially instead of on the async path")
+    parser.add_argument("--api", action="store_true",
+                        help="drive guests through chat_api.app (DB counters are not attributed per turn)")
+    parser.add_argument("--stream", action="store_true", help="with --api, request SSE replies")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="stub seconds per streamed token")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="leave rate_limit settings as configured")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=None, help="JSON results path (default bench_results/chat_load-<ts>.json)")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.llm_latency, error_rate=args.llm_error_rate,
+                                         token_delay=args.token_delay, seed=args.seed)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    import llm
+    import rate_limit
+    from pages import chatbot
+
+    if not args.keep_rate_limits:
+        rate_limit.SESSION_RATE = rate_limit.IP_RATE = rate_limit.GUIDEBOOK_RATE = 1e9
+        rate_limit.SESSION_BURST = rate_limit.IP_BURST = rate_limit.GUIDEBOOK_BURST = 1e9
+        rate_limit.GUIDEBOOK_DAILY_TOKENS = 0
+    chatbot.ASYNC_CHAT_TURNS = not args.sync_turns
+
+    tmpdir = tempfile.mkdtemp(prefix="chat_load_")
+    fake = FakeDatabase(os.path.join(tmpdir, "bench.sqlite3"),
+                        connect_delay=args.connect_ms / 1000, query_delay=args.query_ms / 1000)
+    install_database(fake)
+    slugs = seed_guidebooks(fake, args.guidebooks, args.guide_chars, random.Random(args.seed))
+
+    records, lock = [], threading.Lock()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        guests = [pool.submit(run_api_guest if args.api else run_guest, guest_no, slugs, args, records, lock)
+                  for guest_no in range(args.guests)]
+    wall = time.perf_counter() - started
+    for guest_no, guest in enumerate(guests):
+        # Turn errors are recorded per turn; anything escaping a guest (setup, the bench itself) lands here
+        error = guest.exception()
+        if error is not None:
+            traceback.print_exception(error)
+            records.append({'kind': 'guest', 'guest': guest_no, 'error': repr(error)})
+    server.shutdown()
+
+    summary = summarize(records, wall)
+    result = {
+        'benchmark': 'chat_load',
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'config': {k: v for k, v in vars(args).items() if k not in ('out', 'baseline')},
+        'summary': summary,
+        'llm_gateway': llm.get_llm_metrics(),
+        'stub': server.RequestHandlerClass.state.stats,
+    }
+
+    out = args.out or os.path.join("bench_results", f"chat_load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(json.dumps(summary, indent=2))
+    print(f"Results written to {out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("\nCompared with baseline:")
+        print("\n".join(compare(summary, baseline['summary'])))
+    if summary['failed_guests']:
+        sys.exit(f"{summary['failed_guests']} guest(s) failed; see the tracebacks above")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark check_if_answered's compiled classifier against the original
+per-keyword `in` scans over a corpus of assistant replies.
+
+    python -m bench.classifier_bench                      # assistant rows from chat_messages
+    python -m bench.classifier_bench --corpus replies.jsonl   # {"content": ...} per line
+    python -m bench.classifier_bench --synthetic 5000 --extra-phrases 200
+
+Both implementations must agree on every reply; disagreements are printed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_classifier import AnswerClassifier, CATEGORIES, load_phrase_groups
+
+def legacy_check(response: str, phrase_groups: list) -> tuple[bool, str, bool]:
+    """The original check_if_answered loop, parameterised by phrase lists"""
+    response_lower = response.lower()
+    for (_, _, template, is_property_related), phrases in zip(CATEGORIES, phrase_groups):
+        for keyword in phrases:
+            if keyword in response_lower:
+                return False, template.format(keyword), is_property_related
+    return True, "Answered successfully", False
+
+def load_db_corpus(limit: int) -> list:
+    from db import get_connection
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT content FROM chat_messages WHERE role = 'assistant' ORDER BY created_at DESC LIMIT %s",
+            (limit,)
+        )
+        rows = cursor.fetchall()
+    conn.close()
+    return [r['content'] for r in rows if r['content']]
+
+def load_file_corpus(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line)['content'] for line in f if line.strip()]
+
+def synthetic_corpus(size: int, rng: random.Random) -> list:
+    from bench.openai_stub import RESPONSES
+    filler = ("The kitchen has a dishwasher and the coffee maker is next to the sink. "
+              "Quiet hours start at 10pm and towels are in the hall closet. ")
+    replies = list(RESPONSES.values())
+    return [filler * rng.randint(0, 6) + rng.choice(replies) for _ in range(size)]
+
+def extend_groups(groups: list, extra: int, rng: random.Random) -> list:
+    """Simulate ops adding many phrases to the configured lists"""
+    words = "the a property guest wifi pool door key lock check out sorry owner manager info host".split()
+    groups = [list(g) for g in groups]
+    for i in range(extra):
+        groups[i % len(groups)].append(" ".join(rng.choice(words) for _ in range(4)) + f" #{i}")
+    return groups
+
+def time_it(fn, corpus: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="check_if_answered classifier benchmark")
+    parser.add_argument("--corpus", help="JSONL file with a 'content' field per line")
+    parser.add_argument("--limit", type=int, default=20000, help="max chat_messages rows to load")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic replies instead of the DB")
+    parser.add_argument("--extra-phrases", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.corpus:
+        corpus = load_file_corpus(args.corpus)
+    elif args.synthetic:
+        corpus = synthetic_corpus(args.synthetic, rng)
+    else:
+        corpus = load_db_corpus(args.limit)
+    if not corpus:
+        print("Corpus is empty")
+        return
+
+    groups = extend_groups(load_phrase_groups(), args.extra_phrases, rng)
+    phrases = sum(len(g) for g in groups)
+    print(f"corpus: {len(corpus)} replies, {phrases} phrases")
+
+    legacy = time_it(lambda t: legacy_check(t, groups), corpus, args.repeat)
+    print(f"{'legacy':>10}: {legacy * 1e6 / len(corpus):8.2f} us/reply")
+
+    failed = False
+    for name, use_automaton in (("scan", False), ("automaton", True), ("default", None)):
+        started = time.perf_counter()
+        classifier = AnswerClassifier(groups, use_automaton=use_automaton)
+        compile_ms = (time.perf_counter() - started) * 1000
+        mismatches = [t for t in corpus if classifier.classify(t) != legacy_check(t, groups)]
+        for text in mismatches[:5]:
+            print(f"MISMATCH ({name}):", text[:120])
+        failed = failed or bool(mismatches)
+        elapsed = time_it(classifier.classify, corpus, args.repeat)
+        print(f"{name:>10}: {elapsed * 1e6 / len(corpus):8.2f} us/reply ({legacy / elapsed:.2f}x) "
+              f"compile {compile_ms:.1f} ms, agreement {len(corpus) - len(mismatches)}/{len(corpus)}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
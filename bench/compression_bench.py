@@ -0,0 +1,195 @@
+"""
+Bytes transferred and load time of the guidebook and session pages with
+guide_text/content stored plain vs compressed (compression.py).
+
+Both variants are seeded into SQLite stand-ins with identical rows, then the
+pages' own data functions are timed: get_guidebooks() plus opening one
+guidebook's text, and get_session_messages() plus rendering every message.
+Transfer time is modelled from the bytes the queries return at --mbps.
+The transcript search backfill of m0005 is run over both variants too; it must
+index the same postings whether content is stored plain or compressed.
+
+    python -m bench.compression_bench --guidebooks 200 --sessions 300 --mbps 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakedb import FakeDatabase
+
+SENTENCES = [
+    "Check-in is from 4pm and check-out is by 11am.",
+    "The WiFi network is {word}_guest and the password is on the fridge.",
+    "Please do not smoke anywhere on the property, including the balcony.",
+    "Extra towels and linens are in the hall closet next to the {word} room.",
+    "The coffee maker takes ground coffee; filters are in the top drawer.",
+    "Quiet hours are from 10pm to 8am out of respect for the neighbours.",
+    "Parking is available in spot {num}; street parking needs a permit.",
+    "The pool heater is controlled from the panel by the {word} door.",
+    "Trash and recycling go out on {word} mornings to the bins at the curb.",
+    "For the TV, use the black remote and select the HDMI {num} input.",
+]
+WORDS = ["garden", "laundry", "sunset", "ocean", "pine", "maple", "harbor", "cedar"]
+
+def guide_text(rng: random.Random, chars: int) -> str:
+    parts = []
+    while sum(len(p) + 1 for p in parts) < chars:
+        parts.append(rng.choice(SENTENCES).format(word=rng.choice(WORDS), num=rng.randint(1, 40)))
+    return " ".join(parts)
+
+def seed(fake: FakeDatabase, args, compressed: bool) -> list:
+    from compression import pack
+    rng = random.Random(args.seed)
+    store = pack if compressed else (lambda text: text)
+    conn = fake.get_connection()
+    sessions = []
+    with conn.cursor() as cursor:
+        for i in range(args.guidebooks):
+            cursor.execute(
+                """
+                INSERT INTO guidebook_registration
+                (guideid, guidebook_title, guide_text, guide_original_url, guide_chatbot_url,
+                 chatbot_description, qr_code_base64, created_by, created_date)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (f"g{i}", f"Guide {i}", store(guide_text(rng, args.guide_chars)), "https://example.com",
+                 f"http://localhost:8501?guidebook=guide_{i}", "Ask me anything!", "", "bench", datetime.now())
+            )
+        for s in range(args.sessions):
+            session_id = f"s{s}"
+            sessions.append(session_id)
+            for m in range(args.messages):
+                role = "user" if m % 2 == 0 else "assistant"
+                chars = 60 if role == "user" else rng.randint(200, args.reply_chars)
+                cursor.execute(
+                    """
+                    INSERT INTO chat_messages (session_id, guideid, role, content, input_tokens, output_tokens, was_answered)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (session_id, f"g{s % args.guidebooks}", role, store(guide_text(rng, chars)), 0, 0, True)
+                )
+    conn.close()
+    return sessions
+
+def payload_bytes(fake: FakeDatabase, sql: str, params=()) -> int:
+    """Bytes of column data a query returns (a proxy for what crosses the wire)"""
+    conn = fake.get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    conn.close()
+    total = 0
+    for row in rows:
+        for value in row.values():
+            if isinstance(value, str):
+                total += len(value.encode("utf-8"))
+            elif isinstance(value, (bytes, bytearray)):
+                total += len(value)
+            elif value is not None:
+                total += 8
+    return total
+
+def measure(fake: FakeDatabase, sessions: list, args) -> dict:
+    import db
+    from migrations.m0005_chat_search_index import DOCUMENTS, index_existing
+    from pages.guidebook_registration import get_guidebooks
+    from pages.page_sessions import get_session_messages
+    db.set_connection_factory(fake.get_connection)
+    bandwidth = args.mbps * 1e6 / 8
+
+    # Guidebook page: list everything, open one guidebook's edit form
+    guide_bytes = payload_bytes(fake, "SELECT * FROM guidebook_registration ORDER BY created_date DESC")
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        guidebooks = get_guidebooks()
+        len(guidebooks[0]['guide_text'])
+    guide_ms = (time.perf_counter() - started) * 1000 / args.repeat
+
+    # Session page: open transcripts and render every message
+    sample = sessions[:args.open_sessions]
+    session_bytes = sum(payload_bytes(fake, "SELECT * FROM chat_messages WHERE session_id = %s", (s,)) for s in sample)
+    started = time.perf_counter()
+    for session_id in sample:
+        for msg in get_session_messages(session_id):
+            len(msg['content'])
+    session_ms = (time.perf_counter() - started) * 1000
+
+    # Search index backfill over every stored message
+    conn = db.get_connection()
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        indexed = sum(index_existing(cursor, *document) for document in DOCUMENTS)
+        cursor.execute("SELECT COUNT(*) AS n, COALESCE(SUM(tf), 0) AS tf FROM chat_search_terms")
+        postings = cursor.fetchone()
+    backfill_ms = (time.perf_counter() - started) * 1000
+    conn.close()
+
+    return {
+        'guidebook_page': {
+            'bytes': guide_bytes,
+            'query_and_decode_ms': round(guide_ms, 2),
+            'modelled_load_ms': round(guide_ms + guide_bytes / bandwidth * 1000, 2),
+        },
+        'session_page': {
+            'transcripts': len(sample),
+            'bytes': session_bytes,
+            'query_and_decode_ms': round(session_ms, 2),
+            'modelled_load_ms': round(session_ms + session_bytes / bandwidth * 1000, 2),
+        },
+        'search_backfill': {
+            'documents': indexed,
+            'postings': postings['n'],
+            'term_occurrences': postings['tf'],
+            'ms': round(backfill_ms, 2),
+        },
+        'database_file_bytes': os.path.getsize(fake.path),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Plain vs compressed long-text storage")
+    parser.add_argument("--guidebooks", type=int, default=100)
+    parser.add_argument("--guide-chars", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=12, help="messages per session")
+    parser.add_argument("--reply-chars", type=int, default=1500)
+    parser.add_argument("--open-sessions", type=int, default=50, help="transcripts opened on the session page")
+    parser.add_argument("--mbps", type=float, default=50.0, help="modelled app<->MySQL bandwidth")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = {}
+    tmpdir = tempfile.mkdtemp(prefix="compression_bench_")
+    for variant in ("plain", "compressed"):
+        fake = FakeDatabase(os.path.join(tmpdir, f"{variant}.sqlite3"))
+        sessions = seed(fake, args, compressed=variant == "compressed")
+        results[variant] = measure(fake, sessions, args)
+
+    for page in ("guidebook_page", "session_page"):
+        plain, packed = results['plain'][page], results['compressed'][page]
+        print(f"{page}: {plain['bytes']:,} -> {packed['bytes']:,} bytes "
+              f"({packed['bytes'] / plain['bytes']:.0%}), "
+              f"load {plain['modelled_load_ms']} -> {packed['modelled_load_ms']} ms "
+              f"(query+decode {plain['query_and_decode_ms']} -> {packed['query_and_decode_ms']} ms)")
+    print(f"database file: {results['plain']['database_file_bytes']:,} -> "
+          f"{results['compressed']['database_file_bytes']:,} bytes")
+    plain, packed = results['plain']['search_backfill'], results['compressed']['search_backfill']
+    print(f"search backfill: {plain['postings']:,} -> {packed['postings']:,} postings, "
+          f"{plain['ms']} -> {packed['ms']} ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+    if (plain['postings'], plain['term_occurrences']) != (packed['postings'], packed['term_occurrences']):
+        sys.exit("search backfill indexed compressed content differently from plain content")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+SQLite-backed stand-in for the pymysql connections returned by db.get_connection.
+
+It understands the MySQL dialect the app actually uses (%s placeholders, NOW(),
+CURDATE(), TRUE/FALSE, UPDATE ... ORDER BY ... LIMIT, INSERT IGNORE,
+MATCH ... AGAINST in boolean mode) and returns dict rows like
+pymysql's DictCursor. Optional connect/query delays model the network round trips
+to the hosted MySQL server so per-turn DB cost shows up in benchmark latency.
+"""
+import contextvars
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guidebook_registration (
+    guideid TEXT PRIMARY KEY,
+    guidebook_title TEXT,
+    guide_text TEXT,
+    current_version INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    guide_original_url TEXT,
+    guide_chatbot_url TEXT,
+    chatbot_description TEXT,
+    qr_code_base64 TEXT,
+    created_by TEXT,
+    created_date TIMESTAMP,
+    modified_date TIMESTAMP,
+    modified_by TEXT
+);
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    guideid TEXT,
+    user_identifier TEXT,
+    session_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    session_end TIMESTAMP,
+    is_active INTEGER DEFAULT 1,
+    total_messages INTEGER DEFAULT 0,
+    total_input_tokens INTEGER DEFAULT 0,
+    total_output_tokens INTEGER DEFAULT 0,
+    total_cached_tokens INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    guideid TEXT,
+    guide_version INTEGER,
+    role TEXT,
+    content TEXT,
+    input_tokens INTEGER DEFAULT 0,
+    output_tokens INTEGER DEFAULT 0,
+    cached_tokens INTEGER DEFAULT 0,
+    was_answered INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS unanswered_questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    guideid TEXT,
+    user_question TEXT,
+    ai_response TEXT,
+    reason TEXT,
+    user_phone TEXT,
+    user_email TEXT,
+    contact_provided INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS property_manager (
+    manager_id TEXT PRIMARY KEY,
+    manager_name TEXT,
+    contact_address TEXT,
+    email TEXT UNIQUE,
+    phone TEXT,
+    password TEXT,
+    is_active INTEGER DEFAULT 1,
+    created_date TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS property_registration (
+    propId TEXT PRIMARY KEY,
+    property_address TEXT,
+    created_date TIMESTAMP,
+    created_by TEXT,
+    modified_date TIMESTAMP,
+    modified_by TEXT,
+    manager_id TEXT
+);
+CREATE TABLE IF NOT EXISTS mapper (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    propid TEXT,
+    guideid TEXT,
+    created_by TEXT,
+    created_date TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS chat_search_terms (
+    term TEXT NOT NULL,
+    guideid TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    source TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    session_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, guideid, source, doc_id)
+);
+CREATE TABLE IF NOT EXISTS guidebook_chunks (
+    guideid TEXT NOT NULL,
+    model TEXT NOT NULL,
+    chunk_no INTEGER NOT NULL,
+    text_hash TEXT NOT NULL,
+    chunk_text TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (guideid, model, chunk_no)
+);
+CREATE TABLE IF NOT EXISTS guidebook_versions (
+    guideid TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    guidebook_title TEXT NOT NULL,
+    guide_text TEXT NOT NULL,
+    guide_original_url TEXT,
+    created_by TEXT,
+    created_date TIMESTAMP NOT NULL,
+    PRIMARY KEY (guideid, version)
+);
+CREATE INDEX IF NOT EXISTS idx_search_term_time ON chat_search_terms (term, created_at, session_id, tf);
+CREATE INDEX IF NOT EXISTS idx_search_source_time ON chat_search_terms (source, created_at);
+CREATE INDEX IF NOT EXISTS idx_cm_session ON chat_messages (session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_uq_session ON unanswered_questions (session_id, contact_provided, created_at);
+CREATE INDEX IF NOT EXISTS idx_cs_guide ON chat_sessions (guideid, session_start);
+CREATE INDEX IF NOT EXISTS idx_prop_created ON property_registration (created_date, propId);
+CREATE INDEX IF NOT EXISTS idx_prop_manager ON property_registration (manager_id, created_date, propId);
+"""
+
+_UPDATE_LIMIT = re.compile(
+    r"^\s*UPDATE\s+(\w+)\s+(SET\s+.*?)\s+(WHERE\s+.*?)\s+(ORDER\s+BY\s+.*?)\s+LIMIT\s+(\d+)\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+
+_MATCH_AGAINST = re.compile(r"MATCH\s*\(([\w.]+)\)\s*AGAINST\s*\(\s*\?\s+IN\s+BOOLEAN\s+MODE\s*\)", re.IGNORECASE)
+
+def translate(sql: str) -> str:
+    """Rewrite the MySQL-isms used by the app into SQLite"""
+    match = _UPDATE_LIMIT.match(sql)
+    if match:
+        table, set_clause, where, order, limit = match.groups()
+        sql = (f"UPDATE {table} {set_clause} WHERE rowid IN "
+               f"(SELECT rowid FROM {table} {where} {order} LIMIT {limit})")
+    sql = re.sub(r"^\s*INSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.IGNORECASE)
+    sql = sql.replace("%s", "?")
+    sql = re.sub(r"\bNOW\(\)", "CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bCURDATE\(\)", "date('now')", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bTRUE\b", "1", sql)
+    sql = re.sub(r"\bFALSE\b", "0", sql)
+    sql = _MATCH_AGAINST.sub(r"mysql_match(\1, ?)", sql)
+    return sql
+
+def mysql_match(text, query) -> int:
+    """Boolean-mode FULLTEXT for the `+word*` queries the app builds: every term must prefix a word"""
+    if text is None:
+        return 0
+    words = re.findall(r"\w+", text.lower())
+    for term in query.lower().split():
+        term = term.strip("+*")
+        if not any(w.startswith(term) for w in words):
+            return 0
+    return 1
+
+def _adapt(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+def _convert_row(row: sqlite3.Row) -> dict:
+    out = {}
+    for key in row.keys():
+        value = row[key]
+        # pymysql returns datetimes for TIMESTAMP columns; the pages call strftime on them
+        if isinstance(value, str) and key.endswith(("_date", "_at", "_start", "_end")) and len(value) >= 19:
+            try:
+                value = datetime.strptime(value[:19], "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                pass
+        out[key] = value
+    return out
+
+# ---------------- COUNTERS ----------------
+class Counters:
+    """Query/connection counters so each simulated guest turn can be measured"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.connections = 0
+        self.db_seconds = 0.0
+
+    def add(self, queries: int = 0, connections: int = 0, db_seconds: float = 0.0):
+        with self._lock:
+            self.queries += queries
+            self.connections += connections
+            self.db_seconds += db_seconds
+
+_thread_counters = threading.local()
+_scoped_counters = contextvars.ContextVar("fakedb_counters", default=None)
+
+def current_counters() -> Counters:
+    """Counters scoped by use_counters(), else this thread's own"""
+    scoped = _scoped_counters.get()
+    if scoped is not None:
+        return scoped
+    counters = getattr(_thread_counters, "value", None)
+    if counters is None:
+        counters = _thread_counters.value = Counters()
+    return counters
+
+def use_counters(counters: Counters):
+    """Charge queries in this context to `counters`; asyncio tasks and to_thread workers inherit it"""
+    _scoped_counters.set(counters)
+
+# ---------------- CONNECTION ----------------
+class FakeCursor:
+    def __init__(self, conn: "FakeConnection"):
+        self.conn = conn
+        self.connection = conn  # pymysql's name, used by batch jobs that commit per batch
+        self._cursor = conn._db.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql: str, params=None):
+        started = time.perf_counter()
+        if self.conn.query_delay:
+            time.sleep(self.conn.query_delay)
+        args = tuple(_adapt(v) for v in (params or ()))
+        with self.conn.write_lock:
+            self._cursor.execute(translate(sql), args)
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        if self.lastrowid and self.rowcount > 1:
+            # MySQL reports the first id of a multi-row INSERT, SQLite the last
+            self.lastrowid -= self.rowcount - 1
+        current_counters().add(queries=1, db_seconds=time.perf_counter() - started)
+        return self.rowcount
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return _convert_row(row) if row is not None else None
+
+    def fetchall(self):
+        return [_convert_row(r) for r in self._cursor.fetchall()]
+
+    def fetchmany(self, size: int = 1):
+        return [_convert_row(r) for r in self._cursor.fetchmany(size)]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield _convert_row(row)
+
+    def close(self):
+        self._cursor.close()
+
+class FakeConnection:
+    def __init__(self, path: str, query_delay: float, write_lock: threading.Lock):
+        # Autocommit: every app helper commits straight after its statements anyway
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.create_function("mysql_match", 2, mysql_match, deterministic=True)
+        self.query_delay = query_delay
+        self.write_lock = write_lock
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def begin(self):
+        pass
+
+    def ping(self, reconnect: bool = True):
+        return True
+
+    def close(self):
+        self._db.close()
+
+class FakeDatabase:
+    """Factory with the same call shape as db.get_connection"""
+
+    def __init__(self, path: str, connect_delay: float = 0.0, query_delay: float = 0.0):
+        self.path = path
+        self.connect_delay = connect_delay
+        self.query_delay = query_delay
+        # SQLite allows one writer; serialising statements avoids "database is locked"
+        self.write_lock = threading.Lock()
+        db = sqlite3.connect(path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        db.commit()
+        db.close()
+
+    def get_connection(self) -> FakeConnection:
+        if self.connect_delay:
+            time.sleep(self.connect_delay)
+        current_counters().add(connections=1)
+        return FakeConnection(self.path, self.query_delay, self.write_lock)
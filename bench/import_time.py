@@ -0,0 +1,94 @@
+"""
+Import-time cost of app routes from `python -X importtime`, with a budget check.
+
+Streamlit and the secrets file are loaded first as the baseline (the server
+does both before it runs app.py); what is measured is the time the route's own
+imports add on top: app.py's top-level imports plus the page modules it loads.
+The check fails when the median exceeds --budget-ms, or when a dependency that
+should load on first use (openai, PIL, qrcode) is imported by the route.
+
+    python -m bench.import_time --route chatbot --runs 5 --budget-ms 150
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = {
+    # app.py -> ?guidebook=... : the public chatbot, the route replicas cold-start on
+    'chatbot': ["auth", "db", "pages.chatbot"],
+    # Admin pages without opening a QR code or chatting
+    'admin': ["auth", "db", "pages.dashboard", "pages.property_manager_registration",
+              "pages.property_registration", "pages.guidebook_registration", "pages.mapper",
+              "pages.page_sessions"],
+}
+DEFERRED = ("openai", "PIL", "qrcode")
+MARKER = "-- route imports --"
+
+def measure_once(modules: list[str]) -> dict:
+    code = (
+        "import sys, streamlit; streamlit.secrets.get('_'); "
+        f"print({MARKER!r}, file=sys.stderr, flush=True); "
+        f"import {', '.join(modules)}"
+    )
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr[-2000:]}")
+
+    lines = result.stderr.splitlines()
+    lines = lines[lines.index(MARKER) + 1:]
+    total_us, imported = 0, {}
+    for line in lines:
+        # "import time:  <self us> | <cumulative us> | <indent><module>"
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        imported[name.strip()] = int(self_us)
+        if not name[1:].startswith(" "):  # top level: no indent after the bar
+            total_us += int(cumulative_us)
+    return {'total_ms': total_us / 1000, 'self_ms': {m: us / 1000 for m, us in imported.items()}}
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget of an app route")
+    parser.add_argument("--route", choices=sorted(ROUTES), default="chatbot")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="fail above this median import time")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    runs = [measure_once(ROUTES[args.route]) for _ in range(args.runs)]
+    median_ms = statistics.median(r['total_ms'] for r in runs)
+    last = runs[-1]['self_ms']
+    deferred = sorted(m for m in last if m.split(".")[0] in DEFERRED)
+
+    print(f"{args.route}: {median_ms:.1f} ms median over {args.runs} runs "
+          f"(min {min(r['total_ms'] for r in runs):.1f}, budget {args.budget_ms:.0f}), {len(last)} modules")
+    for module, ms in sorted(last.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {ms:8.2f} ms  {module}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"import time {median_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    if deferred:
+        roots = sorted({m.split(".")[0] for m in deferred})
+        failures.append(f"imported at route load but should be deferred: {', '.join(roots)}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({'config': vars(args), 'median_ms': median_ms,
+                       'runs_ms': [r['total_ms'] for r in runs], 'failures': failures}, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Point the app at it with OPENAI_BASE_URL = "http://127.0.0.1:8765/v1" in
+.streamlit/secrets.toml (or the OPENAI_BASE_URL env var), then run:
+
+    python -m bench.openai_stub --port 8765 --latency lognormal:-0.5,0.4
+
+Replies are scripted so that every branch of check_if_answered is exercised:
+answered, property-related unanswered, non-property and generic unable.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------- SCRIPTED RESPONSES ----------------
+RESPONSES = {
+    "answered": (
+        "According to the guidebook, here is what you need: the WiFi network is "
+        "listed on the card by the router, check-out is at 11am, and the TV remote's "
+        "source button switches between streaming apps and cable. Enjoy your stay!"
+    ),
+    "property": (
+        "I am going to pass this question to the property manager or owner. Do you mind "
+        "sharing your phone number or email so one of them can call or text you back with an answer?"
+    ),
+    "non_property": (
+        "I'm sorry, but that question is not available in the guidebook or not relevant to the "
+        "property. I can only help with questions about this specific property and its amenities, "
+        "policies, and guidelines."
+    ),
+    "unable": "I don't have information about that in the guidebook, sorry.",
+}
+
+# First matching rule wins; anything else falls through to the weighted mix.
+DEFAULT_RULES = [
+    (r"\[\[(answered|property|non_property|unable)\]\]", None),
+    (r"wifi|password|tv|remote|check.?out|check.?in|parking|trash", "answered"),
+    (r"pool heater|hot tub|pets?|early check|late check|crib|extra towels", "property"),
+    (r"weather|capital of|joke|stock|president|recipe|football", "non_property"),
+]
+
+DEFAULT_MIX = {"answered": 0.6, "property": 0.2, "non_property": 0.1, "unable": 0.1}
+
+def pick_branch(question: str, rules: list, mix: dict, rng: random.Random) -> str:
+    """Choose which scripted reply a question gets"""
+    for pattern, branch in rules:
+        match = re.search(pattern, question, re.IGNORECASE)
+        if match:
+            return branch or match.group(1)
+    roll = rng.random() * sum(mix.values())
+    for branch, weight in mix.items():
+        roll -= weight
+        if roll <= 0:
+            return branch
+    return "answered"
+
+# ---------------- LATENCY ----------------
+def parse_latency(spec: str):
+    """
+    Build a sampler from "kind:params" (seconds):
+    fixed:0.5 | uniform:0.2,1.5 | normal:0.8,0.2 | lognormal:mu,sigma | exp:0.5
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+# ---------------- USAGE ----------------
+def count_tokens(text: str) -> int:
+    """Same rough 4-chars-per-token rule as chatbot.estimate_tokens"""
+    return max(1, len(text) // 4)
+
+class StubState:
+    """Configuration plus counters shared by all handler threads"""
+
+    def __init__(self, latency: str = "fixed:0.05", mix: dict = None, rules: list = None,
+                 error_rate: float = 0.0, token_delay: float = 0.0, seed: int = None):
+        self.sample_latency = parse_latency(latency)
+        self.mix = mix or dict(DEFAULT_MIX)
+        self.rules = rules if rules is not None else list(DEFAULT_RULES)
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.seen_prefixes = set()
+        self.stats = {"requests": 0, "errors": 0, "streamed": 0}
+        self.branches = {b: 0 for b in RESPONSES}
+
+    def usage(self, messages: list, reply: str) -> dict:
+        """Usage block with prompt-cache accounting like the real API (1024+ token prefixes, 128 steps)"""
+        prompt_tokens = sum(count_tokens(m.get("content") or "") + 4 for m in messages) + 3
+        completion_tokens = count_tokens(reply)
+        cached = 0
+        if messages and messages[0].get("role") == "system":
+            system = messages[0].get("content") or ""
+            prefix_tokens = count_tokens(system)
+            key = hashlib.sha256(system.encode()).hexdigest()
+            with self.lock:
+                if key in self.seen_prefixes and prefix_tokens >= 1024:
+                    cached = (prefix_tokens // 128) * 128
+                self.seen_prefixes.add(key)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached, "audio_tokens": 0},
+            "completion_tokens_details": {"reasoning_tokens": 0, "audio_tokens": 0},
+        }
+
+# ---------------- HTTP HANDLER ----------------
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini-2024-07-18", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            with self.state.lock:
+                self._send_json(200, {**self.state.stats, "branches": dict(self.state.branches)})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        state = self.state
+
+        with state.lock:
+            state.stats["requests"] += 1
+            delay = state.sample_latency(state.rng)
+            fail = state.rng.random() < state.error_rate
+            status = state.rng.choice([429, 500, 503]) if fail else 200
+            messages = request.get("messages", [])
+            question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+            branch = pick_branch(question, state.rules, state.mix, state.rng)
+            if fail:
+                state.stats["errors"] += 1
+            else:
+                state.branches[branch] += 1
+
+        time.sleep(delay)
+        if fail:
+            self._send_json(status, {"error": {"message": "stub injected error", "type": "server_error"}},
+                            {"Retry-After": "0"} if status == 429 else None)
+            return
+
+        reply = RESPONSES[branch]
+        usage = state.usage(messages, reply)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get("model", "gpt-4o-mini-2024-07-18")
+
+        if request.get("stream"):
+            self._stream(completion_id, model, reply, usage,
+                         (request.get("stream_options") or {}).get("include_usage", False))
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply, "refusal": None},
+                "logprobs": None,
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+            "system_fingerprint": "fp_stub",
+        })
+
+    def _stream(self, completion_id: str, model: str, reply: str, usage: dict, include_usage: bool):
+        with self.state.lock:
+            self.state.stats["streamed"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta: dict, finish: str = None, chunk_usage: dict = None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+                "usage": chunk_usage,
+            }
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*", reply):
+            if self.state.token_delay:
+                time.sleep(self.state.token_delay * math.ceil(len(piece) / 4))
+            chunk({"content": piece})
+        chunk({}, "stop")
+        if include_usage:
+            chunk({}, chunk_usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+# ---------------- SERVER ----------------
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **config):
+    """Start the stub in a daemon thread. Returns (server, base_url)"""
+    handler = type("BoundStubHandler", (StubHandler,), {"state": StubState(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def parse_mix(spec: str) -> dict:
+    """"answered=0.6,property=0.2,..." -> dict"""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in RESPONSES:
+            raise ValueError(f"Unknown branch: {name}")
+        mix[name] = float(weight)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible chat completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:-0.5,0.4",
+                        help="fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MU,SIGMA | exp:MEAN")
+    parser.add_argument("--mix", default=None, help="branch weights, e.g. answered=0.6,property=0.2,non_property=0.1,unable=0.1")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429/5xx")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds per streamed token")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        args.host, args.port,
+        latency=args.latency,
+        mix=parse_mix(args.mix) if args.mix else None,
+        error_rate=args.error_rate,
+        token_delay=args.token_delay,
+        seed=args.seed
+    )
+    print(f"OpenAI stub listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
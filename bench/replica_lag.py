@@ -0,0 +1,103 @@
+"""
+Measure read-replica lag between two MySQL instances (see bench/replica/).
+
+Writes a heartbeat row on the primary and polls the replica until it appears,
+recording end-to-end visibility lag alongside the replica's own
+Seconds_Behind_Source, as used by db.get_read_connection's health check.
+
+    python -m bench.replica_lag --primary 127.0.0.1:33061 --replica 127.0.0.1:33062 --password bench
+    python -m bench.replica_lag ... --write-load 200   # add background insert load on the primary
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+import pymysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import measure_replica_lag
+
+def connect(address: str, user: str, password: str, database: str):
+    host, _, port = address.partition(":")
+    return pymysql.connect(host=host, port=int(port or 3306), user=user, password=password,
+                           database=database, autocommit=True, cursorclass=pymysql.cursors.DictCursor)
+
+def background_writes(conn, rows_per_sec: int, stop: threading.Event):
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS replication_load (id BIGINT AUTO_INCREMENT PRIMARY KEY, payload TEXT)")
+        while not stop.is_set():
+            started = time.perf_counter()
+            cursor.executemany("INSERT INTO replication_load (payload) VALUES (%s)", [("x" * 512,)] * max(rows_per_sec // 10, 1))
+            time.sleep(max(0.0, 0.1 - (time.perf_counter() - started)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Primary -> replica visibility lag probe")
+    parser.add_argument("--primary", required=True, help="host:port")
+    parser.add_argument("--replica", required=True, help="host:port")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--database", default="property_management")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--write-load", type=int, default=0, help="background rows/sec inserted on the primary")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    primary = connect(args.primary, args.user, args.password, args.database)
+    replica = connect(args.replica, args.user, args.password, args.database)
+    with primary.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS replication_heartbeat (token CHAR(36) PRIMARY KEY, written_at TIMESTAMP(6))")
+
+    stop = threading.Event()
+    if args.write_load:
+        loader = connect(args.primary, args.user, args.password, args.database)
+        threading.Thread(target=background_writes, args=(loader, args.write_load, stop), daemon=True).start()
+
+    visibility, reported, timeouts = [], [], 0
+    for _ in range(args.samples):
+        token = str(uuid.uuid4())
+        with primary.cursor() as cursor:
+            cursor.execute("INSERT INTO replication_heartbeat (token, written_at) VALUES (%s, NOW(6))", (token,))
+        written = time.perf_counter()
+        with replica.cursor() as cursor:
+            while True:
+                cursor.execute("SELECT 1 FROM replication_heartbeat WHERE token = %s", (token,))
+                if cursor.fetchone():
+                    visibility.append((time.perf_counter() - written) * 1000)
+                    break
+                if time.perf_counter() - written > args.timeout:
+                    timeouts += 1
+                    break
+                time.sleep(0.002)
+        lag = measure_replica_lag(replica)
+        if lag is not None:
+            reported.append(lag)
+        time.sleep(args.interval)
+    stop.set()
+
+    ordered = sorted(visibility)
+    result = {
+        'samples': len(visibility),
+        'timeouts': timeouts,
+        'visibility_ms': {
+            'p50': round(ordered[len(ordered) // 2], 2) if ordered else None,
+            'p95': round(ordered[int(len(ordered) * 0.95)], 2) if ordered else None,
+            'max': round(ordered[-1], 2) if ordered else None,
+            'mean': round(statistics.fmean(ordered), 2) if ordered else None,
+        },
+        'seconds_behind_source_max': max(reported) if reported else None,
+        'write_load_rows_per_sec': args.write_load,
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Recall and latency of guide_retrieval's chunk selection on a synthetic long
+guidebook: each topic section is asked about in guest wording that mostly
+avoids the section's own words ("how do I get online" for the WiFi section).
+
+    python -m bench.retrieval_bench
+    python -m bench.retrieval_bench --k 4 --filler 40 --sizes 100,1000,10000,100000
+    python -m bench.retrieval_bench --embedder openai          # needs OPENAI_API_KEY
+
+Recall@k counts questions whose section is among the top-k chunks; the word
+overlap baseline is what keyword matching over guide_text finds. Latency
+compares numpy top-k over a float32 matrix with a pure-Python cosine loop.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import guide_retrieval
+from guide_retrieval import chunk_text, top_k, EMBEDDERS
+from transcript_search import tokenize
+
+# (heading, section text, guest questions)
+SECTIONS = [
+    ("WiFi", "WiFi network name is SeaBreeze_Guest and the WiFi password is sandcastle42. "
+             "The router is in the hall cabinet; unplug it for ten seconds if the signal drops.",
+     ["how do I get online", "what's the internet code", "the network isn't working, what should I do"]),
+    ("Parking", "Parking: two spaces in the driveway. Street parking is free after 6pm. "
+                "Please do not block the neighbour's garage.",
+     ["where can I leave my car", "is there somewhere for our vehicle", "can we bring two cars"]),
+    ("Check-out", "Check-out is at 11am. Start the dishwasher, strip the beds and leave the keys on the counter.",
+     ["what time do we have to leave", "what should we do before departure", "when is departure on the last day"]),
+    ("Check-in", "Check-in is from 4pm. The lockbox code is 2468 and the lockbox is to the left of the front door.",
+     ["when can we arrive", "how do we get in when arriving", "what is the entry code"]),
+    ("Trash", "Trash and recycling bins are at the side of the house. Collection is Tuesday morning; "
+              "bins go to the curb Monday night.",
+     ["where does the garbage go", "what day is rubbish collected", "where do I put waste"]),
+    ("Heating", "The thermostat is in the living room. Heating and air conditioning are set between 65 and 75.",
+     ["it's cold, how do I warm the house", "how do I change the temperature", "is there AC"]),
+    ("Television", "The TV in the lounge has Netflix and Disney+ signed in. The remote is in the coffee table drawer.",
+     ["can we watch movies", "where is the television remote", "do you have streaming"]),
+    ("Linens", "Extra towels, sheets and pillows are in the upstairs linen closet. Beach towels are in the garage.",
+     ["we need more bedding", "where are spare pillows", "can I get more towels for the beach"]),
+    ("Hot tub", "The hot tub is open 8am to 10pm. Keep the cover on when not in use; no glass near the spa.",
+     ["can we use the jacuzzi at night", "what are the rules for the tub", "is the spa heated"]),
+    ("Laundry", "The washer and dryer are in the basement. Detergent pods are on the shelf above the dryer.",
+     ["can I wash clothes", "where is the washing machine", "do you provide detergent"]),
+    ("Pets", "Pets are welcome with prior approval. Dogs must not be left alone in the house.",
+     ["can we bring our dog", "are cats allowed", "is the place pet friendly"]),
+]
+
+FILLER = [
+    "The house was built in 1952 and restored in 2019 with original oak floors throughout.",
+    "Local restaurants include the Harbor Grill, known for fish tacos, and Mama Rosa's pizzeria.",
+    "Quiet hours are from 10pm to 8am out of respect for our neighbours.",
+    "The farmers market runs every Saturday morning in the town square, two blocks north.",
+    "Smoking is not permitted anywhere on the property, including the porch.",
+    "The nearest hospital is Coastal General, a fifteen minute drive along Route 1.",
+    "Board games and puzzles are in the cabinet under the stairs.",
+    "Please report any damage so we can fix it before the next guests arrive.",
+]
+
+def synthetic_guidebook(filler_paragraphs: int, rng: random.Random) -> str:
+    sections = [f"{heading}\n{text}" for heading, text, _ in SECTIONS]
+    fillers = [" ".join(rng.choice(FILLER) for _ in range(4)) for _ in range(filler_paragraphs)]
+    paragraphs = sections + fillers
+    rng.shuffle(paragraphs)
+    return "\n\n".join(paragraphs)
+
+def overlap_top_k(chunks: list, question: str, k: int) -> list:
+    """Keyword baseline: chunks ranked by shared words with the question"""
+    terms = set(tokenize(question))
+    scored = sorted(range(len(chunks)), key=lambda i: len(terms & set(tokenize(chunks[i]))), reverse=True)
+    return [i for i in scored[:k] if terms & set(tokenize(chunks[i]))]
+
+def evaluate_recall(embedder, text: str, k: int) -> dict:
+    chunks = chunk_text(text)
+    matrix = embedder.embed_documents(chunks)
+    hits = {'embedding': 0, 'overlap': 0}
+    misses = []
+    questions = 0
+    for heading, section, asks in SECTIONS:
+        target = {i for i, chunk in enumerate(chunks) if section in chunk}
+        for question in asks:
+            questions += 1
+            best = set(int(i) for i in top_k(matrix, embedder.embed_query(question), k))
+            if best & target:
+                hits['embedding'] += 1
+            else:
+                misses.append(f"{heading}: {question}")
+            if set(overlap_top_k(chunks, question, k)) & target:
+                hits['overlap'] += 1
+    return {'chunks': len(chunks), 'questions': questions, 'misses': misses,
+            **{name: count / questions for name, count in hits.items()}}
+
+def python_top_k(rows: list, query: list, k: int) -> list:
+    scores = [(sum(a * b for a, b in zip(row, query)), i) for i, row in enumerate(rows)]
+    return [i for _, i in sorted(scores, reverse=True)[:k]]
+
+def time_call(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--embedder", choices=list(EMBEDDERS), default="hashed")
+    parser.add_argument("--k", type=int, default=guide_retrieval.RETRIEVAL_TOP_K)
+    parser.add_argument("--filler", type=int, default=40, help="unrelated paragraphs mixed into the guidebook")
+    parser.add_argument("--sizes", default="100,1000,10000,100000", help="chunk counts for the latency table")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    embedder = EMBEDDERS[args.embedder]()
+    text = synthetic_guidebook(args.filler, rng)
+
+    started = time.perf_counter()
+    result = evaluate_recall(embedder, text, args.k)
+    index_ms = (time.perf_counter() - started) * 1000
+    print(f"Guidebook: {len(text):,} chars, {result['chunks']} chunks, {result['questions']} questions, "
+          f"embedder {embedder.name}")
+    print(f"Recall@{args.k}: embedding {result['embedding']:.0%}, word overlap {result['overlap']:.0%}")
+    for miss in result['misses']:
+        print(f"  missed  {miss}")
+    print(f"Index + all queries: {index_ms:.0f} ms")
+    print(f"Query embedding: {time_call(lambda: embedder.embed_query('how do I get online'), args.repeat):.3f} ms")
+
+    print(f"\nTop-{args.k} latency (median of {args.repeat}), dim {embedder.dim}")
+    print(f"{'chunks':>8} {'numpy ms':>10} {'python ms':>10} {'float32 KiB':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        matrix = np.random.default_rng(args.seed).standard_normal((size, embedder.dim), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        query = matrix[0]
+        numpy_ms = time_call(lambda: top_k(matrix, query, args.k), args.repeat)
+        if size <= 10000:
+            rows, q = matrix.tolist(), query.tolist()
+            python_ms = f"{time_call(lambda: python_top_k(rows, q, args.k), max(1, args.repeat // 10)):10.2f}"
+        else:
+            python_ms = f"{'-':>10}"
+        print(f"{size:>8} {numpy_ms:>10.3f} {python_ms} {matrix.nbytes / 1024:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
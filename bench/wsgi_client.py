@@ -0,0 +1,81 @@
+"""
+In-process client for WSGI apps such as chat_api.app: builds the environ,
+calls the app directly and returns the status, headers and body, so the API
+can be exercised without starting a server.
+
+    from bench.wsgi_client import WSGIClient
+    client = WSGIClient(chat_api.app)
+    status, headers, body = client.post("/api/sessions", {"guidebook": "beach_house"})
+    for event, data in client.events("POST", f"/api/sessions/{sid}/messages", {"message": "Hi", "stream": True}):
+        ...
+"""
+import io
+import json
+from wsgiref.util import setup_testing_defaults
+
+class WSGIClient:
+    def __init__(self, app, remote_addr: str = "127.0.0.1"):
+        self.app = app
+        self.remote_addr = remote_addr
+
+    def _environ(self, method: str, path: str, body=None, headers: dict = None) -> dict:
+        raw = json.dumps(body).encode("utf-8") if body is not None else b""
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'REMOTE_ADDR': self.remote_addr,
+            'CONTENT_TYPE': "application/json",
+            'CONTENT_LENGTH': str(len(raw)),
+            'wsgi.input': io.BytesIO(raw),
+        }
+        for name, value in (headers or {}).items():
+            environ['HTTP_' + name.upper().replace("-", "_")] = value
+        setup_testing_defaults(environ)
+        return environ
+
+    def open(self, method: str, path: str, body=None, headers: dict = None):
+        """Call the app; returns (status code, headers dict, body iterator)"""
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(response_headers)
+
+        chunks = self.app(self._environ(method, path, body, headers), start_response)
+        return response['status'], response['headers'], iter(chunks)
+
+    def request(self, method: str, path: str, body=None, headers: dict = None):
+        """Call the app and decode a JSON response; returns (status, headers, payload)"""
+        status, response_headers, chunks = self.open(method, path, body, headers)
+        raw = b"".join(chunks)
+        payload = json.loads(raw) if response_headers.get("Content-Type", "").startswith("application/json") else raw
+        return status, response_headers, payload
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, body=None, **kwargs):
+        return self.request("POST", path, body, **kwargs)
+
+    def delete(self, path: str, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def events(self, method: str, path: str, body=None, headers: dict = None):
+        """Yield (event, data) from a server-sent-events response as the app produces them"""
+        headers = {'Accept': "text/event-stream", **(headers or {})}
+        status, response_headers, chunks = self.open(method, path, body, headers)
+        if not response_headers.get("Content-Type", "").startswith("text/event-stream"):
+            raise RuntimeError(f"Expected an event stream, got {status}: {b''.join(chunks)[:200]!r}")
+        buffer = ""
+        for chunk in chunks:
+            buffer += chunk.decode("utf-8")
+            while "\n\n" in buffer:
+                block, buffer = buffer.split("\n\n", 1)
+                event, data = "message", []
+                for line in block.splitlines():
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data.append(line[5:].strip())
+                if data:
+                    yield event, json.loads("\n".join(data))
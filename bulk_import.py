@@ -0,0 +1,481 @@
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from db import get_connection
+from compression import pack
+from guide_retrieval import index_guidebook
+from guide_versions import guidebook_hash, version_row, VERSION_COLUMNS
+from qr_codes import generate_qr_batch
+from ref_cache import invalidate
+
+CHUNK_SIZE = 200
+INSERT_BATCH_ROWS = 500
+QR_BATCH = 25
+
+# ---------------- READERS ----------------
+def iter_records(stream, fmt: str = "csv"):
+    """
+    Yield (line number, record dict) from a binary CSV, JSON Lines or JSON array
+    stream. CSV and JSON Lines are read incrementally; a JSON array is parsed whole.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, {k.strip().lower(): v for k, v in record.items() if k}
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(text, start=1):
+            if line.strip():
+                yield line_no, json.loads(line)
+    elif fmt == "json":
+        for index, record in enumerate(json.load(text), start=1):
+            yield index, record
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+    text.detach()
+
+def detect_format(filename: str) -> str:
+    name = filename.lower()
+    if name.endswith(".jsonl") or name.endswith(".ndjson"):
+        return "jsonl"
+    if name.endswith(".json"):
+        return "json"
+    return "csv"
+
+def field(record: dict, *names: str) -> str:
+    """First non-empty value among the accepted column names, stripped"""
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+def split_list(value) -> list[str]:
+    """A JSON list or a ;-separated CSV cell"""
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    if not value:
+        return []
+    return [v.strip() for v in str(value).split(";") if v.strip()]
+
+# ---------------- BATCHED WRITES ----------------
+def insert_many(cursor, table: str, columns: list[str], rows: list[tuple], batch_rows: int = INSERT_BATCH_ROWS):
+    """Multi-row INSERT ... VALUES (...), (...) in batches of `batch_rows`"""
+    row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    for start in range(0, len(rows), batch_rows):
+        batch = rows[start:start + batch_rows]
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+               + ", ".join([row_placeholder] * len(batch)))
+        cursor.execute(sql, [value for row in batch for value in row])
+
+def new_report() -> dict:
+    return {'read': 0, 'imported': 0, 'rejected': 0, 'errors': [], 'bytes_read': 0,
+            'started': time.perf_counter(), 'seconds': 0.0, 'rows_per_sec': 0.0}
+
+_report_lock = threading.Lock()  # reports are updated by the reader and the writer thread
+
+def _reject(report: dict, line: int, message: str):
+    with _report_lock:
+        report['rejected'] += 1
+        report['errors'].append({'line': line, 'error': message})
+
+def _tick(report: dict, stream, progress):
+    report['seconds'] = time.perf_counter() - report['started']
+    report['rows_per_sec'] = report['imported'] / report['seconds'] if report['seconds'] else 0.0
+    try:
+        report['bytes_read'] = stream.tell()
+    except (OSError, ValueError):
+        pass
+    if progress:
+        progress(report)
+
+def validated_chunks(stream, fmt: str, validate, chunk_size: int, report: dict):
+    """Stream records through `validate` (record -> (row, error)), yielding lists of (line, row)"""
+    chunk = []
+    for line, record in iter_records(stream, fmt):
+        report['read'] += 1
+        try:
+            row, error = validate(record)
+        except Exception as e:
+            row, error = None, f"Invalid record: {e}"
+        if error:
+            _reject(report, line, error)
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def write_chunk(conn, chunk: list, write_rows, report: dict):
+    """
+    Write a validated chunk in one transaction. If the chunk fails, roll back
+    and retry its rows one by one so the bad rows can be reported individually.
+    """
+    try:
+        with conn.cursor() as cursor:
+            write_rows(cursor, [row for _, row in chunk])
+        conn.commit()
+        with _report_lock:
+            report['imported'] += len(chunk)
+        return
+    except Exception:
+        conn.rollback()
+    for line, row in chunk:
+        try:
+            with conn.cursor() as cursor:
+                write_rows(cursor, [row])
+            conn.commit()
+            with _report_lock:
+                report['imported'] += 1
+        except Exception as e:
+            conn.rollback()
+            _reject(report, line, f"Database error: {e}")
+
+# ---------------- GUIDEBOOKS ----------------
+# Columns: title, guide_text, original_url, description (optional),
+# property_ids and/or property_addresses (;-separated in CSV, lists in JSON).
+# The guidebook_registration column names are accepted as well.
+def _slug_of(url: str) -> str:
+    return url.split("guidebook=", 1)[1] if "guidebook=" in url else ""
+
+def load_guidebook_lookups(conn) -> dict:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT propId, property_address FROM property_registration")
+        properties = cursor.fetchall()
+        cursor.execute("SELECT guide_chatbot_url FROM guidebook_registration")
+        urls = cursor.fetchall()
+    return {
+        'property_ids': {p['propId'] for p in properties},
+        'addresses': {p['property_address'].strip().lower(): p['propId'] for p in properties if p['property_address']},
+        'slugs': {_slug_of(u['guide_chatbot_url'] or "") for u in urls},
+    }
+
+def validate_guidebook(record: dict, lookups: dict, base_url: str = None):
+    """Returns (row, None) for a valid record or (None, error message)"""
+    from pages.guidebook_registration import generate_chatbot_url, guidebook_slug
+
+    title = field(record, "title", "guidebook_title")
+    text = field(record, "guide_text", "text", "content")
+    original_url = field(record, "original_url", "guide_original_url", "url")
+    description = field(record, "description", "chatbot_description") or "Ask me anything about this guidebook!"
+    if not (title and text and original_url):
+        return None, "Title, guide_text and original_url are required"
+    if not original_url.startswith(("http://", "https://")):
+        return None, f"original_url is not an http(s) URL: {original_url[:80]}"
+
+    property_ids = set()
+    for propid in split_list(record.get("property_ids")):
+        if propid not in lookups['property_ids']:
+            return None, f"Unknown property id: {propid}"
+        property_ids.add(propid)
+    for address in split_list(record.get("property_addresses")):
+        propid = lookups['addresses'].get(address.lower())
+        if propid is None:
+            return None, f"Unknown property address: {address}"
+        property_ids.add(propid)
+    if not property_ids:
+        return None, "At least one property is required"
+
+    slug = guidebook_slug(title)
+    if not slug:
+        return None, "Title has no characters usable in a chatbot URL"
+    if slug in lookups['slugs']:
+        return None, f"Chatbot URL slug '{slug}' is already in use"
+    lookups['slugs'].add(slug)
+
+    return {
+        'guideid': str(uuid.uuid4()),
+        'title': title,
+        'text': text,
+        'original_url': original_url,
+        'description': description,
+        'chatbot_url': generate_chatbot_url(title, base_url),
+        'property_ids': sorted(property_ids),
+    }, None
+
+def _write_guidebooks(user: str):
+    def write_rows(cursor, rows: list):
+        now = datetime.now()
+        hashes = [guidebook_hash(r['title'], r['text'], r['original_url']) for r in rows]
+        insert_many(cursor, "guidebook_registration",
+                    ["guideid", "guidebook_title", "guide_text", "current_version", "content_hash",
+                     "guide_original_url", "guide_chatbot_url", "chatbot_description", "qr_code_base64",
+                     "created_by", "created_date"],
+                    [(r['guideid'], r['title'], pack(r['text']), 1, content_hash, r['original_url'], r['chatbot_url'],
+                      r['description'], r['qr_base64'], user, now) for r, content_hash in zip(rows, hashes)])
+        insert_many(cursor, "guidebook_versions", VERSION_COLUMNS,
+                    [version_row(r['guideid'], 1, content_hash, r['title'], r['text'], r['original_url'], user, now)
+                     for r, content_hash in zip(rows, hashes)])
+        insert_many(cursor, "mapper", ["propid", "guideid", "created_by", "created_date"],
+                    [(propid, r['guideid'], user, now) for r in rows for propid in r['property_ids']])
+        for r in rows:
+            index_guidebook(cursor, r['guideid'], r['text'])
+    return write_rows
+
+def import_guidebooks(stream, fmt: str, user: str, base_url: str = None, chunk_size: int = CHUNK_SIZE,
+                      workers: int = None, dry_run: bool = False, progress=None) -> dict:
+    """
+    Stream, validate and insert guidebooks with their property mappings.
+    QR codes for one chunk are rendered in a process pool while the previous
+    chunk is being written. Returns the import report.
+    """
+    report = new_report()
+    conn = get_connection()
+    try:
+        lookups = load_guidebook_lookups(conn)
+        write_rows = _write_guidebooks(user)
+        workers = workers or os.cpu_count() or 1
+        if workers > 1:
+            # spawn: forking the multi-threaded Streamlit server is unsafe
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            # One CPU: a process pool only adds overhead, but a thread still overlaps QR rendering with DB writes
+            pool = ThreadPoolExecutor(max_workers=1)
+        with pool:
+            pending = None  # (chunk, QR futures) waiting to be written
+
+            def submit(chunk):
+                batches = [chunk[i:i + QR_BATCH] for i in range(0, len(chunk), QR_BATCH)]
+                return [(batch, pool.submit(generate_qr_batch, [row['chatbot_url'] for _, row in batch]))
+                        for batch in batches]
+
+            def finish(item):
+                ready = []
+                for batch, future in item:
+                    try:
+                        for (line, row), qr in zip(batch, future.result()):
+                            row['qr_base64'] = qr
+                            ready.append((line, row))
+                    except Exception as e:
+                        for line, _ in batch:
+                            _reject(report, line, f"QR generation failed: {e}")
+                if ready:
+                    write_chunk(conn, ready, write_rows, report)
+                _tick(report, stream, progress)
+
+            for chunk in validated_chunks(stream, fmt, lambda r: validate_guidebook(r, lookups, base_url),
+                                          chunk_size, report):
+                if dry_run:
+                    report['imported'] += len(chunk)
+                    _tick(report, stream, progress)
+                    continue
+                submitted = submit(chunk)
+                if pending:
+                    finish(pending)
+                pending = submitted
+            if pending:
+                finish(pending)
+    finally:
+        conn.close()
+        if report['imported'] and not dry_run:
+            invalidate("guidebook_registration")
+    _tick(report, stream, progress)
+    return report
+
+# ---------------- MANAGERS & PROPERTIES ----------------
+def _in_query(conn, sql: str, values: list) -> list:
+    """Run `sql` with its {} replaced by one placeholder per value"""
+    if not values:
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(sql.format(", ".join(["%s"] * len(values))), values)
+        return cursor.fetchall()
+
+def import_with_writer(stream, fmt: str, validate, prepare, write_rows, table: str, chunk_size: int = CHUNK_SIZE,
+                       dry_run: bool = False, progress=None) -> dict:
+    """
+    Shared pipeline: the calling thread validates a chunk and runs `prepare`
+    (per-chunk lookups, hashing) while a writer thread commits the previous
+    chunk on its own connection. `table` is invalidated in the reference cache.
+    """
+    report = new_report()
+    lookup_conn = get_connection()
+    write_conn = None if dry_run else get_connection()
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-writer") as writer:
+            pending = None
+            for chunk in validated_chunks(stream, fmt, validate, chunk_size, report):
+                chunk = prepare(lookup_conn, chunk, report)
+                if dry_run:
+                    report['imported'] += len(chunk)
+                    _tick(report, stream, progress)
+                    continue
+                if pending:
+                    pending.result()
+                    _tick(report, stream, progress)
+                pending = writer.submit(write_chunk, write_conn, chunk, write_rows, report) if chunk else None
+            if pending:
+                pending.result()
+    finally:
+        lookup_conn.close()
+        if write_conn:
+            write_conn.close()
+        if report['imported'] and not dry_run:
+            invalidate(table)
+    _tick(report, stream, progress)
+    return report
+
+# Managers: manager_name, contact_address (optional), email, phone, password
+def validate_manager(record: dict, seen_emails: set):
+    from pages.property_manager_registration import validate_email, validate_phone, validate_password
+
+    name = field(record, "manager_name", "name")
+    address = field(record, "contact_address", "address")
+    email = field(record, "email")
+    phone = field(record, "phone")
+    password = field(record, "password")
+    if not all([name, email, phone, password]):
+        return None, "manager_name, email, phone and password are required"
+    if not validate_email(email):
+        return None, f"Invalid email: {email}"
+    if not validate_phone(phone):
+        return None, f"Invalid phone number: {phone}"
+    is_valid, message = validate_password(password)
+    if not is_valid:
+        return None, message
+    if email.lower() in seen_emails:
+        return None, f"Duplicate email in file: {email}"
+    seen_emails.add(email.lower())
+    return {'manager_id': str(uuid.uuid4()), 'name': name, 'address': address, 'email': email,
+            'phone': phone, 'password': password}, None
+
+def prepare_managers(conn, chunk: list, report: dict) -> list:
+    """One IN query for the chunk's emails, then hash the surviving passwords"""
+    from pages.property_manager_registration import hash_password
+
+    rows = _in_query(conn, "SELECT email FROM property_manager WHERE email IN ({})", [r['email'] for _, r in chunk])
+    taken = {r['email'].lower() for r in rows}
+    ready = []
+    for line, row in chunk:
+        if row['email'].lower() in taken:
+            _reject(report, line, f"Email is already registered: {row['email']}")
+            continue
+        row['password'] = hash_password(row['password'])
+        ready.append((line, row))
+    return ready
+
+def write_managers(cursor, rows: list):
+    now = datetime.now()
+    insert_many(cursor, "property_manager",
+                ["manager_id", "manager_name", "contact_address", "email", "phone", "password", "created_date"],
+                [(r['manager_id'], r['name'], r['address'], r['email'], r['phone'], r['password'], now)
+                 for r in rows])
+
+def import_managers(stream, fmt: str, user: str, chunk_size: int = CHUNK_SIZE, dry_run: bool = False,
+                    progress=None) -> dict:
+    """Stream, validate and insert property managers. Returns the import report"""
+    seen = set()
+    return import_with_writer(stream, fmt, lambda r: validate_manager(r, seen), prepare_managers,
+                              write_managers, "property_manager", chunk_size, dry_run, progress)
+
+# Properties: property_address, and optionally manager_email or manager_id
+def validate_property(record: dict, seen_addresses: set):
+    address = field(record, "property_address", "address")
+    if not address:
+        return None, "property_address is required"
+    if address.lower() in seen_addresses:
+        return None, f"Duplicate address in file: {address}"
+    seen_addresses.add(address.lower())
+    return {'propid': str(uuid.uuid4()), 'address': address,
+            'manager_email': field(record, "manager_email"), 'manager_id': field(record, "manager_id")}, None
+
+def prepare_properties(conn, chunk: list, report: dict) -> list:
+    """Per chunk: one IN query for already-registered addresses and one per manager key type"""
+    existing = _in_query(conn, "SELECT property_address FROM property_registration WHERE property_address IN ({})",
+                         [r['address'] for _, r in chunk])
+    taken = {r['property_address'].lower() for r in existing}
+    emails = sorted({r['manager_email'].lower() for _, r in chunk if r['manager_email']})
+    ids = sorted({r['manager_id'] for _, r in chunk if r['manager_id']})
+    by_email = {m['email'].lower(): m['manager_id'] for m in _in_query(
+        conn, "SELECT manager_id, email FROM property_manager WHERE is_active = TRUE AND email IN ({})", emails)}
+    known_ids = {m['manager_id'] for m in _in_query(
+        conn, "SELECT manager_id FROM property_manager WHERE is_active = TRUE AND manager_id IN ({})", ids)}
+
+    ready = []
+    for line, row in chunk:
+        if row['address'].lower() in taken:
+            _reject(report, line, f"Property address is already registered: {row['address']}")
+            continue
+        if row['manager_email']:
+            row['manager_id'] = by_email.get(row['manager_email'].lower())
+            if row['manager_id'] is None:
+                _reject(report, line, f"No active property manager with email {row['manager_email']}")
+                continue
+        elif row['manager_id'] and row['manager_id'] not in known_ids:
+            _reject(report, line, f"No active property manager with id {row['manager_id']}")
+            continue
+        ready.append((line, row))
+    return ready
+
+def _write_properties(user: str):
+    def write_rows(cursor, rows: list):
+        now = datetime.now()
+        insert_many(cursor, "property_registration",
+                    ["propId", "property_address", "created_date", "created_by", "manager_id"],
+                    [(r['propid'], r['address'], now, user, r['manager_id'] or None) for r in rows])
+    return write_rows
+
+def import_properties(stream, fmt: str, user: str, chunk_size: int = CHUNK_SIZE, dry_run: bool = False,
+                      progress=None) -> dict:
+    """Stream, validate and insert properties, resolving managers by email or id. Returns the import report"""
+    seen = set()
+    return import_with_writer(stream, fmt, lambda r: validate_property(r, seen), prepare_properties,
+                              _write_properties(user), "property_registration", chunk_size, dry_run, progress)
+
+# ---------------- CLI ----------------
+IMPORTERS = {
+    'guidebooks': import_guidebooks,
+    'managers': import_managers,
+    'properties': import_properties,
+}
+
+def print_progress(report: dict):
+    print(f"\r{report['read']} read, {report['imported']} imported, {report['rejected']} rejected "
+          f"({report['rows_per_sec']:.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bulk_import", description="Bulk import from CSV/JSON")
+    parser.add_argument("kind", choices=sorted(IMPORTERS))
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=["csv", "json", "jsonl"], default=None)
+    parser.add_argument("--user", default="bulk_import", help="recorded as created_by")
+    parser.add_argument("--base-url", default=None, help="guidebooks: chatbot base URL, e.g. https://guide.example.com")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per transaction")
+    parser.add_argument("--workers", type=int, default=None, help="guidebooks: QR process pool size (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="validate only")
+    parser.add_argument("--errors", default=None, help="write rejected rows as JSON Lines to this path")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.file)
+    with open(args.file, "rb") as stream:
+        options = {'chunk_size': args.chunk_size, 'dry_run': args.dry_run, 'progress': print_progress}
+        if args.kind == "guidebooks":
+            options.update(base_url=args.base_url, workers=args.workers)
+        report = IMPORTERS[args.kind](stream, fmt, args.user, **options)
+    print(file=sys.stderr)
+    verb = "Valid" if args.dry_run else "Imported"
+    print(f"{verb}: {report['imported']}, rejected: {report['rejected']}, read: {report['read']} "
+          f"in {report['seconds']:.1f}s ({report['rows_per_sec']:.0f} rows/s)")
+    for error in report['errors'][:20]:
+        print(f"  line {error['line']}: {error['error']}")
+    if len(report['errors']) > 20:
+        print(f"  ... {len(report['errors']) - 20} more")
+    if args.errors:
+        with open(args.errors, "w") as f:
+            for error in report['errors']:
+                f.write(json.dumps(error) + "\n")
+    sys.exit(1 if report['rejected'] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import argparse
+import json
+import queue
+import re
+import threading
+import time
+import types
+from collections import OrderedDict
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, make_server
+import streamlit as st
+import metrics
+import session_memory
+from db import get_read_connection
+from rate_limit import client_ip
+from pages.chatbot import (
+    get_guidebook_by_slug, get_guidebook_by_id, create_chat_session, end_chat_session,
+    get_session_contact_info, run_chat_turn, submit_contact_info, skip_contact, trim_transcript,
+)
+
+# ---------------- SETTINGS ----------------
+# JSON chat endpoints for the embedded widget and mobile clients. A turn runs
+# the same run_chat_turn as the Streamlit page, without the page's rerun.
+#   python -m chat_api --port 8600        (or any WSGI server: chat_api:app)
+# Metrics are not served here (the API is public and CORS-open): set
+# METRICS_PORT to scrape them from metrics' listener on METRICS_HOST.
+ALLOWED_ORIGINS = st.secrets.get("CHAT_API_ALLOWED_ORIGINS", "*")
+SESSION_TTL_SECONDS = int(st.secrets.get("CHAT_API_SESSION_TTL_SECONDS", 1800))
+MAX_SESSIONS = int(st.secrets.get("CHAT_API_MAX_SESSIONS", 10000))
+MAX_MESSAGE_CHARS = 2000
+MAX_BODY_BYTES = 64 * 1024
+SSE_KEEPALIVE_SECONDS = 15
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+# ---------------- SESSIONS ----------------
+# Guest state lives in this process, in the same shape as st.session_state on
+# the chatbot page. A session evicted here, or created by another replica, is
+# rebuilt from chat_sessions/chat_messages on its next request.
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def _new_state(session_id: str, guidebook: dict) -> types.SimpleNamespace:
+    existing = get_session_contact_info(session_id)
+    return types.SimpleNamespace(
+        session_id=session_id,
+        guidebook=guidebook,
+        messages=[],
+        total_input_tokens=0,
+        total_output_tokens=0,
+        awaiting_contact=False,
+        pending_question=None,
+        transcript_trimmed=False,
+        saved_phone=existing.get('user_phone') if existing else None,
+        saved_email=existing.get('user_email') if existing else None,
+        turn_lock=threading.Lock(),
+        last_used=time.monotonic(),
+    )
+
+def _remember(state):
+    with _sessions_lock:
+        _sessions[state.session_id] = state
+        _sessions.move_to_end(state.session_id)
+        cutoff = time.monotonic() - SESSION_TTL_SECONDS
+        while _sessions and (len(_sessions) > MAX_SESSIONS or next(iter(_sessions.values())).last_used < cutoff):
+            evicted, _ = _sessions.popitem(last=False)
+            session_memory.forget(evicted)
+
+def _restore_state(session_id: str):
+    """Rebuild a guest's state from the database, or None for an unknown/ended session"""
+    from pages.page_sessions import get_session_messages
+    conn = get_read_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT guideid, session_start, is_active FROM chat_sessions WHERE session_id = %s",
+            (session_id,)
+        )
+        row = cursor.fetchone()
+    conn.close()
+    if not row or not row['is_active']:
+        return None
+    guidebook = get_guidebook_by_id(row['guideid'])
+    if not guidebook:
+        return None
+    state = _new_state(session_id, guidebook)
+    state.messages = [{"role": m['role'], "content": m['content']}
+                      for m in get_session_messages(session_id, row['session_start'])]
+    trim_transcript(state, source="api")
+    return state
+
+def get_state(session_id: str):
+    with _sessions_lock:
+        state = _sessions.get(session_id)
+    if state is None:
+        state = _restore_state(session_id)
+        if state is None:
+            raise ApiError(404, "Chat session not found or ended")
+    state.last_used = time.monotonic()
+    _remember(state)
+    return state
+
+def session_payload(state) -> dict:
+    guidebook = state.guidebook
+    return {
+        'session_id': state.session_id,
+        'guidebook': {
+            'guideid': guidebook['guideid'],
+            'title': guidebook['guidebook_title'],
+            'description': guidebook.get('chatbot_description') or 'Ask me anything about this guidebook!',
+            'original_url': guidebook.get('guide_original_url'),
+        },
+        'messages': [{'role': m['role'], 'content': m['content']} for m in state.messages],
+        'transcript_trimmed': state.transcript_trimmed,
+        'awaiting_contact': state.awaiting_contact,
+        'contact_on_file': bool(state.saved_phone or state.saved_email),
+    }
+
+# ---------------- HANDLERS ----------------
+def create_session(environ, body: dict):
+    if body.get('guidebook'):
+        guidebook = get_guidebook_by_slug(str(body['guidebook']))
+    elif body.get('guideid'):
+        guidebook = get_guidebook_by_id(str(body['guideid']))
+    else:
+        raise ApiError(400, "Specify 'guidebook' (URL slug) or 'guideid'")
+    if not guidebook:
+        raise ApiError(404, "Guidebook not found")
+
+    session_id = create_chat_session(guidebook['guideid'], str(body.get('user_identifier') or 'anonymous')[:255])
+    state = _new_state(session_id, guidebook)
+    _remember(state)
+    return 201, session_payload(state)
+
+def show_session(environ, body: dict, session_id: str):
+    return 200, session_payload(get_state(session_id))
+
+def end_session(environ, body: dict, session_id: str):
+    state = get_state(session_id)
+    end_chat_session(session_id)
+    with _sessions_lock:
+        _sessions.pop(state.session_id, None)
+    session_memory.forget(session_id)
+    return 200, {'session_id': session_id, 'ended': True}
+
+def _turn_payload(state, turn: dict, first_reply: int) -> dict:
+    payload = {
+        'response': turn['response'],
+        'replies': [m['content'] for m in state.messages[first_reply:]],
+        'was_answered': turn['was_answered'],
+        'rate_limited': turn['rate_limited'],
+        'awaiting_contact': state.awaiting_contact,
+    }
+    trim_transcript(state, source="api")
+    return payload
+
+def post_message(environ, body: dict, session_id: str):
+    """
+    One guest turn. JSON by default; with `Accept: text/event-stream` or
+    {"stream": true} the reply is sent as server-sent events: `delta` events
+    carry text as it is generated and a final `done` event carries the same
+    payload as the JSON response (its `response` is authoritative, e.g. when
+    the model call failed part-way and the guest gets the error message).
+    """
+    message = str(body.get('message') or "").strip()
+    if not message:
+        raise ApiError(400, "'message' is required")
+    if len(message) > MAX_MESSAGE_CHARS:
+        raise ApiError(413, f"Messages are limited to {MAX_MESSAGE_CHARS} characters")
+
+    state = get_state(session_id)
+    if state.awaiting_contact:
+        raise ApiError(409, "Submit or skip contact details first (POST .../contact)")
+    if not state.turn_lock.acquire(blocking=False):
+        raise ApiError(409, "The previous message is still being answered")
+    client_ip = client_ip_of(environ)
+
+    if not (body.get('stream') or "text/event-stream" in environ.get('HTTP_ACCEPT', "")):
+        try:
+            first_reply = len(state.messages) + 1
+            turn = run_chat_turn(state, message, state.guidebook, client_ip)
+            return 200, _turn_payload(state, turn, first_reply)
+        finally:
+            state.turn_lock.release()
+
+    events = queue.Queue()
+
+    def run():
+        try:
+            first_reply = len(state.messages) + 1
+            turn = run_chat_turn(state, message, state.guidebook, client_ip,
+                                 on_delta=lambda text: events.put(("delta", {'text': text})))
+            events.put(("done", _turn_payload(state, turn, first_reply)))
+        except Exception as e:
+            print(f"Chat API turn failed: {e}")
+            events.put(("error", {'error': "The message could not be answered, please try again"}))
+        finally:
+            state.turn_lock.release()
+
+    threading.Thread(target=run, name="chat-api-turn", daemon=True).start()
+
+    def stream():
+        # The turn finishes (and is saved) even if the client disconnects mid-stream
+        while True:
+            try:
+                event, data = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield b": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+            if event != "delta":
+                return
+
+    return 200, stream()
+
+def post_contact(environ, body: dict, session_id: str):
+    """Contact details for the pending unanswered question, or {"skip": true}"""
+    state = get_state(session_id)
+    if not state.awaiting_contact:
+        raise ApiError(409, "No question is waiting for contact details")
+    if body.get('skip'):
+        return 200, {'saved': False, 'reply': skip_contact(state), 'awaiting_contact': False}
+    saved, message = submit_contact_info(state, str(body.get('phone') or "").strip(),
+                                         str(body.get('email') or "").strip())
+    if not saved:
+        raise ApiError(400, message)
+    return 200, {'saved': True, 'reply': message, 'awaiting_contact': False}
+
+def health(environ, body: dict):
+    with _sessions_lock:
+        active = len(_sessions)
+    return 200, {'ok': True, 'sessions_in_memory': active}
+
+ROUTES = [
+    ("GET", re.compile(r"^/api/health$"), health),
+    ("POST", re.compile(r"^/api/sessions$"), create_session),
+    ("GET", re.compile(r"^/api/sessions/([\w-]+)$"), show_session),
+    ("DELETE", re.compile(r"^/api/sessions/([\w-]+)$"), end_session),
+    ("POST", re.compile(r"^/api/sessions/([\w-]+)/messages$"), post_message),
+    ("POST", re.compile(r"^/api/sessions/([\w-]+)/contact$"), post_contact),
+]
+
+# ---------------- WSGI APP ----------------
+def client_ip_of(environ) -> str:
+    """
+    Same rule as pages.chatbot.get_client_ip: X-Forwarded-For only counts for
+    TRUSTED_PROXY_HOPS, else REMOTE_ADDR (callers can reach the API directly)
+    """
+    return client_ip(environ.get('HTTP_X_FORWARDED_FOR'), environ.get('REMOTE_ADDR'))
+
+def _cors_headers(environ) -> list:
+    origin = environ.get('HTTP_ORIGIN')
+    if not origin:
+        return []
+    allowed = [o.strip() for o in ALLOWED_ORIGINS.split(",")]
+    if "*" not in allowed and origin not in allowed:
+        return []
+    return [
+        ("Access-Control-Allow-Origin", "*" if "*" in allowed else origin),
+        ("Access-Control-Allow-Methods", "GET, POST, DELETE, OPTIONS"),
+        ("Access-Control-Allow-Headers", "Content-Type, Accept"),
+        ("Vary", "Origin"),
+    ]
+
+def _read_json(environ) -> dict:
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if length > MAX_BODY_BYTES:
+        raise ApiError(413, "Request body too large")
+    if not length:
+        return {}
+    try:
+        body = json.loads(environ['wsgi.input'].read(length))
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object")
+    return body
+
+STATUS_TEXT = {200: "200 OK", 201: "201 Created", 204: "204 No Content", 400: "400 Bad Request",
+               404: "404 Not Found", 405: "405 Method Not Allowed", 409: "409 Conflict",
+               413: "413 Payload Too Large", 500: "500 Internal Server Error"}
+
+def app(environ, start_response):
+    method = environ['REQUEST_METHOD']
+    path = environ.get('PATH_INFO') or "/"
+    headers = _cors_headers(environ)
+
+    if method == "OPTIONS":
+        start_response(STATUS_TEXT[204], headers)
+        return [b""]
+
+    try:
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                status, payload = handler(environ, _read_json(environ), *match.groups())
+                break
+        else:
+            known_path = any(pattern.match(path) for _, pattern, _ in ROUTES)
+            raise ApiError(405 if known_path else 404, "Method not allowed" if known_path else "Not found")
+    except ApiError as e:
+        status, payload = e.status, {'error': str(e)}
+    except Exception as e:
+        print(f"Chat API error on {method} {path}: {e}")
+        status, payload = 500, {'error': "Internal server error"}
+
+    if isinstance(payload, dict):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        start_response(STATUS_TEXT[status], headers + [
+            ("Content-Type", "application/json; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ])
+        return [body]
+
+    start_response(STATUS_TEXT[status], headers + [
+        ("Content-Type", "text/event-stream; charset=utf-8"),
+        ("Cache-Control", "no-cache"),
+        ("X-Accel-Buffering", "no"),  # nginx: don't buffer the stream
+    ])
+    return payload
+
+# Prometheus scrape listener for this process (METRICS_PORT); started once
+metrics.start_metrics_server()
+
+# ---------------- DEV SERVER ----------------
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m chat_api", description="Serve the guest chat JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, app, server_class=ThreadingWSGIServer)
+    print(f"Chat API listening on http://{args.host}:{args.port}/api")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
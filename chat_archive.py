@@ -0,0 +1,297 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+from datetime import date, datetime
+import pymysql
+import streamlit as st
+from db import get_connection
+
+# ---------------- SETTINGS ----------------
+# chat_messages is range-partitioned by month (migrations/m0002). Partitions
+# older than the retention window are exported here and dropped from MySQL,
+# oldest first, together with their transcript search postings.
+ARCHIVE_DIR = st.secrets.get("CHAT_ARCHIVE_DIR", "chat_archive")
+RETENTION_MONTHS = int(st.secrets.get("CHAT_RETENTION_MONTHS", 12))
+PARTITIONS_AHEAD = 3
+
+# ---------------- PARTITION NAMING ----------------
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+def partition_month(name: str) -> date:
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+def partition_clause(month: date) -> str:
+    """Partition holding rows created during `month` (created_at is a TIMESTAMP, hence UNIX_TIMESTAMP)"""
+    return (f"PARTITION {partition_name(month)} "
+            f"VALUES LESS THAN (UNIX_TIMESTAMP('{add_months(month, 1):%Y-%m-%d} 00:00:00'))")
+
+def list_partitions(cursor) -> list[str]:
+    """Monthly partitions of chat_messages, oldest first (excludes the catch-all pmax)"""
+    cursor.execute(
+        """
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'chat_messages'
+        AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+        """
+    )
+    return [r['partition_name'] for r in cursor.fetchall() if r['partition_name'] != "pmax"]
+
+def ensure_future_partitions(cursor, months_ahead: int = PARTITIONS_AHEAD) -> list[str]:
+    """Split pmax so the next `months_ahead` months each have their own partition"""
+    existing = list_partitions(cursor)
+    if not existing:
+        return []
+    last = partition_month(existing[-1])
+    wanted = add_months(month_start(date.today()), months_ahead)
+    new_months = []
+    month = add_months(last, 1)
+    while month <= wanted:
+        new_months.append(month)
+        month = add_months(month, 1)
+    if new_months:
+        clauses = ", ".join(partition_clause(m) for m in new_months)
+        cursor.execute(
+            f"ALTER TABLE chat_messages REORGANIZE PARTITION pmax INTO "
+            f"({clauses}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+    return [partition_name(m) for m in new_months]
+
+# ---------------- ARCHIVE FILES ----------------
+# One <YYYY-MM>.jsonl.gz per archived month. Each session's messages are written
+# as a separate gzip member, so the file is still plain gzipped JSONL for zcat
+# and pandas, while <YYYY-MM>.index.json maps session_id -> [offset, length]
+# and a transcript can be read without decompressing the whole month.
+def _paths(month: date) -> tuple[str, str]:
+    base = os.path.join(ARCHIVE_DIR, f"chat_messages-{month:%Y-%m}")
+    return base + ".jsonl.gz", base + ".index.json"
+
+def _manifest_path() -> str:
+    return os.path.join(ARCHIVE_DIR, "manifest.json")
+
+def load_manifest() -> dict:
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'months': {}}
+
+def _save_manifest(manifest: dict):
+    tmp = _manifest_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, _manifest_path())
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value
+
+def write_archive(rows, data_path: str, index_path: str) -> int:
+    """
+    Write rows (ordered by session_id, id) as per-session gzip members.
+    Files are written under .tmp names and renamed, so a crash never leaves a
+    half-written archive behind. Returns the number of rows written.
+    """
+    index = {}
+    count = 0
+    current, buffer = None, []
+
+    with open(data_path + ".tmp", "wb") as out:
+        def flush():
+            if buffer:
+                member = gzip.compress("".join(buffer).encode("utf-8"), compresslevel=6)
+                index[current] = [out.tell(), len(member)]
+                out.write(member)
+
+        for row in rows:
+            if row['session_id'] != current:
+                flush()
+                current, buffer = row['session_id'], []
+            buffer.append(json.dumps({k: _encode(v) for k, v in row.items()}, ensure_ascii=False) + "\n")
+            count += 1
+        flush()
+        out.flush()
+        os.fsync(out.fileno())
+
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+    return count
+
+def prune_search_postings(conn, before: datetime, batch_size: int = 5000) -> int:
+    """
+    Delete the search postings of messages created before `before`; returns
+    postings deleted. Unanswered questions stay in MySQL and keep theirs.
+    """
+    deleted = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM chat_search_terms WHERE source = 'm' AND created_at < %s LIMIT %s",
+                (before, batch_size)
+            )
+            count = cursor.rowcount
+        conn.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+def archive_partition(conn, partition: str, batch_size: int = 5000) -> dict:
+    """Export one partition to disk, verify the row count, drop its search postings, then drop it"""
+    month = partition_month(partition)
+    data_path, index_path = _paths(month)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) AS n FROM chat_messages PARTITION ({partition})")
+        expected = cursor.fetchone()['n']
+
+    def rows():
+        # Unbuffered cursor: a month of messages is streamed, not loaded into memory
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(f"SELECT * FROM chat_messages PARTITION ({partition}) ORDER BY session_id, id")
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
+
+    written = write_archive(rows(), data_path, index_path)
+    if written != expected:
+        raise RuntimeError(f"Archive of {partition} has {written} rows, expected {expected}; partition kept")
+
+    # Before the drop, so a failed run leaves nothing behind that a re-run skips
+    postings = prune_search_postings(conn, datetime.combine(add_months(month, 1), datetime.min.time()), batch_size)
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE chat_messages DROP PARTITION {partition}")
+    conn.commit()
+
+    manifest = load_manifest()
+    manifest['months'][f"{month:%Y-%m}"] = {
+        'rows': written,
+        'data': os.path.basename(data_path),
+        'index': os.path.basename(index_path),
+        'bytes': os.path.getsize(data_path),
+        'archived_at': datetime.now().isoformat(timespec="seconds"),
+    }
+    _save_manifest(manifest)
+    return {'partition': partition, 'rows': written, 'bytes': os.path.getsize(data_path), 'postings': postings}
+
+def run_archival(retention_months: int = RETENTION_MONTHS, dry_run: bool = False) -> dict:
+    """Add upcoming partitions and archive every partition older than the retention window"""
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            partitions = list_partitions(cursor)
+            if not partitions:
+                raise RuntimeError("chat_messages is not partitioned; run `python -m migrations` first")
+            created = [] if dry_run else ensure_future_partitions(cursor)
+        conn.commit()
+        expired = [p for p in partitions if partition_month(p) < cutoff]
+        archived = expired if dry_run else [archive_partition(conn, p) for p in expired]
+    finally:
+        conn.close()
+    return {'cutoff': f"{cutoff:%Y-%m}", 'created': created, 'archived': archived}
+
+# ---------------- READING ARCHIVES ----------------
+_index_cache = {}
+_index_lock = threading.Lock()
+
+def _load_index(index_path: str) -> dict:
+    mtime = os.path.getmtime(index_path)
+    with _index_lock:
+        cached = _index_cache.get(index_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(index_path) as f:
+        index = json.load(f)
+    with _index_lock:
+        _index_cache[index_path] = (mtime, index)
+    return index
+
+def archived_before() -> date | None:
+    """First month still held in MySQL, or None when nothing has been archived"""
+    months = load_manifest()['months']
+    if not months:
+        return None
+    latest = max(months)
+    return add_months(date(int(latest[:4]), int(latest[5:7]), 1), 1)
+
+def archived_months() -> list[date]:
+    """Months moved out of MySQL, oldest first"""
+    return [date(int(month[:4]), int(month[5:7]), 1) for month in sorted(load_manifest()['months'])]
+
+def _decode_row(line: str) -> dict:
+    row = json.loads(line)
+    if row.get('created_at'):
+        row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return row
+
+def iter_archived_month(month: date):
+    """
+    Every archived message of `month`, ordered by session_id and id. The
+    per-session gzip members are read as one stream, one line at a time.
+    """
+    data_path, _ = _paths(month)
+    with gzip.open(data_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield _decode_row(line)
+
+def read_archived_messages(session_id: str, since=None) -> list[dict]:
+    """Archived messages of one session, oldest first; `since` skips months before the session began"""
+    messages = []
+    first_month = f"{month_start(since):%Y-%m}" if since else None
+    for month in sorted(load_manifest()['months']):
+        if first_month and month < first_month:
+            continue
+        data_path, index_path = _paths(date(int(month[:4]), int(month[5:7]), 1))
+        try:
+            entry = _load_index(index_path).get(session_id)
+        except FileNotFoundError:
+            continue
+        if entry is None:
+            continue
+        offset, length = entry
+        with open(data_path, "rb") as f:
+            f.seek(offset)
+            payload = gzip.decompress(f.read(length)).decode("utf-8")
+        messages.extend(_decode_row(line) for line in payload.splitlines())
+    messages.sort(key=lambda m: (m['created_at'], m['id']))
+    return messages
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m chat_archive",
+                                     description="Maintain chat_messages partitions and archive old months")
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS)
+    parser.add_argument("--dry-run", action="store_true", help="list partitions that would be archived")
+    args = parser.parse_args()
+
+    result = run_archival(args.retention_months, args.dry_run)
+    print(f"Retention cutoff: {result['cutoff']}")
+    if result['created']:
+        print(f"Created partitions: {', '.join(result['created'])}")
+    if args.dry_run:
+        print(f"Would archive: {', '.join(result['archived']) or 'nothing'}")
+        return
+    for a in result['archived']:
+        print(f"Archived {a['partition']}: {a['rows']} rows, {a['bytes'] / 1024:.0f} KiB, "
+              f"{a['postings']} search postings deleted")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+import pymysql
+import streamlit as st
+from db import get_read_connection
+from chat_archive import add_months, archived_before, archived_months, iter_archived_month
+
+# ---------------- SETTINGS ----------------
+# Bulk exports of the chat tables for BI. Rows are streamed from MySQL with an
+# unbuffered server-side cursor (SSDictCursor) and written EXPORT_CHUNK_ROWS at
+# a time, so memory stays flat however large the date range is. The page
+# writes to a file under EXPORT_DIR; the CLI writes to disk or stdout.
+# Months of chat_messages that chat_archive.py has moved to gzip files are
+# read from those files, so a range before the archive horizon is complete.
+EXPORT_DIR = st.secrets.get("CHAT_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "chat_exports"))
+EXPORT_CHUNK_ROWS = int(st.secrets.get("CHAT_EXPORT_CHUNK_ROWS", 5000))
+EXPORT_KEEP_SECONDS = 3600
+FORMATS = ("csv", "parquet")
+
+# Columns per dataset with their Parquet types. Rows come out in storage
+# order: an ORDER BY over a whole date range would make MySQL sort the range
+# before sending the first row.
+EXPORTS = {
+    'sessions': {
+        'table': "chat_sessions",
+        'time_column': "session_start",
+        'columns': [
+            ("session_id", "string"), ("guideid", "string"), ("user_identifier", "string"),
+            ("session_start", "timestamp"), ("session_end", "timestamp"), ("is_active", "bool"),
+            ("total_messages", "int64"), ("total_input_tokens", "int64"), ("total_output_tokens", "int64"),
+            ("total_cached_tokens", "int64"),
+        ],
+    },
+    'messages': {
+        'table': "chat_messages",
+        'time_column': "created_at",
+        'archived': True,
+        'columns': [
+            ("id", "int64"), ("session_id", "string"), ("guideid", "string"), ("guide_version", "int64"),
+            ("role", "string"),
+            ("content", "string"), ("input_tokens", "int64"), ("output_tokens", "int64"),
+            ("cached_tokens", "int64"), ("was_answered", "bool"), ("created_at", "timestamp"),
+        ],
+    },
+    'unanswered': {
+        'table': "unanswered_questions",
+        'time_column': "created_at",
+        'columns': [
+            ("id", "int64"), ("session_id", "string"), ("guideid", "string"), ("user_question", "string"),
+            ("ai_response", "string"), ("reason", "string"), ("user_phone", "string"), ("user_email", "string"),
+            ("contact_provided", "bool"), ("created_at", "timestamp"),
+        ],
+    },
+}
+
+# ---------------- STREAMING READ ----------------
+def _bounds(start: date, end: date) -> tuple:
+    """[start 00:00, end + 1 day 00:00) so `end` is inclusive, like the page's date filters"""
+    return (datetime.combine(start, datetime.min.time()),
+            datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+def iter_archived_rows(start: date, end: date, guideid: str = None):
+    """Archived messages created in [start, end], month file by month file"""
+    low, high = _bounds(start, end)
+    for month in archived_months():
+        if month >= high.date() or add_months(month, 1) <= low.date():
+            continue
+        for row in iter_archived_month(month):
+            if low <= row['created_at'] < high and (not guideid or row['guideid'] == guideid):
+                yield row
+
+def iter_chunks(dataset: str, start: date, end: date, guideid: str = None, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Yield lists of up to `chunk_rows` rows (value lists in EXPORTS column order):
+    archived months first, then the live table from an unbuffered cursor.
+    Compressed columns (m0003) are decoded per row.
+    """
+    spec = EXPORTS[dataset]
+    names = [name for name, _ in spec['columns']]
+    low, high = _bounds(start, end)
+    horizon = archived_before() if spec.get('archived') else None
+    if horizon and low.date() < horizon:
+        chunk = []
+        # Archived rows predate columns added later (e.g. cached_tokens); those export empty
+        for row in iter_archived_rows(start, end, guideid):
+            chunk.append([row.get(name) for name in names])
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        # Rows before the horizon come only from the archive, even while a
+        # just-archived partition is still being dropped
+        low = max(low, datetime.combine(horizon, datetime.min.time()))
+        if low >= high:
+            return
+
+    sql = (f"SELECT {', '.join(names)} FROM {spec['table']} "
+           f"WHERE {spec['time_column']} >= %s AND {spec['time_column']} < %s")
+    params = [low, high]
+    if guideid:
+        sql += " AND guideid = %s"
+        params.append(guideid)
+
+    conn = get_read_connection()
+    try:
+        # Closing an unbuffered cursor early drains the rest of the result,
+        # so an abandoned export still releases the connection cleanly
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield [[row[name] for name in names] for row in rows]
+    finally:
+        conn.close()
+
+# ---------------- WRITERS ----------------
+def write_csv(chunks, columns: list, out) -> int:
+    """Write chunks as UTF-8 CSV with a header to the binary file `out`; returns rows written"""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow([name for name, _ in columns])
+    rows = 0
+    try:
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    finally:
+        text.detach()  # leave `out` open for the caller
+    return rows
+
+def _arrow_schema(pa, columns: list):
+    types = {'string': pa.string(), 'int64': pa.int64(), 'bool': pa.bool_(), 'timestamp': pa.timestamp("s")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+def write_parquet(chunks, columns: list, out) -> int:
+    """Write chunks as one Parquet row group each to the binary file `out`; returns rows written"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+    schema = _arrow_schema(pa, columns)
+    bools = [i for i, (_, kind) in enumerate(columns) if kind == "bool"]
+    rows = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            values = list(zip(*chunk))
+            for i in bools:
+                # MySQL BOOLEAN is TINYINT(1)
+                values[i] = [None if v is None else bool(v) for v in values[i]]
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(values, schema)], schema=schema))
+            rows += len(chunk)
+    return rows
+
+def export(dataset: str, start: date, end: date, fmt: str, out, guideid: str = None,
+           chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """Stream `dataset` rows created in [start, end] to the binary file `out`; returns rows written"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    chunks = iter_chunks(dataset, start, end, guideid, chunk_rows)
+    columns = EXPORTS[dataset]['columns']
+    try:
+        if fmt == "parquet":
+            return write_parquet(chunks, columns, out)
+        return write_csv(chunks, columns, out)
+    finally:
+        chunks.close()
+
+def export_filename(dataset: str, start: date, end: date, fmt: str, compress: bool = True) -> str:
+    suffix = ".parquet" if fmt == "parquet" else (".csv.gz" if compress else ".csv")
+    return f"{dataset}_{start:%Y%m%d}-{end:%Y%m%d}{suffix}"
+
+# ---------------- PAGE EXPORTS ----------------
+def _remove_stale_exports():
+    cutoff = time.time() - EXPORT_KEEP_SECONDS
+    try:
+        entries = list(os.scandir(EXPORT_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def export_to_file(dataset: str, start: date, end: date, fmt: str, guideid: str = None) -> dict:
+    """
+    Export into a new file under EXPORT_DIR (CSV gzipped) for the page's
+    download button. Files older than EXPORT_KEEP_SECONDS are removed first.
+    Returns {'path', 'filename', 'rows', 'bytes', 'seconds'}.
+    """
+    _remove_stale_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    filename = export_filename(dataset, start, end, fmt)
+    started = time.perf_counter()
+    fd, path = tempfile.mkstemp(prefix=filename.split(".")[0] + "-", suffix="." + filename.split(".", 1)[1],
+                                dir=EXPORT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if fmt == "csv":
+                with gzip.GzipFile(filename=filename[:-3], mode="wb", fileobj=f, compresslevel=6) as gz:
+                    rows = export(dataset, start, end, fmt, gz, guideid)
+            else:
+                rows = export(dataset, start, end, fmt, f, guideid)
+    except BaseException:
+        os.remove(path)
+        raise
+    return {'path': path, 'filename': filename, 'rows': rows, 'bytes': os.path.getsize(path),
+            'seconds': time.perf_counter() - started}
+
+def read_export(path: str) -> bytes:
+    """File contents for st.download_button(data=...), read only when the button is clicked"""
+    with open(path, "rb") as f:
+        return f.read()
+
+# ---------------- CLI ----------------
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m chat_export",
+                                     description="Stream chat sessions, messages and unanswered questions to CSV or Parquet")
+    parser.add_argument("dataset", choices=[*EXPORTS, "all"])
+    parser.add_argument("--start", type=_parse_date, required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", type=_parse_date, default=date.today(), help="last day (inclusive), default today")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--guideid", help="only this guidebook")
+    parser.add_argument("--gzip", action="store_true", help="gzip CSV output")
+    parser.add_argument("--out", default=".",
+                        help="output directory, or '-' to write CSV to stdout (single dataset)")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    datasets = list(EXPORTS) if args.dataset == "all" else [args.dataset]
+    if args.out == "-":
+        if args.format != "csv" or len(datasets) != 1:
+            parser.error("--out - writes a single dataset as CSV")
+        out = sys.stdout.buffer
+        if args.gzip:
+            out = gzip.GzipFile(mode="wb", fileobj=out)
+        export(datasets[0], args.start, args.end, "csv", out, args.guideid, args.chunk_rows)
+        out.flush()
+        if args.gzip:
+            out.close()
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    for dataset in datasets:
+        path = os.path.join(args.out, export_filename(dataset, args.start, args.end, args.format, args.gzip))
+        started = time.perf_counter()
+        with open(path, "wb") as f:
+            if args.format == "csv" and args.gzip:
+                with gzip.GzipFile(mode="wb", fileobj=f) as gz:
+                    rows = export(dataset, args.start, args.end, "csv", gz, args.guideid, args.chunk_rows)
+            else:
+                rows = export(dataset, args.start, args.end, args.format, f, args.guideid, args.chunk_rows)
+        print(f"{dataset}: {rows} rows -> {path} "
+              f"({os.path.getsize(path) / 1024:.0f} KiB, {time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import zlib
+import streamlit as st
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available; zstd is used only when installed and selected
+    zstandard = None
+
+# ---------------- SETTINGS ----------------
+# Long text columns are stored compressed in BLOB columns (migrations/m0003).
+# Values shorter than COMPRESS_MIN_BYTES, or that don't shrink, stay plain.
+COMPRESSED_COLUMNS = frozenset({"guide_text", "content"})
+COMPRESS_MIN_BYTES = int(st.secrets.get("COMPRESS_MIN_BYTES", 256))
+COMPRESSION_CODEC = st.secrets.get("COMPRESSION_CODEC", "zlib")
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+# A NUL byte never occurs in stored UTF-8 text, so it can't be mistaken for a marker
+ZLIB_MARKER = b"\x00Zz"
+ZSTD_MARKER = b"\x00Zs"
+
+def is_packed(value) -> bool:
+    return isinstance(value, (bytes, bytearray)) and value[:2] == b"\x00Z"
+
+def pack(text):
+    """Text to its stored form: marker + compressed UTF-8 when worthwhile, else the text unchanged"""
+    if text is None or is_packed(text):
+        return text
+    raw = text.encode("utf-8") if isinstance(text, str) else bytes(text)
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text
+    if COMPRESSION_CODEC == "zstd" and zstandard is not None:
+        packed = ZSTD_MARKER + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        packed = ZLIB_MARKER + zlib.compress(raw, ZLIB_LEVEL)
+    return packed if len(packed) < len(raw) else text
+
+def unpack(value):
+    """Stored form back to text; plain values (str, or bytes from a BLOB column) pass through"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    marker = value[:3]
+    if marker == ZLIB_MARKER:
+        return zlib.decompress(value[3:]).decode("utf-8")
+    if marker == ZSTD_MARKER:
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed value found but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(value[3:]).decode("utf-8")
+    return value.decode("utf-8")
+
+class LazyRow(dict):
+    """
+    DictCursor row whose compressed columns are decoded on first access, so
+    list pages that never touch guide_text/content don't pay for it.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if key in COMPRESSED_COLUMNS and isinstance(value, (bytes, bytearray)):
+            value = unpack(value)
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    # Overriding __iter__ makes dict(row) and {**row} go through __getitem__
+    def __iter__(self):
+        return dict.__iter__(self)
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def copy(self):
+        return dict(self.items())
+
+def wrap_row(row):
+    """LazyRow for dict rows that carry a compressed column; anything else unchanged"""
+    if type(row) is dict and not COMPRESSED_COLUMNS.isdisjoint(row):
+        return LazyRow(row)
+    return row
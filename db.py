@@ -1,7 +1,26 @@
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
 import pymysql
 import streamlit as st
+import metrics
+import profiling
+from compression import wrap_row
 
-def get_connection():
+logger = logging.getLogger("db")
+
+SLOW_QUERY_MS = float(st.secrets.get("SLOW_QUERY_MS", 250))
+REPLICA_MAX_LAG_SECONDS = float(st.secrets.get("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_HEALTH_TTL_SECONDS = 10
+
+CONNECTIONS_OPENED = metrics.counter("db_connections_opened_total", "Database connections opened", ("target",))
+QUERY_SECONDS = metrics.histogram("db_query_duration_seconds", "Statement latency by calling helper", ("helper",))
+
+def _connect():
     return pymysql.connect(
         host=st.secrets["host"],
         user="avnadmin",
@@ -12,3 +31,326 @@ def get_connection():
         cursorclass=pymysql.cursors.DictCursor
     )
 
+def _connect_replica():
+    return pymysql.connect(
+        host=st.secrets["replica_host"],
+        user=st.secrets.get("replica_user", "avnadmin"),
+        password=st.secrets.get("replica_password", st.secrets["password"]),
+        database="property_management",
+        port=int(st.secrets.get("replica_port", 17028)),
+        charset="utf8mb4",
+        cursorclass=pymysql.cursors.DictCursor,
+        connect_timeout=3
+    )
+
+# Swapped out by benchmarks (bench/fakedb.py) without touching call sites
+_connection_factory = _connect
+_replica_factory = _connect_replica if st.secrets.get("replica_host") else None
+
+def set_connection_factory(factory, replica_factory=None):
+    """Replace the raw connection factories; None restores the MySQL defaults"""
+    global _connection_factory, _replica_factory
+    _connection_factory = factory or _connect
+    _replica_factory = replica_factory
+
+def get_connection():
+    """Connection to the primary; use for writes and anything that must see them"""
+    conn = _connection_factory()
+    _record_connection()
+    CONNECTIONS_OPENED.inc(target="primary")
+    return InstrumentedConnection(conn)
+
+# ---------------- READ REPLICA ----------------
+_replica_lock = threading.Lock()     # held for the whole health check
+_replica_counts_lock = threading.Lock()
+_replica_health = {
+    'healthy': False,
+    'lag_seconds': None,
+    'checked_at': None,
+    'error': None,
+    'replica_reads': 0,
+    'primary_fallbacks': 0,
+}
+
+def measure_replica_lag(conn):
+    """Seconds the replica is behind its source, or None when it doesn't report replication status"""
+    with conn.cursor() as cursor:
+        for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                                  ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+            try:
+                cursor.execute(statement)
+            except pymysql.MySQLError:
+                continue
+            row = cursor.fetchone()
+            if row and row.get(column) is not None:
+                return float(row[column])
+            return None
+    return None
+
+def _check_replica():
+    """Refresh the cached replica health at most once per REPLICA_HEALTH_TTL_SECONDS"""
+    now = time.monotonic()
+    checked_at = _replica_health['checked_at']
+    if checked_at is not None and now - checked_at < REPLICA_HEALTH_TTL_SECONDS:
+        return
+    if not _replica_lock.acquire(blocking=False):
+        return  # another thread is checking; use the cached verdict meanwhile
+    try:
+        try:
+            conn = _replica_factory()
+            try:
+                lag = measure_replica_lag(conn)
+            finally:
+                conn.close()
+            healthy = lag is not None and lag <= REPLICA_MAX_LAG_SECONDS
+            error = None if healthy else ("replication status unavailable" if lag is None else "lag above threshold")
+        except Exception as e:
+            lag, healthy, error = None, False, str(e)
+        if not healthy:
+            logger.warning("Read replica unhealthy (%s, lag=%s); reads go to the primary", error, lag)
+        _replica_health.update(healthy=healthy, lag_seconds=lag, checked_at=now, error=error)
+    finally:
+        _replica_lock.release()
+
+def note_session_write():
+    """Remember that this browser session just wrote, so its next reads stay on the primary"""
+    if st.runtime.exists():
+        try:
+            st.session_state["_db_last_write"] = time.monotonic()
+        except Exception:
+            pass
+
+def _session_wrote_recently() -> bool:
+    if not st.runtime.exists():
+        return False
+    try:
+        last_write = st.session_state.get("_db_last_write")
+    except Exception:
+        return False
+    return last_write is not None and time.monotonic() - last_write < REPLICA_MAX_LAG_SECONDS
+
+def get_read_connection():
+    """
+    Connection for reporting reads: the replica when configured, healthy and within
+    REPLICA_MAX_LAG_SECONDS, otherwise the primary. Sessions that wrote within the
+    lag window read from the primary so they see their own changes.
+    """
+    if _replica_factory is None:
+        return get_connection()
+    _check_replica()
+    if _replica_health['healthy'] and not _session_wrote_recently():
+        try:
+            conn = _replica_factory()
+            _record_connection()
+            CONNECTIONS_OPENED.inc(target="replica")
+            _count_replica_use('replica_reads')
+            return InstrumentedConnection(conn)
+        except Exception as e:
+            _replica_health.update(healthy=False, error=str(e))
+    _count_replica_use('primary_fallbacks')
+    return get_connection()
+
+def _count_replica_use(key: str):
+    # Script threads read concurrently; += on the shared dict would lose counts
+    with _replica_counts_lock:
+        _replica_health[key] += 1
+
+def get_replica_status() -> dict:
+    """Cached replica health for ops pages"""
+    return {'configured': _replica_factory is not None, **_replica_health}
+
+# ---------------- QUERY STATS ----------------
+_stats_lock = threading.Lock()
+_fingerprints = {}
+_pages = {}
+_slow_queries = deque(maxlen=100)
+_rerun = threading.local()
+
+def begin_rerun(page: str):
+    """Attribute queries on this thread to `page` until the next call (app.py calls this once per rerun)"""
+    _rerun.page = page or "(none)"
+    _rerun.queries = 0
+    _rerun.ms = 0.0
+    with _stats_lock:
+        _page_stats(_rerun.page)['reruns'] += 1
+
+def current_page() -> str:
+    return getattr(_rerun, "page", "(none)")
+
+def _page_stats(page: str) -> dict:
+    stats = _pages.get(page)
+    if stats is None:
+        stats = _pages[page] = {
+            'reruns': 0,
+            'queries': 0,
+            'total_ms': 0.0,
+            'connections': 0,
+            'max_queries_per_rerun': 0,
+            'max_ms_per_rerun': 0.0,
+        }
+    return stats
+
+def _record_connection():
+    with _stats_lock:
+        _page_stats(current_page())['connections'] += 1
+
+_LITERALS = [
+    (re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL), " "),
+    (re.compile(r"'(?:[^'\\]|\\.)*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?+)"),
+    (re.compile(r"\s+"), " "),
+]
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    """Normalised statement shape: literals and placeholders become ?, whitespace collapsed"""
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+def _caller() -> str:
+    """module.function of the first frame outside this module"""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+def _record_query(sql: str, elapsed_ms: float, rows: int):
+    if rows is None or rows >= 2 ** 63:
+        # Unbuffered cursors (SSCursor) report 2**64 - 1 until the result is read
+        rows = -1
+    fp = fingerprint(sql)
+    caller = _caller()
+    page = current_page()
+    if hasattr(_rerun, "queries"):
+        _rerun.queries += 1
+        _rerun.ms += elapsed_ms
+
+    with _stats_lock:
+        entry = _fingerprints.get(fp)
+        if entry is None:
+            entry = _fingerprints[fp] = {
+                'fingerprint': fp,
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'rows': 0,
+                'callers': set(),
+                'pages': set(),
+            }
+        entry['count'] += 1
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        entry['rows'] += max(rows, 0)
+        entry['callers'].add(caller)
+        entry['pages'].add(page)
+
+        stats = _page_stats(page)
+        stats['queries'] += 1
+        stats['total_ms'] += elapsed_ms
+        if hasattr(_rerun, "queries"):
+            stats['max_queries_per_rerun'] = max(stats['max_queries_per_rerun'], _rerun.queries)
+            stats['max_ms_per_rerun'] = max(stats['max_ms_per_rerun'], _rerun.ms)
+
+        if elapsed_ms >= SLOW_QUERY_MS:
+            _slow_queries.append({
+                'at': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'ms': round(elapsed_ms, 1),
+                'rows': rows,
+                'caller': caller,
+                'page': page,
+                'fingerprint': fp,
+            })
+
+    profiling.record("db", caller, elapsed_ms)
+    QUERY_SECONDS.observe(elapsed_ms / 1000, helper=caller)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning("Slow query %.1f ms (%s rows) in %s on page %s: %s", elapsed_ms, rows, caller, page, fp)
+
+def get_query_stats(limit: int = 20) -> dict:
+    """Top fingerprints by total time, per-page totals and recent slow queries"""
+    with _stats_lock:
+        top = sorted(_fingerprints.values(), key=lambda e: e['total_ms'], reverse=True)[:limit]
+        top = [
+            {**e, 'avg_ms': e['total_ms'] / e['count'], 'callers': sorted(e['callers']), 'pages': sorted(e['pages'])}
+            for e in top
+        ]
+        pages = {page: dict(stats) for page, stats in _pages.items()}
+        slow = list(_slow_queries)
+    return {'top': top, 'pages': pages, 'slow': slow}
+
+def reset_query_stats():
+    with _stats_lock:
+        _fingerprints.clear()
+        _pages.clear()
+        _slow_queries.clear()
+
+# ---------------- INSTRUMENTED WRAPPERS ----------------
+class InstrumentedCursor:
+    """
+    Times every statement and hands rows with compressed columns back as
+    LazyRows; everything else is delegated to the real cursor
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return map(wrap_row, iter(self._cursor))
+
+    def fetchone(self):
+        return wrap_row(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return [wrap_row(r) for r in rows]
+
+    def fetchall(self):
+        return [wrap_row(r) for r in self._cursor.fetchall()]
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            _record_query(query, (time.perf_counter() - started) * 1000, self._cursor.rowcount)
+
+    def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            _record_query(query, (time.perf_counter() - started) * 1000, self._cursor.rowcount)
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._conn.close()
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        self._conn.commit()
+        note_session_write()
@@ -0,0 +1,361 @@
+import argparse
+import hashlib
+import math
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from typing import TYPE_CHECKING
+import streamlit as st
+import metrics
+import profiling
+from db import get_connection, get_read_connection
+from transcript_search import tokenize
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# ---------------- SETTINGS ----------------
+# Long guidebooks are cut into chunks that are embedded when the guidebook is
+# saved (guidebook_chunks, m0006). A guest question then gets only the chunks
+# closest to it in the prompt instead of the whole guide_text; guidebooks up
+# to RETRIEVAL_FULL_TEXT_CHARS are still sent whole. numpy is imported on the
+# first retrieval, not with the chatbot route (bench/import_time.py).
+# Guidebooks saved before m0006, or before an embedder switch, are indexed by
+#   python -m guide_retrieval
+EMBEDDING_PROVIDER = st.secrets.get("EMBEDDING_PROVIDER", "hashed")   # hashed | openai
+RETRIEVAL_FULL_TEXT_CHARS = int(st.secrets.get("RETRIEVAL_FULL_TEXT_CHARS", 12000))
+RETRIEVAL_TOP_K = int(st.secrets.get("RETRIEVAL_TOP_K", 6))
+CHUNK_CHARS = 800
+HASH_DIM = 2048          # 8 KiB per chunk; fewer buckets blur features together
+ALIAS_WEIGHT = 4.0
+CHAR_NGRAM_WEIGHT = 0.1
+INDEX_CACHE_GUIDEBOOKS = 128
+CHUNK_SEPARATOR = "\n\n[...]\n\n"
+# The start of a long guide (address, arrival basics) is sent with every
+# question. It belongs to the byte-stable prompt prefix and makes that prefix
+# long enough (1024+ tokens) for provider prompt caching.
+LEADING_CHARS = 4000
+
+RETRIEVAL_SECONDS = metrics.histogram("guide_retrieval_duration_seconds",
+                                      "Chunk selection for long guidebooks, including index loads", ("result",))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+# ---------------- CHUNKING ----------------
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n")
+
+def _split_long(paragraph: str, size: int) -> list[str]:
+    """Lines/sentences of a paragraph longer than `size`; a single overlong sentence is cut hard"""
+    pieces = []
+    for sentence in _SENTENCE_END.split(paragraph):
+        sentence = sentence.strip()
+        while len(sentence) > size:
+            pieces.append(sentence[:size])
+            sentence = sentence[size:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+def chunk_text(text: str, size: int = CHUNK_CHARS) -> list[str]:
+    """Paragraphs packed into chunks of at most `size` characters, in document order"""
+    chunks, current = [], ""
+    for paragraph in _PARAGRAPH_BREAK.split(text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for piece in ([paragraph] if len(paragraph) <= size else _split_long(paragraph, size)):
+            if current and len(current) + 2 + len(piece) > size:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+# ---------------- EMBEDDERS ----------------
+# An embedder has a `name` (stored with each chunk, so switching providers
+# re-embeds instead of mixing vector spaces) and returns float32 rows with
+# unit L2 norm, so a dot product is the cosine similarity.
+
+# Guest wording vs guidebook wording. Words of a group share a feature, so
+# "how do I get online" lands near the "WiFi" section without a remote model.
+TERM_ALIASES = [
+    ("wifi", "internet", "online", "network", "router", "ssid", "broadband"),
+    ("parking", "park", "car", "cars", "garage", "driveway", "vehicle"),
+    ("checkout", "leave", "leaving", "depart", "departure"),
+    ("checkin", "arrive", "arrival", "arriving"),
+    ("key", "keys", "lockbox", "keypad", "door", "entry", "lock"),
+    ("trash", "garbage", "rubbish", "bins", "bin", "recycling", "waste"),
+    ("heat", "heating", "thermostat", "ac", "conditioning", "temperature", "cold", "warm"),
+    ("tv", "television", "netflix", "streaming", "remote"),
+    ("towels", "linens", "sheets", "bedding", "pillows"),
+    ("pool", "tub", "jacuzzi", "spa"),
+    ("laundry", "washer", "dryer", "washing", "detergent"),
+    ("pets", "pet", "dog", "dogs", "cat", "cats"),
+]
+_ALIAS_GROUP = {word: f"g:{i}" for i, group in enumerate(TERM_ALIASES) for word in group}
+
+class HashedNgramEmbedder:
+    """
+    Deterministic and offline: words, character 3/4-grams and alias groups,
+    signed-hashed into `dim` buckets with sublinear weights. Documents are
+    TF-IDF weighted across the chunks of their guidebook.
+    """
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+        self.name = f"hashed-ngram-{dim}"
+
+    def _features(self, text: str) -> Counter:
+        features = Counter()
+        for token in tokenize(text):
+            features["w:" + token] += 1.0
+            group = _ALIAS_GROUP.get(token)
+            if group:
+                features[group] += ALIAS_WEIGHT
+            padded = f"<{token}>"
+            for n in (3, 4):
+                for i in range(len(padded) - n + 1):
+                    features["c:" + padded[i:i + n]] += CHAR_NGRAM_WEIGHT
+        return features
+
+    def _raw(self, texts: list[str]) -> "np.ndarray":
+        import numpy as np
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            indexes, values = [], []
+            for feature, weight in features.items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                indexes.append(h % self.dim)
+                values.append((1.0 + math.log1p(weight)) * (-1.0 if h & 0x80000000 else 1.0))
+            matrix[row] = np.bincount(indexes, weights=values, minlength=self.dim)
+        return matrix
+
+    def embed_documents(self, texts: list[str]) -> "np.ndarray":
+        import numpy as np
+        matrix = self._raw(texts)
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        matrix *= (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return _normalize(matrix)
+
+    def embed_query(self, text: str) -> "np.ndarray":
+        return _normalize(self._raw([text]))[0]
+
+class OpenAIEmbedder:
+    """Remote embeddings through the shared OpenAI client (EMBEDDING_PROVIDER = openai)"""
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 256):
+        self.model = model
+        self.dim = dim
+        self.name = f"openai:{model}:{dim}"
+
+    def _embed(self, texts: list[str]) -> "np.ndarray":
+        import numpy as np
+        from llm import get_client
+        with profiling.span("llm", f"embeddings {self.model}"):
+            response = get_client().embeddings.create(model=self.model, input=texts, dimensions=self.dim)
+        return _normalize(np.array([d.embedding for d in response.data], dtype=np.float32))
+
+    def embed_documents(self, texts: list[str]) -> "np.ndarray":
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> "np.ndarray":
+        return self._embed([text])[0]
+
+EMBEDDERS = {'hashed': HashedNgramEmbedder, 'openai': OpenAIEmbedder}
+_embedder = None
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = EMBEDDERS[EMBEDDING_PROVIDER]()
+    return _embedder
+
+def set_embedder(embedder):
+    """Swap the embedder (benchmarks, other providers); None restores EMBEDDING_PROVIDER's"""
+    global _embedder
+    _embedder = embedder
+    clear_index_cache()
+
+def _normalize(matrix: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+# ---------------- INDEXING ----------------
+def index_guidebook(cursor, guideid: str, text: str):
+    """
+    Replace the guidebook's chunks on the cursor that saves it (commit with
+    it). Chunks already embedded from the same text by the same embedder are
+    kept as they are.
+    """
+    embedder = get_embedder()
+    text_hash = content_hash(text)
+    cursor.execute(
+        "SELECT text_hash FROM guidebook_chunks WHERE guideid = %s AND model = %s AND chunk_no = 0",
+        (guideid, embedder.name)
+    )
+    indexed = cursor.fetchone()
+    if indexed and indexed['text_hash'] == text_hash:
+        return
+    chunks = chunk_text(text)
+    try:
+        vectors = embedder.embed_documents(chunks) if chunks else []
+    except Exception as e:
+        # Chunks are embedded at question time until the next save succeeds
+        print(f"Embedding guidebook {guideid} failed: {e}")
+        return
+    cursor.execute("DELETE FROM guidebook_chunks WHERE guideid = %s", (guideid,))
+    rows = [(guideid, embedder.name, i, text_hash, chunk, vector.tobytes())
+            for i, (chunk, vector) in enumerate(zip(chunks, vectors))]
+    for start in range(0, len(rows), 100):
+        batch = rows[start:start + 100]
+        cursor.execute(
+            "INSERT INTO guidebook_chunks (guideid, model, chunk_no, text_hash, chunk_text, embedding) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch)),
+            [value for row in batch for value in row]
+        )
+
+def reindex_all(cursor, batch_size: int = 100) -> int:
+    """Embed every guidebook not yet indexed from its current text; returns guidebooks read"""
+    indexed, last_id = 0, ""
+    while True:
+        cursor.execute(
+            "SELECT guideid, guide_text FROM guidebook_registration WHERE guideid > %s ORDER BY guideid LIMIT %s",
+            (last_id, batch_size)
+        )
+        guidebooks = cursor.fetchall()
+        if not guidebooks:
+            return indexed
+        for g in guidebooks:
+            index_guidebook(cursor, g['guideid'], g['guide_text'])
+        cursor.connection.commit()
+        indexed += len(guidebooks)
+        last_id = guidebooks[-1]['guideid']
+
+# ---------------- RETRIEVAL ----------------
+# Loaded indexes are kept per (guideid, embedder, content hash): a saved edit
+# changes the hash, so no invalidation is needed across app processes.
+_cache_lock = threading.Lock()
+_index_cache = OrderedDict()   # key -> (chunks, matrix)
+
+def clear_index_cache():
+    with _cache_lock:
+        _index_cache.clear()
+
+def _load_index(guideid: str, text: str, text_hash: str, embedder) -> tuple[list, "np.ndarray"]:
+    import numpy as np
+    conn = get_read_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT text_hash, chunk_text, embedding FROM guidebook_chunks "
+                "WHERE guideid = %s AND model = %s ORDER BY chunk_no",
+                (guideid, embedder.name)
+            )
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+    if rows and all(r['text_hash'] == text_hash for r in rows):
+        matrix = np.frombuffer(b"".join(r['embedding'] for r in rows), dtype=np.float32)
+        return [r['chunk_text'] for r in rows], matrix.reshape(len(rows), -1)
+    # Not indexed yet (or a replica behind the save): embed now, keep in memory only
+    chunks = chunk_text(text)
+    return chunks, embedder.embed_documents(chunks)
+
+def get_index(guideid: str, text: str) -> tuple[list, "np.ndarray"]:
+    """(chunks, float32 matrix of their embeddings) for the guidebook's current text"""
+    embedder = get_embedder()
+    key = (guideid, embedder.name, content_hash(text))
+    with _cache_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = _load_index(guideid, text, key[2], embedder)
+    with _cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_GUIDEBOOKS:
+            _index_cache.popitem(last=False)
+    return index
+
+def top_k(matrix: "np.ndarray", query: "np.ndarray", k: int) -> "np.ndarray":
+    """Row indexes of the `k` rows most similar to `query`, best first"""
+    import numpy as np
+    scores = matrix @ query
+    if k < len(scores):
+        best = np.argpartition(scores, -k)[-k:]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind="stable")]
+
+def needs_retrieval(guideid: str, guide_text: str) -> bool:
+    return bool(guideid) and len(guide_text or "") > RETRIEVAL_FULL_TEXT_CHARS
+
+def leading_chunk_count(chunks: list, chars: int = LEADING_CHARS) -> int:
+    """Chunks from the start of the guide that fit in `chars` (at least one)"""
+    count, total = 0, 0
+    for chunk in chunks:
+        total += len(chunk) + len(CHUNK_SEPARATOR)
+        if count and total > chars:
+            break
+        count += 1
+    return count
+
+def select_guide_context(guideid: str, guide_text: str, user_question: str, chat_history: list = None,
+                         k: int = RETRIEVAL_TOP_K) -> tuple[str, str]:
+    """
+    (leading, relevant) guidebook text for the prompt. A short guidebook is
+    all leading. Otherwise the leading chunks, up to LEADING_CHARS, are the
+    same for every question, and `relevant` holds the `k` other chunks
+    closest to the question, in document order. On errors the full text is
+    returned as leading.
+    """
+    if not needs_retrieval(guideid, guide_text):
+        return guide_text, ""
+    started = time.perf_counter()
+    # A follow-up ("and the password?") is matched together with the previous question
+    previous = [m['content'] for m in (chat_history or []) if m.get('role') == "user"][-1:]
+    try:
+        with profiling.span("retrieval", "select_guide_context"):
+            chunks, matrix = get_index(guideid, guide_text)
+            if not chunks:
+                return guide_text, ""
+            lead = leading_chunk_count(chunks)
+            best = []
+            if lead < len(chunks):
+                query = get_embedder().embed_query(" ".join(previous + [user_question]))
+                best = top_k(matrix[lead:], query, k) + lead
+    except Exception as e:
+        print(f"Guide retrieval failed for {guideid}: {e}")
+        RETRIEVAL_SECONDS.observe(time.perf_counter() - started, result="error")
+        return guide_text, ""
+    RETRIEVAL_SECONDS.observe(time.perf_counter() - started, result="ok")
+    return (CHUNK_SEPARATOR.join(chunks[:lead]),
+            CHUNK_SEPARATOR.join(chunks[i] for i in sorted(int(i) for i in best)))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m guide_retrieval",
+                                     description="Embed the chunks of every guidebook with the configured embedder")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            read = reindex_all(cursor, args.batch_size)
+    finally:
+        conn.close()
+    print(f"Indexed {read} guidebooks with {get_embedder().name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import hashlib
+import json
+from datetime import datetime
+from compression import pack
+
+# ---------------- CONTENT VERSIONS ----------------
+# guidebook_registration holds the current content of each guidebook;
+# guidebook_versions (m0008) keeps every content it has had, immutable and
+# numbered from 1. A save adds a version only when the content hash changes,
+# so re-saving an unchanged guidebook leaves its version, retrieval index and
+# QR code alone. chat_messages.guide_version records the version each turn
+# was answered from.
+#
+# The hash covers what the chatbot prompt is built from: title, guide text and
+# original URL. The description, chatbot URL and QR code are presentation and
+# are updated in place.
+def guidebook_hash(title: str, text: str, original_url: str) -> str:
+    payload = json.dumps([title or "", text or "", original_url or ""], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+VERSION_COLUMNS = ["guideid", "version", "content_hash", "guidebook_title", "guide_text", "guide_original_url",
+                   "created_by", "created_date"]
+
+def version_row(guideid: str, version: int, content_hash: str, title: str, text: str, original_url: str,
+                user: str, created: datetime) -> tuple:
+    """guidebook_versions values in VERSION_COLUMNS order"""
+    return (guideid, version, content_hash, title, pack(text), original_url, user, created)
+
+def record_version(cursor, guideid: str, title: str, text: str, original_url: str, user: str,
+                   created: datetime = None) -> tuple[int, bool]:
+    """
+    Add a version if the saved content differs from the current one, on the
+    cursor that saves the guidebook (commit with it). Returns (current
+    version, whether it was created).
+    """
+    content_hash = guidebook_hash(title, text, original_url)
+    # The conditional UPDATE locks the row, so concurrent saves number their versions in turn
+    cursor.execute(
+        """
+        UPDATE guidebook_registration
+        SET current_version = current_version + 1, content_hash = %s
+        WHERE guideid = %s AND (content_hash IS NULL OR content_hash <> %s)
+        """,
+        (content_hash, guideid, content_hash)
+    )
+    created_version = cursor.rowcount > 0
+    cursor.execute("SELECT current_version FROM guidebook_registration WHERE guideid = %s", (guideid,))
+    version = cursor.fetchone()['current_version']
+    if created_version:
+        cursor.execute(
+            f"INSERT INTO guidebook_versions ({', '.join(VERSION_COLUMNS)}) "
+            f"VALUES ({', '.join(['%s'] * len(VERSION_COLUMNS))})",
+            version_row(guideid, version, content_hash, title, text, original_url, user, created or datetime.now())
+        )
+    return version, created_version
@@ -0,0 +1,383 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+import streamlit as st
+import metrics
+import profiling
+
+if TYPE_CHECKING:
+    import openai
+
+# ---------------- SETTINGS ----------------
+MAX_CONCURRENCY = int(st.secrets.get("LLM_MAX_CONCURRENCY", 8))
+MAX_PENDING = int(st.secrets.get("LLM_MAX_PENDING", 64))
+MAX_RETRIES = int(st.secrets.get("LLM_MAX_RETRIES", 3))
+CALL_DEADLINE_SECONDS = float(st.secrets.get("LLM_DEADLINE_SECONDS", 30))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 8.0
+# Sends prompt_cache_key so requests sharing a prompt prefix are routed to the
+# same provider cache; turn off for compatible endpoints that reject it
+PROMPT_CACHE_KEYS = bool(st.secrets.get("LLM_PROMPT_CACHE_KEYS", True))
+
+# Model of the guest chatbot; chat_sessions totals are priced with it
+CHAT_MODEL = "gpt-4o-mini-2024-07-18"
+
+# USD per million tokens; cached prompt tokens are billed at the discounted rate.
+# Models are matched by prefix, so dated snapshots share their family's price.
+MODEL_PRICES = {
+    "gpt-4o-mini": {'input': 0.15, 'cached_input': 0.075, 'output': 0.60},
+    "gpt-4o": {'input': 2.50, 'cached_input': 1.25, 'output': 10.00},
+}
+
+class LLMError(Exception):
+    """Raised when a completion could not be obtained within the retry/deadline budget"""
+
+# ---------------- CLIENT ----------------
+# The openai SDK takes longer to import than the rest of the chatbot route put
+# together, so it is imported when the first client is built, not with this module.
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> "openai.OpenAI":
+    """Shared OpenAI client; retries are handled by the gateway, not the SDK"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+                # OPENAI_BASE_URL points the app at a compatible endpoint such as
+                # bench/openai_stub.py; unset falls back to the SDK default/env var.
+                _client = openai.OpenAI(
+                    api_key=st.secrets.get("OPENAI_API_KEY") or None,
+                    base_url=st.secrets.get("OPENAI_BASE_URL") or None,
+                    timeout=CALL_DEADLINE_SECONDS,
+                    max_retries=0
+                )
+    return _client
+
+_async_client = None
+
+def get_async_client() -> "openai.AsyncOpenAI":
+    """Shared AsyncOpenAI client; only use it from async_db's event loop"""
+    global _async_client
+    if _async_client is None:
+        import openai
+        _async_client = openai.AsyncOpenAI(
+            api_key=st.secrets.get("OPENAI_API_KEY") or None,
+            base_url=st.secrets.get("OPENAI_BASE_URL") or None,
+            timeout=CALL_DEADLINE_SECONDS,
+            max_retries=0
+        )
+    return _async_client
+
+# ---------------- POOL & METRICS ----------------
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="llm")
+_admission = threading.BoundedSemaphore(MAX_PENDING)
+_inflight = {}
+_inflight_lock = threading.RLock()  # done-callbacks may fire while held
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'queued': 0,
+    'running': 0,
+    'completed': 0,
+    'failed': 0,
+    'retries': 0,
+    'coalesced': 0,
+    'rejected': 0,
+}
+_latencies = deque(maxlen=1000)
+_queue_waits = deque(maxlen=1000)
+
+LLM_SECONDS = metrics.histogram("llm_request_duration_seconds",
+                                "Completion latency including retries, by model and mode", ("model", "mode"))
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens used by completions", ("model", "type"))
+
+def _observe_completion(request: dict, mode: str, seconds: float, response):
+    """Latency for the recent-percentiles window and the exported histogram, plus token usage"""
+    with _metrics_lock:
+        _latencies.append(seconds)
+        _metrics['completed'] += 1
+    LLM_SECONDS.observe(seconds, model=request['model'], mode=mode)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, model=request['model'], type="input")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, model=request['model'], type="output")
+        LLM_TOKENS.inc(cached_tokens(usage), model=request['model'], type="cached")
+
+def cached_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prompt cache (0 when not reported)"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+def model_prices(model: str) -> dict:
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    raise KeyError(f"No price configured for {model}")
+
+def completion_cost(model: str, input_tokens: int, output_tokens: int, cached: int = 0) -> float:
+    """USD cost of completions; `cached` is the part of input_tokens read from the prompt cache"""
+    prices = model_prices(model)
+    return ((input_tokens - cached) * prices['input'] + cached * prices['cached_input']
+            + output_tokens * prices['output']) / 1_000_000
+
+def _bump(name: str, delta: int = 1):
+    with _metrics_lock:
+        _metrics[name] += delta
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def get_llm_metrics() -> dict:
+    """Queue depth, in-flight calls, outcome counters and latency percentiles (seconds)"""
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+        latencies = list(_latencies)
+        waits = list(_queue_waits)
+    snapshot.update({
+        'latency_p50': _percentile(latencies, 0.50),
+        'latency_p95': _percentile(latencies, 0.95),
+        'latency_p99': _percentile(latencies, 0.99),
+        'queue_wait_p95': _percentile(waits, 0.95),
+    })
+    return snapshot
+
+def _collect_gateway_metrics():
+    snapshot = get_llm_metrics()
+    outcomes = ("completed", "failed", "retries", "coalesced", "rejected")
+    return [
+        ("llm_gateway_calls_total", "counter", "Gateway calls by outcome (retries counts attempts)",
+         [({'outcome': name}, snapshot[name]) for name in outcomes]),
+        ("llm_gateway_queued", "gauge", "Calls admitted and waiting for a worker", [({}, snapshot['queued'])]),
+        ("llm_gateway_running", "gauge", "Calls in progress", [({}, snapshot['running'])]),
+    ]
+
+metrics.register_collector(_collect_gateway_metrics)
+
+# ---------------- RETRIES ----------------
+def _is_retryable(error: Exception) -> bool:
+    import openai  # already loaded: the error came from a client call
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when the API sends one"""
+    delay = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except (TypeError, ValueError):
+            pass
+    return delay
+
+def _call_with_retries(request: dict, deadline: float, enqueued_at: float):
+    started = time.monotonic()
+    with _metrics_lock:
+        _metrics['queued'] -= 1
+        _metrics['running'] += 1
+        _queue_waits.append(started - enqueued_at)
+    try:
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMError("LLM call deadline exceeded")
+            try:
+                response = get_client().chat.completions.create(timeout=remaining, **request)
+                _observe_completion(request, "sync", time.monotonic() - started, response)
+                return response
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= MAX_RETRIES:
+                    raise LLMError(f"LLM call failed: {e}") from e
+                delay = _backoff_delay(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    raise LLMError(f"LLM call deadline exceeded after retries: {e}") from e
+                _bump('retries')
+                attempt += 1
+                time.sleep(delay)
+    except Exception:
+        _bump('failed')
+        raise
+    finally:
+        _bump('running', -1)
+        _admission.release()
+
+# ---------------- PUBLIC API ----------------
+def request_key(guideid: str, messages: list) -> str:
+    """Coalescing key: same guidebook and byte-identical prompt"""
+    prompt_hash = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+    return f"{guideid}:{prompt_hash}"
+
+def chat_completion(messages: list, model: str, temperature: float, max_tokens: int,
+                    coalesce_key: str = None, deadline_seconds: float = None, prompt_cache_key: str = None):
+    """
+    Run a chat completion through the bounded worker pool.
+    Identical in-flight requests sharing `coalesce_key` wait on a single upstream call.
+    Raises LLMError when the call fails or the deadline passes.
+    """
+    deadline = time.monotonic() + (deadline_seconds or CALL_DEADLINE_SECONDS)
+    request = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+    }
+    if prompt_cache_key and PROMPT_CACHE_KEYS:
+        request['prompt_cache_key'] = prompt_cache_key
+
+    with _inflight_lock:
+        future = _inflight.get(coalesce_key) if coalesce_key else None
+        if future is not None:
+            _bump('coalesced')
+        else:
+            if not _admission.acquire(blocking=False):
+                _bump('rejected')
+                raise LLMError("LLM gateway is overloaded")
+            _bump('queued')
+            future = _executor.submit(_call_with_retries, request, deadline, time.monotonic())
+            if coalesce_key:
+                _inflight[coalesce_key] = future
+                future.add_done_callback(lambda f, k=coalesce_key: _forget(k, f))
+
+    try:
+        with profiling.span("llm", "chat_completion"):
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"LLM call deadline exceeded: {e}") from e
+
+# ---------------- ASYNC API ----------------
+# Same admission limit, retry policy and metrics as the pool above, for callers
+# running on async_db's event loop. Concurrency is capped by a loop-local semaphore.
+_async_inflight = {}
+_async_slots = None
+
+async def _collect_stream(stream, on_delta) -> SimpleNamespace:
+    """
+    Forward a streamed completion's text to on_delta as it arrives and return
+    the parts callers read from a non-streamed one: choices[0].message.content
+    and usage (sent in the final chunk when stream_options.include_usage is set).
+    """
+    parts, usage = [], None
+    async for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+                on_delta(choice.delta.content)
+    message = SimpleNamespace(content="".join(parts))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                           usage=usage or SimpleNamespace(prompt_tokens=0, completion_tokens=0))
+
+async def _acall_with_retries(request: dict, deadline: float, enqueued_at: float, on_delta=None):
+    global _async_slots
+    if _async_slots is None:
+        _async_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    try:
+        async with _async_slots:
+            started = time.monotonic()
+            with _metrics_lock:
+                _metrics['queued'] -= 1
+                _metrics['running'] += 1
+                _queue_waits.append(started - enqueued_at)
+            streamed = False  # text already forwarded can't be taken back, so no retry after it
+
+            def forward(text: str):
+                nonlocal streamed
+                streamed = True
+                on_delta(text)
+
+            try:
+                attempt = 0
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LLMError("LLM call deadline exceeded")
+                    try:
+                        response = await get_async_client().chat.completions.create(timeout=remaining, **request)
+                        if on_delta is not None:
+                            response = await _collect_stream(response, forward)
+                        _observe_completion(request, "stream" if on_delta is not None else "async",
+                                            time.monotonic() - started, response)
+                        return response
+                    except Exception as e:
+                        if not _is_retryable(e) or attempt >= MAX_RETRIES or streamed:
+                            raise LLMError(f"LLM call failed: {e}") from e
+                        delay = _backoff_delay(attempt, e)
+                        if time.monotonic() + delay >= deadline:
+                            raise LLMError(f"LLM call deadline exceeded after retries: {e}") from e
+                        _bump('retries')
+                        attempt += 1
+                        await asyncio.sleep(delay)
+            except BaseException:
+                _bump('failed')
+                raise
+            finally:
+                _bump('running', -1)
+    finally:
+        _admission.release()
+
+async def async_chat_completion(messages: list, model: str, temperature: float, max_tokens: int,
+                                coalesce_key: str = None, deadline_seconds: float = None, on_delta=None,
+                                prompt_cache_key: str = None):
+    """
+    Coroutine counterpart of chat_completion; raises LLMError the same way.
+    With on_delta the completion is streamed and on_delta(text) is called on the
+    event loop for each piece; a streamed call is never coalesced, and is not
+    retried once text has been forwarded.
+    """
+    deadline = time.monotonic() + (deadline_seconds or CALL_DEADLINE_SECONDS)
+    request = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+    }
+    if prompt_cache_key and PROMPT_CACHE_KEYS:
+        request['prompt_cache_key'] = prompt_cache_key
+    if on_delta is not None:
+        request['stream'] = True
+        request['stream_options'] = {'include_usage': True}
+        coalesce_key = None
+
+    task = _async_inflight.get(coalesce_key) if coalesce_key else None
+    if task is not None:
+        _bump('coalesced')
+    else:
+        if not _admission.acquire(blocking=False):
+            _bump('rejected')
+            raise LLMError("LLM gateway is overloaded")
+        _bump('queued')
+        task = asyncio.ensure_future(_acall_with_retries(request, deadline, time.monotonic(), on_delta))
+        if coalesce_key:
+            _async_inflight[coalesce_key] = task
+            task.add_done_callback(lambda t, k=coalesce_key: _async_inflight.pop(k, None) if _async_inflight.get(k) is t else None)
+
+    try:
+        # shield: one waiter timing out must not cancel the call others share
+        with profiling.span("llm", "async_chat_completion"):
+            return await asyncio.wait_for(asyncio.shield(task), max(0.0, deadline - time.monotonic()))
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"LLM call deadline exceeded: {e}") from e
+
+def _forget(key: str, future):
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
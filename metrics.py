@@ -0,0 +1,174 @@
+import bisect
+import threading
+import streamlit as st
+
+# ---------------- SETTINGS ----------------
+# In-process counters and histograms for the chat, DB and LLM hot paths, in
+# the Prometheus text format. An observation is a dict lookup and an add
+# under one lock, so they stay on in production. Scrape them from the
+# listener app.py and chat_api start when METRICS_PORT is set (bound to
+# METRICS_HOST, default 127.0.0.1), never from the public chat API.
+METRICS_PORT = int(st.secrets.get("METRICS_PORT", 0))
+METRICS_HOST = st.secrets.get("METRICS_HOST", "127.0.0.1")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_registry = {}     # name -> metric, in registration order
+_collectors = []   # callables returning samples read at scrape time
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}   # label values -> float
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with _lock:
+            values = [(key, list(entry)) for key, entry in self._values.items()]
+        for key, entry in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, entry[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+def _register(cls, name: str, help: str, labelnames: tuple, **kwargs):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help, labelnames, **kwargs)
+    if not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+        raise ValueError(f"Metric {name} is already registered differently")
+    return metric
+
+def counter(name: str, help: str, labelnames: tuple = ()) -> Counter:
+    """The counter called `name`, registered on first use"""
+    return _register(Counter, name, help, labelnames)
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    """The histogram called `name`, registered on first use"""
+    return _register(Histogram, name, help, labelnames, buckets=buckets)
+
+def register_collector(collect):
+    """
+    Export numbers a module already keeps (llm gateway counters, ref_cache hit
+    rates, ...) without double bookkeeping. collect() is called on each scrape
+    and returns (name, kind, help, [(labels, value), ...]) tuples.
+    """
+    with _lock:
+        if collect not in _collectors:
+            _collectors.append(collect)
+
+# ---------------- TEXT FORMAT ----------------
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _line(name: str, labels: dict, value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        return f"{name}{{{rendered}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    with _lock:
+        metrics = list(_registry.values())
+        collectors = list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(_line(*sample) for sample in metric.samples())
+    for collect in collectors:
+        try:
+            families = list(collect())
+        except Exception as e:
+            lines.append(f"# collector {getattr(collect, '__qualname__', collect)} failed: {_escape(str(e))}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {_escape(help)}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(_line(name, labels, value) for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------- LISTENER ----------------
+_server = None
+
+def metrics_app(environ, start_response):
+    """WSGI app serving render() on /metrics"""
+    if environ.get('PATH_INFO') != "/metrics":
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Not found\n"]
+    body = render().encode("utf-8")
+    start_response("200 OK", [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))])
+    return [body]
+
+def start_metrics_server(port: int = None, host: str = None):
+    """Serve /metrics on a daemon thread, once per process; no-op without a port"""
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _lock:
+        if _server is not None:
+            return _server or None
+        from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            _server = make_server(host or METRICS_HOST, port, metrics_app, handler_class=QuietHandler)
+        except OSError as e:
+            # Another app process on this host already serves the port
+            print(f"Metrics listener not started on port {port}: {e}")
+            _server = False
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
@@ -0,0 +1,113 @@
+import importlib
+import pkgutil
+import re
+from db import get_connection
+
+# ---------------- DISCOVERY ----------------
+# Migrations are modules named mNNNN_description.py exposing up(cursor).
+# Each up() must be idempotent: the runner records versions, but a migration
+# interrupted half-way (MySQL DDL auto-commits) has to be safe to re-run.
+_MIGRATION_NAME = re.compile(r"^m(\d{4})_(\w+)$")
+
+def discover_migrations() -> list[tuple[int, str, object]]:
+    """All migration modules as (version, name, module), in version order"""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MIGRATION_NAME.match(info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            found.append((int(match.group(1)), match.group(2), module))
+    found.sort(key=lambda m: m[0])
+    versions = [m[0] for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers")
+    return found
+
+# ---------------- HELPERS FOR MIGRATIONS ----------------
+def index_exists(cursor, table: str, index_name: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (table, index_name)
+    )
+    return cursor.fetchone() is not None
+
+def column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+        """,
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+def ensure_index(cursor, table: str, index_name: str, columns: str, kind: str = "INDEX"):
+    """CREATE [UNIQUE|FULLTEXT] INDEX unless an index with that name already exists"""
+    if not index_exists(cursor, table, index_name):
+        cursor.execute(f"ALTER TABLE {table} ADD {kind} {index_name} ({columns})")
+
+def ensure_column(cursor, table: str, column: str, definition: str):
+    """ADD COLUMN unless it already exists"""
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# ---------------- RUNNER ----------------
+def _ensure_version_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+def get_applied_versions(conn) -> set:
+    with conn.cursor() as cursor:
+        _ensure_version_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        rows = cursor.fetchall()
+    conn.commit()
+    return {r['version'] for r in rows}
+
+def run_migrations(target: int = None, dry_run: bool = False) -> list[str]:
+    """Apply pending migrations up to `target` (default: latest). Returns applied names"""
+    applied = []
+    conn = get_connection()
+    try:
+        done = get_applied_versions(conn)
+        for version, name, module in discover_migrations():
+            if version in done or (target is not None and version > target):
+                continue
+            label = f"{version:04d}_{name}"
+            if dry_run:
+                applied.append(label)
+                continue
+            with conn.cursor() as cursor:
+                module.up(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+            conn.commit()
+            applied.append(label)
+    finally:
+        conn.close()
+    return applied
+
+def migration_status() -> list[dict]:
+    conn = get_connection()
+    try:
+        done = get_applied_versions(conn)
+    finally:
+        conn.close()
+    return [
+        {'version': version, 'name': name, 'applied': version in done}
+        for version, name, _ in discover_migrations()
+    ]
@@ -0,0 +1,35 @@
+import argparse
+import sys
+from migrations import migration_status, run_migrations
+from migrations.explain_check import check_indexes
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    parser.add_argument("--dry-run", action="store_true", help="show pending migrations without applying them")
+    parser.add_argument("--target", type=int, default=None, help="migrate up to this version")
+    parser.add_argument("--check-indexes", action="store_true",
+                        help="EXPLAIN every query in pages/ and fail if a filtered query full-scans a table")
+    args = parser.parse_args()
+
+    if args.status:
+        for m in migration_status():
+            print(f"{'✔' if m['applied'] else ' '} {m['version']:04d}_{m['name']}")
+        return
+
+    if args.check_indexes:
+        results = check_indexes()
+        failures = [r for r in results if not r['ok']]
+        for r in results:
+            mark = "OK  " if r['ok'] else "FAIL"
+            note = f" - {r['problem']}" if r['problem'] else ""
+            print(f"{mark} {r['module']}:{r['line']} {r['function']}{note}")
+        print(f"{len(results) - len(failures)}/{len(results)} queries use an index where they filter")
+        sys.exit(1 if failures else 0)
+
+    applied = run_migrations(target=args.target, dry_run=args.dry_run)
+    verb = "Pending" if args.dry_run else "Applied"
+    print(f"{verb}: {', '.join(applied)}" if applied else "Schema is up to date")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import ast
+import os
+import re
+from db import get_connection
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages")
+
+# ---------------- QUERY EXTRACTION ----------------
+def _string_value(node, assignments: dict):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        return assignments.get(node.id)
+    return None
+
+def extract_queries(path: str) -> list[dict]:
+    """Literal SQL passed to cursor.execute() in a module, with the enclosing function"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    queries = []
+    for func in ast.walk(tree):
+        if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        assignments = {}
+        for node in ast.walk(func):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                value = _string_value(node.value, {})
+                if value is not None:
+                    assignments[node.targets[0].id] = value
+        for node in ast.walk(func):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr == "execute" and node.args):
+                sql = _string_value(node.args[0], assignments)
+                if sql:
+                    queries.append({
+                        'module': os.path.basename(path),
+                        'function': func.name,
+                        'line': node.lineno,
+                        'sql': " ".join(sql.split()),
+                    })
+    return queries
+
+def _explainable(sql: str) -> str:
+    """Swap placeholders for representative literals so MySQL can plan the statement"""
+    sql = re.sub(r"LIMIT\s+%s", "LIMIT 10", sql, flags=re.IGNORECASE)
+    # Worst case: the app builds LIKE patterns with a leading wildcard
+    sql = re.sub(r"LIKE\s+%s", "LIKE '%x%'", sql, flags=re.IGNORECASE)
+    return sql.replace("%s", "'x'")
+
+# ---------------- EXPLAIN ----------------
+def check_indexes(pages_dir: str = PAGES_DIR) -> list[dict]:
+    """
+    EXPLAIN every SELECT/UPDATE/DELETE in the pages/ modules.
+    A statement fails when a joined table is read with a full scan, or when the
+    driving (first) table is full-scanned despite a WHERE clause.
+    """
+    queries = []
+    for filename in sorted(os.listdir(pages_dir)):
+        if filename.endswith(".py"):
+            queries.extend(extract_queries(os.path.join(pages_dir, filename)))
+
+    results = []
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            for q in queries:
+                if not re.match(r"\s*(SELECT|UPDATE|DELETE)\b", q['sql'], re.IGNORECASE):
+                    continue
+                has_where = re.search(r"\bWHERE\b", q['sql'], re.IGNORECASE) is not None
+                try:
+                    cursor.execute("EXPLAIN " + _explainable(q['sql']))
+                    plan = cursor.fetchall()
+                except Exception as e:
+                    results.append({**q, 'ok': False, 'problem': f"EXPLAIN failed: {e}", 'plan': []})
+                    continue
+                scans = [
+                    row.get('table') for position, row in enumerate(plan)
+                    if row.get('type') == 'ALL' and not row.get('key') and (position > 0 or has_where)
+                ]
+                ok = not scans
+                problem = f"full scan on {', '.join(str(t) for t in scans)}" if scans else ""
+                results.append({**q, 'ok': ok, 'problem': problem, 'plan': plan})
+    finally:
+        conn.close()
+    return results
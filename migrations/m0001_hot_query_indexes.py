@@ -0,0 +1,16 @@
+from migrations import ensure_index
+
+# Indexes behind the chatbot turn, the session viewer and the admin lists
+INDEXES = [
+    ("chat_messages", "idx_chat_messages_session_created", "session_id, created_at"),
+    ("unanswered_questions", "idx_unanswered_session_contact_created", "session_id, contact_provided, created_at"),
+    ("chat_sessions", "idx_chat_sessions_start", "session_start"),
+    ("chat_sessions", "idx_chat_sessions_guideid", "guideid"),
+    ("mapper", "idx_mapper_guide_prop", "guideid, propid"),
+    ("property_registration", "idx_property_manager_created", "manager_id, created_date"),
+    ("property_manager", "idx_property_manager_email", "email"),
+]
+
+def up(cursor):
+    for table, name, columns in INDEXES:
+        ensure_index(cursor, table, name, columns)
@@ -0,0 +1,55 @@
+from datetime import date
+from chat_archive import PARTITIONS_AHEAD, add_months, month_start, partition_clause
+
+# Monthly RANGE partitions on chat_messages.created_at so old months can be
+# archived and dropped as a unit (see chat_archive.py).
+#
+# MySQL requires the partitioning column in every unique key and doesn't allow
+# foreign keys on partitioned InnoDB tables, so the primary key becomes
+# (id, created_at) and any foreign keys on chat_messages are dropped; the app
+# only ever inserts messages for sessions it has just created.
+
+def _is_partitioned(cursor) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'chat_messages'
+        AND partition_name IS NOT NULL
+        LIMIT 1
+        """
+    )
+    return cursor.fetchone() is not None
+
+def up(cursor):
+    if _is_partitioned(cursor):
+        return
+
+    cursor.execute(
+        """
+        SELECT constraint_name FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE() AND table_name = 'chat_messages'
+        """
+    )
+    for row in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE chat_messages DROP FOREIGN KEY {row['constraint_name']}")
+
+    cursor.execute("SELECT MIN(created_at) AS oldest FROM chat_messages")
+    oldest = cursor.fetchone()['oldest'] or date.today()
+
+    months = []
+    month = month_start(oldest)
+    last = add_months(month_start(date.today()), PARTITIONS_AHEAD)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    partitions = ", ".join(partition_clause(m) for m in months)
+
+    cursor.execute(
+        "ALTER TABLE chat_messages "
+        "MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)"
+    )
+    cursor.execute(
+        f"ALTER TABLE chat_messages PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) "
+        f"({partitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
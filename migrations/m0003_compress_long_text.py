@@ -0,0 +1,56 @@
+from compression import is_packed, pack
+
+# guide_text and chat_messages.content hold compressed bytes (compression.py),
+# so they become BLOBs; existing rows are then compressed in batches.
+# Converting TEXT to BLOB keeps the stored utf8mb4 bytes as they are.
+COLUMNS = [
+    # (table, key column, text column, blob type)
+    ("guidebook_registration", "guideid", "guide_text", "LONGBLOB"),
+    ("chat_messages", "id", "content", "MEDIUMBLOB"),
+]
+BATCH_SIZE = 500
+
+def _data_type(cursor, table: str, column: str) -> str:
+    cursor.execute(
+        """
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """,
+        (table, column)
+    )
+    row = cursor.fetchone()
+    return row['data_type'].lower() if row else ""
+
+def compress_existing(cursor, table: str, key: str, column: str) -> int:
+    """Compress every row not already packed; safe to re-run. Returns rows rewritten"""
+    rewritten = 0
+    last_key = 0 if key == "id" else ""
+    while True:
+        cursor.execute(
+            f"SELECT {key}, {column} FROM {table} WHERE {key} > %s ORDER BY {key} LIMIT %s",
+            (last_key, BATCH_SIZE)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return rewritten
+        updates = []
+        for row in rows:
+            # Read the raw stored bytes, not the LazyRow-decoded text
+            raw = dict.__getitem__(row, column)
+            if raw is None or is_packed(raw):
+                continue
+            text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
+            packed = pack(text)
+            if is_packed(packed):
+                updates.append((packed, dict.__getitem__(row, key)))
+        if updates:
+            cursor.executemany(f"UPDATE {table} SET {column} = %s WHERE {key} = %s", updates)
+            cursor.connection.commit()
+            rewritten += len(updates)
+        last_key = dict.__getitem__(rows[-1], key)
+
+def up(cursor):
+    for table, key, column, blob_type in COLUMNS:
+        if _data_type(cursor, table, column) != blob_type.lower():
+            cursor.execute(f"ALTER TABLE {table} MODIFY {column} {blob_type}")
+        compress_existing(cursor, table, key, column)
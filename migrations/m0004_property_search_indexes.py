@@ -0,0 +1,16 @@
+from migrations import ensure_index
+
+# Property list: keyset pagination on (created_date, propId) and address search.
+# InnoDB secondary indexes carry the primary key, so idx_property_created also
+# orders ties by propId; the manager scope uses idx_property_manager_created (m0001).
+# FULLTEXT serves word searches; the 64-char prefix index serves "starts with"
+# searches made only of tokens shorter than innodb_ft_min_token_size.
+INDEXES = [
+    ("property_registration", "idx_property_created", "created_date", "INDEX"),
+    ("property_registration", "ft_property_address", "property_address", "FULLTEXT"),
+    ("property_registration", "idx_property_address_prefix", "property_address(64)", "INDEX"),
+]
+
+def up(cursor):
+    for table, name, columns, kind in INDEXES:
+        ensure_index(cursor, table, name, columns, kind)
@@ -0,0 +1,83 @@
+import re
+from collections import Counter
+from compression import unpack
+from migrations import ensure_index
+
+# Inverted index for transcript search (transcript_search.py). chat_messages
+# content is compressed and partitioned, so FULLTEXT can't be used there.
+# The primary key clusters postings by term and guidebook, so a filtered
+# search reads one contiguous range per term, and makes re-indexing a
+# document a no-op. idx_search_term_time covers searches across all
+# guidebooks, newest first, without touching the clustered rows.
+#
+# Existing messages and unanswered questions are indexed below with the
+# tokenizer as it was when this migration was written, so later changes to
+# transcript_search.py don't change what it does.
+BATCH_SIZE = 500
+ROWS_PER_INSERT = 500
+MAX_TERM_LENGTH = 32
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have how i if in is it its me my no not of on or our
+so that the their them then there these they this to was we were what when where which who why will with you your
+""".split())
+_TOKEN = re.compile(r"\w+")
+DOCUMENTS = [
+    # (source, table, text column)
+    ("m", "chat_messages", "content"),
+    ("q", "unanswered_questions", "user_question"),
+]
+
+def _terms(text: str) -> Counter:
+    if not text:
+        return Counter()
+    return Counter(t[:MAX_TERM_LENGTH] for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS)
+
+def _insert_postings(cursor, rows: list[tuple]):
+    for start in range(0, len(rows), ROWS_PER_INSERT):
+        batch = rows[start:start + ROWS_PER_INSERT]
+        cursor.execute(
+            "INSERT IGNORE INTO chat_search_terms (term, guideid, created_at, source, doc_id, session_id, tf) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(batch))}",
+            [value for row in batch for value in row]
+        )
+
+def index_existing(cursor, source: str, table: str, column: str) -> int:
+    """Index every row of `table`; safe to re-run. Returns documents read"""
+    read, last_id = 0, 0
+    while True:
+        # Selected under its own name and unpacked here: content is compressed (m0003)
+        cursor.execute(
+            f"SELECT id, session_id, guideid, {column}, created_at FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+            (last_id, BATCH_SIZE)
+        )
+        docs = cursor.fetchall()
+        if not docs:
+            return read
+        rows = []
+        for doc in docs:
+            for term, tf in _terms(unpack(doc[column])).items():
+                rows.append((term, doc['guideid'], doc['created_at'], source, doc['id'], doc['session_id'],
+                             min(tf, 65535)))
+        _insert_postings(cursor, rows)
+        cursor.connection.commit()
+        read += len(docs)
+        last_id = docs[-1]['id']
+
+def up(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_search_terms (
+            term VARCHAR(32) NOT NULL,
+            guideid VARCHAR(36) NOT NULL,
+            source CHAR(1) NOT NULL,
+            doc_id BIGINT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            session_id VARCHAR(36) NOT NULL,
+            tf SMALLINT UNSIGNED NOT NULL,
+            PRIMARY KEY (term, guideid, source, doc_id)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
+        """
+    )
+    ensure_index(cursor, "chat_search_terms", "idx_search_term_time", "term, created_at, session_id, tf", "INDEX")
+    for source, table, column in DOCUMENTS:
+        index_existing(cursor, source, table, column)
@@ -0,0 +1,21 @@
+# Embedded chunks of each guidebook for prompt retrieval (guide_retrieval.py).
+# Vectors are float32 bytes (8 KiB per chunk with the default hashed
+# embedder). `model` names the embedder that produced them and text_hash the
+# guide_text they were cut from, so stale rows are never used for a question.
+# Chunks depend on the configured embedder, which a migration can't pin, so
+# existing guidebooks are indexed by `python -m guide_retrieval` after this
+# runs; until then their chunks are embedded in memory at question time.
+def up(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS guidebook_chunks (
+            guideid VARCHAR(36) NOT NULL,
+            model VARCHAR(64) NOT NULL,
+            chunk_no SMALLINT UNSIGNED NOT NULL,
+            text_hash CHAR(64) NOT NULL,
+            chunk_text TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            PRIMARY KEY (guideid, model, chunk_no)
+        ) CHARACTER SET utf8mb4
+        """
+    )
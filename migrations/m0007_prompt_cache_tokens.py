@@ -0,0 +1,14 @@
+from migrations import ensure_column
+
+# Prompt tokens the provider served from its prompt cache (usage
+# prompt_tokens_details.cached_tokens), next to input_tokens on the user
+# message of each turn and summed per session. Rows written before this
+# migration count as uncached. MySQL 8 adds these columns in place.
+COLUMNS = [
+    ("chat_messages", "cached_tokens", "INT NOT NULL DEFAULT 0 AFTER output_tokens"),
+    ("chat_sessions", "total_cached_tokens", "INT NOT NULL DEFAULT 0 AFTER total_output_tokens"),
+]
+
+def up(cursor):
+    for table, column, definition in COLUMNS:
+        ensure_column(cursor, table, column, definition)
@@ -0,0 +1,85 @@
+import hashlib
+import json
+from compression import unpack
+from migrations import ensure_column
+
+# Immutable guidebook versions (guide_versions.py). guide_text is stored
+# compressed like guidebook_registration.guide_text. The registration row
+# points at its current version and content hash, and each chat message at
+# the version it was answered from; messages written before this migration
+# have no version. Existing guidebooks become version 1, hashed the way
+# guide_versions.guidebook_hash did when this was written; a later change
+# there makes the next save of each guidebook a new version, nothing worse.
+COLUMNS = [
+    ("guidebook_registration", "current_version", "INT UNSIGNED NOT NULL DEFAULT 0 AFTER guide_text"),
+    ("guidebook_registration", "content_hash", "CHAR(64) NULL AFTER current_version"),
+    ("chat_messages", "guide_version", "INT UNSIGNED NULL AFTER guideid"),
+]
+BATCH_SIZE = 100
+
+def _content_hash(title: str, text: str, original_url: str) -> str:
+    payload = json.dumps([title or "", text or "", original_url or ""], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def version_existing(cursor) -> int:
+    """Record version 1 of every guidebook without one; safe to re-run. Returns guidebooks versioned"""
+    versioned, last_id = 0, ""
+    while True:
+        cursor.execute(
+            """
+            SELECT guideid, guidebook_title, guide_text, guide_original_url,
+                   created_by, created_date, modified_by, modified_date
+            FROM guidebook_registration
+            WHERE guideid > %s AND current_version = 0
+            ORDER BY guideid LIMIT %s
+            """,
+            (last_id, BATCH_SIZE)
+        )
+        guidebooks = cursor.fetchall()
+        if not guidebooks:
+            return versioned
+        for g in guidebooks:
+            # The stored form is copied as is; only the hash needs the text
+            stored = dict.__getitem__(g, 'guide_text')
+            content_hash = _content_hash(g['guidebook_title'], unpack(stored), g['guide_original_url'])
+            cursor.execute(
+                """
+                UPDATE guidebook_registration SET current_version = 1, content_hash = %s
+                WHERE guideid = %s AND current_version = 0
+                """,
+                (content_hash, g['guideid'])
+            )
+            cursor.execute(
+                """
+                INSERT IGNORE INTO guidebook_versions
+                (guideid, version, content_hash, guidebook_title, guide_text, guide_original_url,
+                 created_by, created_date)
+                VALUES (%s, 1, %s, %s, %s, %s, %s, COALESCE(%s, NOW()))
+                """,
+                (g['guideid'], content_hash, g['guidebook_title'], stored, g['guide_original_url'],
+                 g['modified_by'] or g['created_by'], g['modified_date'] or g['created_date'])
+            )
+        cursor.connection.commit()
+        versioned += len(guidebooks)
+        last_id = guidebooks[-1]['guideid']
+
+def up(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS guidebook_versions (
+            guideid VARCHAR(36) NOT NULL,
+            version INT UNSIGNED NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            guidebook_title VARCHAR(255) NOT NULL,
+            guide_text LONGBLOB NOT NULL,
+            guide_original_url TEXT,
+            created_by VARCHAR(255),
+            created_date DATETIME NOT NULL,
+            PRIMARY KEY (guideid, version),
+            KEY idx_gv_hash (guideid, content_hash)
+        ) CHARACTER SET utf8mb4
+        """
+    )
+    for table, column, definition in COLUMNS:
+        ensure_column(cursor, table, column, definition)
+    version_existing(cursor)
@@ -0,0 +1,7 @@
+from migrations import ensure_index
+
+# chat_archive.py deletes the postings of each month it archives (the
+# messages they point at leave MySQL); this index lets it delete them in
+# batches by range instead of scanning every term.
+def up(cursor):
+    ensure_index(cursor, "chat_search_terms", "idx_search_source_time", "source, created_at", "INDEX")
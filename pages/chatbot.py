@@ -1,15 +1,33 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import base64
 from io import BytesIO
-from PIL import Image
-from openai import OpenAI
 from db import get_connection
+from llm import chat_completion, async_chat_completion, request_key, cached_tokens, CHAT_MODEL, LLMError
+import async_db
+import asyncio
+from answer_classifier import get_classifier
+from rate_limit import check_chat_allowed, record_token_usage, client_ip
+from compression import pack
+import session_memory
+import profiling
+from transcript_search import index_document, SOURCE_MESSAGE, SOURCE_UNANSWERED
+from guide_retrieval import needs_retrieval, select_guide_context
+import metrics
+import time
+import types
 import uuid
 from datetime import datetime
 import re
 
-# ---------------- OPENAI CLIENT ----------------
-client = client = OpenAI(api_key=st.secrets.get("OPENAI_API_KEY", ""))
+# Run each turn's LLM call and DB writes concurrently on async_db's event loop
+ASYNC_CHAT_TURNS = bool(st.secrets.get("ASYNC_CHAT_TURNS", True))
+
+# Messages kept in session memory; older ones are read back from chat_messages
+# on demand. ask_openai only sends the last 10 as history.
+TRANSCRIPT_WINDOW = int(st.secrets.get("CHAT_TRANSCRIPT_WINDOW", 40))
+EARLIER_PAGE_SIZE = 20
+EARLIER_MAX = 200
 
 # ---------------- TOKEN CALCULATION ----------------
 def estimate_tokens(text: str) -> int:
@@ -32,7 +50,7 @@ def create_chat_session(guideid: str, user_identifier: str = "anonymous") -> str
     conn.close()
     return session_id
 
-def update_session_stats(session_id: str, input_tokens: int, output_tokens: int):
+def update_session_stats(session_id: str, input_tokens: int, output_tokens: int, cached: int = 0):
     """Update session token statistics"""
     conn = get_connection()
     with conn.cursor() as cursor:
@@ -40,10 +58,11 @@ def update_session_stats(session_id: str, input_tokens: int, output_tokens: int)
         UPDATE chat_sessions 
         SET total_messages = total_messages + 1,
             total_input_tokens = total_input_tokens + %s,
-            total_output_tokens = total_output_tokens + %s
+            total_output_tokens = total_output_tokens + %s,
+            total_cached_tokens = total_cached_tokens + %s
         WHERE session_id = %s
         """
-        cursor.execute(sql, (input_tokens, output_tokens, session_id))
+        cursor.execute(sql, (input_tokens, output_tokens, cached, session_id))
     conn.commit()
     conn.close()
 
@@ -79,16 +98,19 @@ def get_session_contact_info(session_id: str):
 
 # ---------------- MESSAGE LOGGING ----------------
 def save_chat_message(session_id: str, guideid: str, role: str, content: str, 
-                     input_tokens: int, output_tokens: int, was_answered: bool = True):
-    """Save individual chat message"""
+                     input_tokens: int, output_tokens: int, was_answered: bool = True, cached: int = 0,
+                     guide_version: int = None):
+    """Save individual chat message; guide_version is the guidebook version it was answered from"""
     conn = get_connection()
     with conn.cursor() as cursor:
         sql = """
         INSERT INTO chat_messages 
-        (session_id, guideid, role, content, input_tokens, output_tokens, was_answered)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        (session_id, guideid, guide_version, role, content, input_tokens, output_tokens, was_answered, cached_tokens)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        cursor.execute(sql, (session_id, guideid, role, content, input_tokens, output_tokens, was_answered))
+        cursor.execute(sql, (session_id, guideid, guide_version, role, pack(content), input_tokens, output_tokens,
+                             was_answered, cached))
+        index_document(cursor, SOURCE_MESSAGE, cursor.lastrowid, session_id, guideid, content)
     conn.commit()
     conn.close()
 
@@ -104,6 +126,7 @@ def log_unanswered_question(session_id: str, guideid: str, question: str, respon
         """
         contact_provided = bool(phone or email)
         cursor.execute(sql, (session_id, guideid, question, response, reason, phone, email, contact_provided))
+        index_document(cursor, SOURCE_UNANSWERED, cursor.lastrowid, session_id, guideid, question)
     conn.commit()
     conn.close()
 
@@ -153,20 +176,31 @@ def show_qr(qr_base64):
     if not qr_base64:
         return
     try:
+        from PIL import Image  # only guidebooks with a QR code need PIL
         img = Image.open(BytesIO(base64.b64decode(qr_base64)))
         st.image(img, width=200, caption="Scan to share")
     except Exception as e:
         st.error(f"Error loading QR code: {e}")
 
+# ---------------- CLIENT INFO ----------------
+def get_client_ip() -> str:
+    """Client IP for rate limiting (rate_limit.client_ip: trusted proxy hops only)"""
+    try:
+        return client_ip(st.context.headers.get("X-Forwarded-For"), st.context.ip_address)
+    except Exception:
+        return "unknown"
+
 # ---------------- CONTACT VALIDATION ----------------
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_SEPARATORS = re.compile(r'[\s\-\(\)]')
+
 def validate_email(email: str) -> bool:
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_phone(phone: str) -> bool:
     """Validate phone number"""
-    cleaned = re.sub(r'[\s\-\(\)]', '', phone)
+    cleaned = PHONE_SEPARATORS.sub('', phone)
     return cleaned.isdigit() and 10 <= len(cleaned) <= 15
 
 # ---------------- ANSWER DETECTION ----------------
@@ -175,72 +209,32 @@ def check_if_answered(response: str) -> tuple[bool, str, bool]:
     Detect if the AI was able to answer the question
     Returns: (was_answered: bool, reason: str, is_property_related: bool)
     """
-    response_lower = response.lower()
-    
-    # Check if response indicates property-related unanswered question
-    property_related_keywords = [
-        "pass this question to the property manager",
-        "property manager or owner",
-        "contact the property"
-    ]
-    
-    # Check if response indicates non-property-related question
-    non_property_keywords = [
-        "not available in the guidebook",
-        "not relevant to the property",
-        "not related to this property",
-        "outside the scope of this guidebook",
-        "not covered in this guidebook"
-    ]
-    
-    # Check for property-related unanswered
-    for keyword in property_related_keywords:
-        if keyword in response_lower:
-            return False, f"Property-related: '{keyword}'", True
-    
-    # Check for non-property-related unanswered
-    for keyword in non_property_keywords:
-        if keyword in response_lower:
-            return False, f"Non-property-related: '{keyword}'", False
-    
-    # Generic unable to answer keywords
-    unable_keywords = [
-        "not in the guidebook",
-        "don't have information",
-        "cannot find",
-        "not mentioned",
-        "doesn't contain",
-        "no information about",
-        "not covered",
-        "not included",
-        "i don't know",
-        "i'm not sure",
-        "unable to answer"
-    ]
-    
-    for keyword in unable_keywords:
-        if keyword in response_lower:
-            return False, f"Response contained: '{keyword}'", False
-    
-    return True, "Answered successfully", False
+    # Phrase lists live in answer_classifier and are compiled into one pattern
+    return get_classifier().classify(response)
 
-# ---------------- OPENAI CHAT ----------------
-def ask_openai(user_question: str, guidebook_title: str, guide_text: str, 
-               guide_url: str, chat_history: list) -> tuple[str, int, int]:
-    """Generate AI response using OpenAI GPT-4o-mini"""
-    
-    messages = [
-        {
-            "role": "system",
-            "content": f"""You are a helpful AI assistant for the property guidebook titled "{guidebook_title}".
+# ---------------- METRICS ----------------
+CHAT_TURNS = metrics.counter("chat_turns_total", "Guest chat turns by outcome (check_if_answered or rate limit)",
+                             ("outcome",))
+CHAT_TURN_SECONDS = metrics.histogram("chat_turn_duration_seconds",
+                                      "Guest chat turn latency from rate check to saved", ("path",))
 
-Your role is to answer questions based ONLY on the following guidebook content.
+def count_turn(turn: dict, started: float, path: str):
+    if turn['rate_limited']:
+        CHAT_TURNS.inc(outcome="rate_limited")
+        return
+    CHAT_TURNS.inc(outcome="answered" if turn['was_answered'] else "unanswered")
+    CHAT_TURN_SECONDS.observe(time.perf_counter() - started, path=path)
 
-Guidebook Content:
-{guide_text}
+# ---------------- OPENAI CHAT ----------------
+LLM_ERROR_MESSAGE = "I'm sorry, I'm unable to answer right now because of a temporary problem. Please try again in a moment."
 
-Original Guide URL (for reference):
-{guide_url}
+# Providers cache prompt prefixes of 1024+ tokens byte for byte. The system
+# message starts with instructions shared by every guidebook, followed by the
+# guidebook itself, so all guests of one guidebook send the same prefix; the
+# history and anything chosen per question (retrieved sections) come after it.
+SYSTEM_INSTRUCTIONS = """You are a helpful AI assistant for the property guidebook below.
+
+Your role is to answer questions based ONLY on the guidebook content below.
 
 IMPORTANT INSTRUCTIONS:
 
@@ -273,6 +267,32 @@ Guidelines:
 - Be helpful and friendly
 - Do NOT make up information not in the guidebook
 - Clearly distinguish between property-related and non-property questions"""
+
+RETRIEVED_CONTENT_NOTE = ("(This guidebook continues. The further sections relevant to the guest's latest "
+                          "question are given just before it.)")
+
+def guidebook_prompt(guidebook_title: str, guide_text: str, guide_url: str, partial: bool = False) -> str:
+    """System message for one guidebook; `partial` when more sections are retrieved per question"""
+    content = guide_text + (f"\n\n{RETRIEVED_CONTENT_NOTE}" if partial else "")
+    return f"""{SYSTEM_INSTRUCTIONS}
+
+Guidebook Title: {guidebook_title}
+
+Original Guide URL (for reference):
+{guide_url}
+
+Guidebook Content:
+{content}"""
+
+def build_messages(user_question: str, guidebook_title: str, guide_text: str,
+                   guide_url: str, chat_history: list, guideid: str = None) -> list:
+    """System prompt, the last 10 history messages, retrieved sections if any, and the new question"""
+    # Long guidebooks send their leading sections plus the ones relevant to the question (guide_retrieval.py)
+    leading, relevant = select_guide_context(guideid, guide_text, user_question, chat_history)
+    messages = [
+        {
+            "role": "system",
+            "content": guidebook_prompt(guidebook_title, leading, guide_url, partial=bool(relevant))
         }
     ]
     
@@ -284,139 +304,441 @@ Guidelines:
                 "content": msg["content"]
             })
     
+    if relevant:
+        messages.append({
+            "role": "system",
+            "content": "Guidebook sections relevant to this question:\n\n" + relevant
+        })
+    
     messages.append({
         "role": "user",
         "content": user_question
     })
+    return messages
+
+def prompt_cache_key(guideid: str) -> str:
+    """Routes a guidebook's requests to the same provider cache; they share the system prefix"""
+    return f"guidebook:{guideid}" if guideid else None
+
+def completion_result(response, messages: list) -> tuple[str, int, int, int]:
+    """
+    (text, input, output, cached input tokens) of a completion; token counts
+    are estimated when the response has no usage block. Raises AttributeError,
+    IndexError or TypeError for a malformed response.
+    """
+    text = response.choices[0].message.content
+    if text is None:
+        raise TypeError("completion has no message content")
+    usage = response.usage
+    if usage is None:
+        return text, estimate_tokens(str(messages)), estimate_tokens(text), 0
+    return text, usage.prompt_tokens, usage.completion_tokens, cached_tokens(usage)
+
+def ask_openai(user_question: str, guidebook_title: str, guide_text: str, 
+               guide_url: str, chat_history: list, guideid: str = None) -> tuple[str, int, int, int]:
+    """Generate AI response using OpenAI GPT-4o-mini; returns (text, input, output, cached input tokens)"""
+    messages = build_messages(user_question, guidebook_title, guide_text, guide_url, chat_history, guideid)
+
+    # First questions carry no history, so identical ones can share one upstream call
+    coalesce_key = request_key(guideid, messages) if guideid and not chat_history else None
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=messages,
+        response = chat_completion(
+            messages,
+            model=CHAT_MODEL,
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=1000,
+            coalesce_key=coalesce_key,
+            prompt_cache_key=prompt_cache_key(guideid)
         )
-        
-        response_text = response.choices[0].message.content
-        input_tokens = response.usage.prompt_tokens
-        output_tokens = response.usage.completion_tokens
-        
-        return response_text, input_tokens, output_tokens
+        return completion_result(response, messages)
     
-    except Exception as e:
-        error_msg = f"I apologize, but I encountered an error: {str(e)}. Please try again."
-        return error_msg, estimate_tokens(str(messages)), estimate_tokens(error_msg)
+    except LLMError as e:
+        # Don't leak API errors to guests; the phrasing is classified as unanswered
+        print(f"OpenAI error: {e}")
+        return LLM_ERROR_MESSAGE, 0, 0, 0
+    except (AttributeError, IndexError, TypeError) as e:
+        print(f"Malformed OpenAI response: {e}")
+        return LLM_ERROR_MESSAGE, 0, 0, 0
+
+async def ask_openai_async(user_question: str, guidebook_title: str, guide_text: str,
+                           guide_url: str, chat_history: list, guideid: str = None,
+                           on_delta=None) -> tuple[str, int, int, int]:
+    """ask_openai on the async gateway, for run_chat_turn_async; on_delta streams the reply"""
+    if needs_retrieval(guideid, guide_text):
+        # Chunk selection may read guidebook_chunks; keep it off the event loop
+        messages = await asyncio.to_thread(build_messages, user_question, guidebook_title, guide_text,
+                                           guide_url, chat_history, guideid)
+    else:
+        messages = build_messages(user_question, guidebook_title, guide_text, guide_url, chat_history, guideid)
+    coalesce_key = request_key(guideid, messages) if guideid and not chat_history else None
+
+    try:
+        response = await async_chat_completion(
+            messages,
+            model=CHAT_MODEL,
+            temperature=0.7,
+            max_tokens=1000,
+            coalesce_key=coalesce_key,
+            on_delta=on_delta,
+            prompt_cache_key=prompt_cache_key(guideid)
+        )
+        return completion_result(response, messages)
+    except LLMError as e:
+        print(f"OpenAI error: {e}")
+        return LLM_ERROR_MESSAGE, 0, 0, 0
+    except (AttributeError, IndexError, TypeError) as e:
+        print(f"Malformed OpenAI response: {e}")
+        return LLM_ERROR_MESSAGE, 0, 0, 0
 
 # ---------------- PROCESS USER MESSAGE ----------------
-def process_user_message(user_input: str, guidebook: dict):
-    """Process user message and generate response"""
-    st.session_state.messages.append({
+def contact_on_file_message(state) -> str:
+    """Reply shown when a guest who already left contact details asks another unanswered question"""
+    contact_parts = []
+    if state.saved_phone:
+        contact_parts.append(f"phone ({state.saved_phone})")
+    if state.saved_email:
+        contact_parts.append(f"email ({state.saved_email})")
+    return f"ℹ️ We already have your contact information on file ({' and '.join(contact_parts)}). The property manager will get back to you soon."
+
+# ---------------- TRANSCRIPT WINDOW ----------------
+# Messages marked "local" (rate-limit notices, contact confirmations) were never
+# written to chat_messages, so they don't count when paging back through it.
+def get_earlier_messages(session_id: str, skip: int, limit: int) -> list[dict]:
+    """Persisted messages of a session older than the newest `skip`, oldest first"""
+    # The primary: a lagging replica would shift the offset and skip the guest's latest messages
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT role, content FROM chat_messages
+            WHERE session_id = %s
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s OFFSET %s
+            """,
+            (session_id, limit, skip)
+        )
+        rows = cursor.fetchall()
+    conn.close()
+    return [{"role": r['role'], "content": r['content']} for r in reversed(rows)]
+
+def trim_transcript(state, source: str = "page"):
+    """Drop messages beyond TRANSCRIPT_WINDOW from memory and report the session's size"""
+    overflow = len(state.messages) - TRANSCRIPT_WINDOW
+    if overflow > 0:
+        del state.messages[:overflow]
+        state.transcript_trimmed = True
+        # Loaded earlier messages would leave a gap before the new window start
+        state.earlier_messages = []
+        state.earlier_exhausted = False
+    session_memory.record(state.session_id, state.messages, getattr(state, 'earlier_messages', []), source)
+
+def load_earlier_messages(state, source: str = "page") -> list[dict]:
+    """Prepend the next page of older messages to state.earlier_messages"""
+    skip = sum(1 for m in state.messages if not m.get("local")) + len(state.earlier_messages)
+    older = get_earlier_messages(state.session_id, skip, EARLIER_PAGE_SIZE)
+    state.earlier_messages = older + state.earlier_messages
+    state.earlier_exhausted = len(older) < EARLIER_PAGE_SIZE
+    session_memory.record(state.session_id, state.messages, state.earlier_messages, source)
+    return older
+
+def submit_contact_info(state, user_phone: str, user_email: str) -> tuple[bool, str]:
+    """
+    Validate and save the contact details a guest leaves for their pending question.
+    Returns (saved, confirmation) or (False, validation error).
+    """
+    phone_valid = validate_phone(user_phone) if user_phone else False
+    email_valid = validate_email(user_email) if user_email else False
+
+    if not user_phone and not user_email:
+        return False, "Please provide at least one contact method"
+    if user_phone and not phone_valid:
+        return False, "Please enter a valid phone number"
+    if user_email and not email_valid:
+        return False, "Please enter a valid email address"
+
+    update_unanswered_question_contact(
+        state.session_id,
+        state.pending_question,
+        user_phone if phone_valid else None,
+        user_email if email_valid else None
+    )
+
+    state.saved_phone = user_phone if phone_valid else None
+    state.saved_email = user_email if email_valid else None
+
+    confirmation = "✅ Thank you! We've saved your contact information. "
+    if user_phone and user_email:
+        confirmation += f"The property manager will reach out to you via phone ({user_phone}) or email ({user_email}) soon."
+    elif user_phone:
+        confirmation += f"The property manager will call or text you at {user_phone} soon."
+    else:
+        confirmation += f"The property manager will email you at {user_email} soon."
+
+    state.messages.append({
+        "role": "assistant",
+        "content": confirmation,
+        "local": True
+    })
+    state.awaiting_contact = False
+    state.pending_question = None
+    return True, confirmation
+
+def skip_contact(state) -> str:
+    """Guest declined to leave contact details for the pending question"""
+    reply = "No problem! Feel free to ask another question."
+    state.awaiting_contact = False
+    state.pending_question = None
+    state.messages.append({
+        "role": "assistant",
+        "content": reply,
+        "local": True
+    })
+    return reply
+
+async def run_chat_turn_async(state, user_input: str, guidebook: dict, client_ip: str = "unknown",
+                              on_delta=None) -> dict:
+    """
+    run_chat_turn with overlapping I/O: the user message is saved while the model
+    is answering, then the assistant message(s), unanswered-question log and
+    session stats are written concurrently.
+    """
+    started = time.perf_counter()
+    guideid = guidebook['guideid']
+    version = guidebook.get('current_version') or None
+    allowed, limit_msg = check_chat_allowed(state.session_id, client_ip, guideid)
+
+    state.messages.append({
+        "role": "user",
+        "content": user_input
+    })
+
+    if not allowed:
+        state.messages[-1]["local"] = True
+        state.messages.append({
+            "role": "assistant",
+            "content": f"⏳ {limit_msg}",
+            "local": True
+        })
+        turn = {'response': f"⏳ {limit_msg}", 'rate_limited': True, 'was_answered': True}
+        count_turn(turn, started, "async")
+        return turn
+
+    answer, user_message_id = await asyncio.gather(
+        ask_openai_async(
+            user_question=user_input,
+            guidebook_title=guidebook['guidebook_title'],
+            guide_text=guidebook['guide_text'],
+            guide_url=guidebook.get('guide_original_url', ''),
+            chat_history=state.messages[:-1],
+            guideid=guideid,
+            on_delta=on_delta
+        ),
+        async_db.save_chat_message(state.session_id, guideid, "user", user_input, 0, 0, True, version),
+        return_exceptions=True
+    )
+    if isinstance(answer, BaseException):
+        raise answer
+    response, input_tokens, output_tokens, cached = answer
+
+    was_answered, reason, is_property_related = check_if_answered(response)
+
+    state.messages[-1]["input_tokens"] = input_tokens
+    state.messages.append({
+        "role": "assistant",
+        "content": response,
+        "output_tokens": output_tokens,
+        "was_answered": was_answered
+    })
+
+    state.total_input_tokens += input_tokens
+    state.total_output_tokens += output_tokens
+    record_token_usage(guideid, input_tokens + output_tokens)
+
+    assistant_rows = [(state.session_id, guideid, version, "assistant", response, 0, output_tokens, was_answered)]
+    writes = [async_db.update_session_stats(state.session_id, input_tokens, output_tokens, cached)]
+    if isinstance(user_message_id, BaseException):
+        print(f"Error saving chat: {user_message_id}")
+    elif input_tokens:
+        writes.append(async_db.set_message_input_tokens(user_message_id, input_tokens, cached))
+
+    if not was_answered:
+        if is_property_related and (state.saved_phone or state.saved_email):
+            writes.append(async_db.log_unanswered_question(
+                state.session_id, guideid, user_input, response, reason, state.saved_phone, state.saved_email
+            ))
+            contact_info_msg = contact_on_file_message(state)
+            state.messages.append({
+                "role": "assistant",
+                "content": contact_info_msg
+            })
+            assistant_rows.append((state.session_id, guideid, version, "assistant", contact_info_msg,
+                                   0, estimate_tokens(contact_info_msg), True))
+        else:
+            writes.append(async_db.log_unanswered_question(state.session_id, guideid, user_input, response, reason))
+            if is_property_related:
+                state.awaiting_contact = True
+                state.pending_question = user_input
+
+    writes.append(async_db.save_chat_messages(assistant_rows))
+    for result in await asyncio.gather(*writes, return_exceptions=True):
+        if isinstance(result, BaseException):
+            print(f"Error saving chat: {result}")
+
+    turn = {
+        'response': response,
+        'rate_limited': False,
+        'was_answered': was_answered,
+        'is_property_related': is_property_related,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'cached_tokens': cached,
+    }
+    count_turn(turn, started, "async")
+    return turn
+
+TURN_STATE_KEYS = ("session_id", "messages", "total_input_tokens", "total_output_tokens",
+                   "awaiting_contact", "pending_question", "saved_phone", "saved_email")
+
+def run_chat_turn(state, user_input: str, guidebook: dict, client_ip: str = "unknown", on_delta=None) -> dict:
+    """
+    Run one guest turn without any UI: rate limit, ask OpenAI, classify and persist.
+    `state` is st.session_state or any object with the same attributes (used headlessly
+    by bench/chat_load.py and chat_api.py). Returns the assistant response and its
+    classification. on_delta(text) receives the reply as it streams in (async path
+    only; the sequential path passes the whole reply once).
+    """
+    if ASYNC_CHAT_TURNS:
+        if state is not st.session_state:
+            return async_db.run_sync(run_chat_turn_async(state, user_input, guidebook, client_ip, on_delta))
+        # st.session_state can't be read off the script thread, so the event
+        # loop works on a copy that is written back afterwards
+        turn_state = types.SimpleNamespace(**{key: state[key] for key in TURN_STATE_KEYS})
+        try:
+            return async_db.run_sync(run_chat_turn_async(turn_state, user_input, guidebook, client_ip, on_delta))
+        finally:
+            for key in TURN_STATE_KEYS:
+                state[key] = getattr(turn_state, key)
+
+    started = time.perf_counter()
+    version = guidebook.get('current_version') or None
+    allowed, limit_msg = check_chat_allowed(state.session_id, client_ip, guidebook['guideid'])
+
+    state.messages.append({
         "role": "user", 
         "content": user_input
     })
-    
-    with st.chat_message("user"):
-        st.markdown(user_input)
 
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response, input_tokens, output_tokens = ask_openai(
-                user_question=user_input,
-                guidebook_title=guidebook['guidebook_title'],
-                guide_text=guidebook['guide_text'],
-                guide_url=guidebook.get('guide_original_url', ''),
-                chat_history=st.session_state.messages[:-1]
-            )
-            st.markdown(response)
+    if not allowed:
+        # Rate-limited turns never reach OpenAI and are not persisted
+        state.messages[-1]["local"] = True
+        state.messages.append({
+            "role": "assistant",
+            "content": f"⏳ {limit_msg}",
+            "local": True
+        })
+        turn = {'response': f"⏳ {limit_msg}", 'rate_limited': True, 'was_answered': True}
+        count_turn(turn, started, "sync")
+        return turn
+
+    response, input_tokens, output_tokens, cached = ask_openai(
+        user_question=user_input,
+        guidebook_title=guidebook['guidebook_title'],
+        guide_text=guidebook['guide_text'],
+        guide_url=guidebook.get('guide_original_url', ''),
+        chat_history=state.messages[:-1],
+        guideid=guidebook['guideid']
+    )
+    if on_delta is not None:
+        on_delta(response)
     
     was_answered, reason, is_property_related = check_if_answered(response)
     
-    st.session_state.messages[-1]["input_tokens"] = input_tokens
+    state.messages[-1]["input_tokens"] = input_tokens
     
-    st.session_state.messages.append({
+    state.messages.append({
         "role": "assistant", 
         "content": response,
         "output_tokens": output_tokens,
         "was_answered": was_answered
     })
     
-    st.session_state.total_input_tokens += input_tokens
-    st.session_state.total_output_tokens += output_tokens
+    state.total_input_tokens += input_tokens
+    state.total_output_tokens += output_tokens
+    record_token_usage(guidebook['guideid'], input_tokens + output_tokens)
     
     try:
         save_chat_message(
-            st.session_state.session_id,
+            state.session_id,
             guidebook['guideid'],
             "user",
             user_input,
             input_tokens,
             0,
-            True
+            True,
+            cached=cached,
+            guide_version=version
         )
         
         save_chat_message(
-            st.session_state.session_id,
+            state.session_id,
             guidebook['guideid'],
             "assistant",
             response,
             0,
             output_tokens,
-            was_answered
+            was_answered,
+            guide_version=version
         )
         
         if not was_answered:
             if is_property_related:
                 # Property-related question - ask for contact
-                if st.session_state.saved_phone or st.session_state.saved_email:
+                if state.saved_phone or state.saved_email:
                     # Contact already saved
                     log_unanswered_question(
-                        st.session_state.session_id,
+                        state.session_id,
                         guidebook['guideid'],
                         user_input,
                         response,
                         reason,
-                        st.session_state.saved_phone,
-                        st.session_state.saved_email
+                        state.saved_phone,
+                        state.saved_email
                     )
                     
-                    contact_parts = []
-                    if st.session_state.saved_phone:
-                        contact_parts.append(f"phone ({st.session_state.saved_phone})")
-                    if st.session_state.saved_email:
-                        contact_parts.append(f"email ({st.session_state.saved_email})")
+                    contact_info_msg = contact_on_file_message(state)
                     
-                    contact_info_msg = f"ℹ️ We already have your contact information on file ({' and '.join(contact_parts)}). The property manager will get back to you soon."
-                    
-                    st.session_state.messages.append({
+                    state.messages.append({
                         "role": "assistant",
                         "content": contact_info_msg
                     })
                     
                     save_chat_message(
-                        st.session_state.session_id,
+                        state.session_id,
                         guidebook['guideid'],
                         "assistant",
                         contact_info_msg,
                         0,
                         estimate_tokens(contact_info_msg),
-                        True
+                        True,
+                        guide_version=version
                     )
                 else:
                     # No contact yet - ask for it
                     log_unanswered_question(
-                        st.session_state.session_id,
+                        state.session_id,
                         guidebook['guideid'],
                         user_input,
                         response,
                         reason
                     )
                     
-                    st.session_state.awaiting_contact = True
-                    st.session_state.pending_question = user_input
+                    state.awaiting_contact = True
+                    state.pending_question = user_input
             else:
                 # Non-property-related - just log, don't ask for contact
                 log_unanswered_question(
-                    st.session_state.session_id,
+                    state.session_id,
                     guidebook['guideid'],
                     user_input,
                     response,
@@ -424,14 +746,45 @@ def process_user_message(user_input: str, guidebook: dict):
                 )
         
         update_session_stats(
-            st.session_state.session_id,
+            state.session_id,
             input_tokens,
-            output_tokens
+            output_tokens,
+            cached
         )
         
     except Exception as e:
         print(f"Error saving chat: {e}")
 
+    turn = {
+        'response': response,
+        'rate_limited': False,
+        'was_answered': was_answered,
+        'is_property_related': is_property_related,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'cached_tokens': cached,
+    }
+    count_turn(turn, started, "sync")
+    return turn
+
+def process_user_message(user_input: str, guidebook: dict):
+    """Process user message and render just this turn below the transcript"""
+    with st.chat_message("user"):
+        st.markdown(user_input)
+
+    first_reply = len(st.session_state.messages) + 1
+    with st.chat_message("assistant"):
+        with st.spinner("Thinking..."):
+            turn = run_chat_turn(st.session_state, user_input, guidebook, get_client_ip())
+            st.markdown(turn['response'])
+
+    # e.g. "we already have your contact information"
+    for message in st.session_state.messages[first_reply + 1:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    trim_transcript(st.session_state)
+
 # ---------------- MAIN CHATBOT PAGE ----------------
 def main():
     st.set_page_config(
@@ -584,6 +937,11 @@ def main():
     if "pending_question" not in st.session_state:
         st.session_state.pending_question = None
     
+    if "transcript_trimmed" not in st.session_state:
+        st.session_state.transcript_trimmed = False
+        st.session_state.earlier_messages = []
+        st.session_state.earlier_exhausted = False
+    
     # Check if contact info already exists for this session
     if "session_contact_checked" not in st.session_state:
         existing_contact = get_session_contact_info(st.session_state.session_id)
@@ -632,7 +990,11 @@ def main():
         # Clear chat button
         if st.button("🗑️ New Chat", use_container_width=True):
             end_chat_session(st.session_state.session_id)
+            session_memory.forget(st.session_state.session_id)
             st.session_state.messages = []
+            st.session_state.transcript_trimmed = False
+            st.session_state.earlier_messages = []
+            st.session_state.earlier_exhausted = False
             st.session_state.total_input_tokens = 0
             st.session_state.total_output_tokens = 0
             st.session_state.awaiting_contact = False
@@ -646,107 +1008,117 @@ def main():
             )
             st.rerun()
 
+    chat_panel(guidebook)
+
+@st.fragment
+def chat_panel(guidebook: dict):
+    """
+    Quick questions, transcript, contact form and chat input. As a fragment,
+    a message reruns only this part of the page (not the CSS, header and
+    sidebar QR), and the new turn is drawn below the transcript already on
+    screen instead of through another rerun.
+    """
+    with profiling.rerun("chatbot"):
+        _chat_panel(guidebook)
+
+def rerun_chat_panel():
+    """Rerun just the chat panel; a turn taken during a full-page run reruns the page"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def _chat_panel(guidebook: dict):
     # Quick Action Buttons (shown when no messages or at start)
-    if len(st.session_state.messages) == 0:
-        st.markdown("### 💡 Quick Questions")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("📶 WiFi Password", key="btn_wifi", use_container_width=True):
-                process_user_message("What is the WiFi password?", guidebook)
-                st.rerun()
-        
-        with col2:
-            if st.button("📺 TV Remote", key="btn_tv", use_container_width=True):
-                process_user_message("How do I use the TV remote?", guidebook)
-                st.rerun()
-        
-        st.divider()
+    quick_question = None
+    quick_area = st.empty()
+    if len(st.session_state.messages) == 0 and not st.session_state.transcript_trimmed:
+        with quick_area.container():
+            st.markdown("### 💡 Quick Questions")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                if st.button("📶 WiFi Password", key="btn_wifi", use_container_width=True):
+                    quick_question = "What is the WiFi password?"
+            
+            with col2:
+                if st.button("📺 TV Remote", key="btn_tv", use_container_width=True):
+                    quick_question = "How do I use the TV remote?"
+            
+            st.divider()
+
+    # Messages older than the in-memory window are read from chat_messages on demand
+    if st.session_state.transcript_trimmed:
+        if not st.session_state.earlier_exhausted and len(st.session_state.earlier_messages) < EARLIER_MAX:
+            if st.button("⬆️ Load earlier messages", key="load_earlier"):
+                load_earlier_messages(st.session_state)
+        for message in st.session_state.earlier_messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+        if st.session_state.earlier_messages:
+            st.caption("⬆️ Earlier messages")
 
     # Display chat messages
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
+    # Chat input
+    user_input = None
+    if not st.session_state.awaiting_contact:
+        user_input = st.chat_input("Ask me anything related to this property...")
+
+    if quick_question or user_input:
+        quick_area.empty()
+        process_user_message(quick_question or user_input, guidebook)
+        if st.session_state.awaiting_contact:
+            # The chat input drawn above would stay under the contact form, and
+            # the next rerun skips it, dropping whatever the guest typed there
+            rerun_chat_panel()
+
     # Show contact form if awaiting contact information
     if st.session_state.awaiting_contact:
-        st.markdown('<div class="contact-form">', unsafe_allow_html=True)
-        st.subheader("📞 Contact Information")
-        st.write("Please provide at least one way for us to reach you:")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            user_phone = st.text_input("Phone Number (optional)", placeholder="+1 234 567 8900")
-        
-        with col2:
-            user_email = st.text_input("Email (optional)", placeholder="your@email.com")
-        
-        col_submit, col_skip = st.columns(2)
-        
-        with col_submit:
-            if st.button("✅ Submit Contact Info", use_container_width=True, type="primary"):
-                phone_valid = validate_phone(user_phone) if user_phone else False
-                email_valid = validate_email(user_email) if user_email else False
-                
-                if not user_phone and not user_email:
-                    st.error("Please provide at least one contact method")
-                elif user_phone and not phone_valid:
-                    st.error("Please enter a valid phone number")
-                elif user_email and not email_valid:
-                    st.error("Please enter a valid email address")
-                else:
-                    try:
-                        update_unanswered_question_contact(
-                            st.session_state.session_id,
-                            st.session_state.pending_question,
-                            user_phone if phone_valid else None,
-                            user_email if email_valid else None
-                        )
-                        
-                        st.session_state.saved_phone = user_phone if phone_valid else None
-                        st.session_state.saved_email = user_email if email_valid else None
-                        
-                        confirmation = "✅ Thank you! We've saved your contact information. "
-                        if user_phone and user_email:
-                            confirmation += f"The property manager will reach out to you via phone ({user_phone}) or email ({user_email}) soon."
-                        elif user_phone:
-                            confirmation += f"The property manager will call or text you at {user_phone} soon."
-                        else:
-                            confirmation += f"The property manager will email you at {user_email} soon."
-                        
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": confirmation
-                        })
-                        
-                        st.session_state.awaiting_contact = False
-                        st.session_state.pending_question = None
-                        
-                        st.success("Contact information saved!")
-                        st.rerun()
-                        
-                    except Exception as e:
-                        st.error(f"Error saving contact info: {e}")
-        
-        with col_skip:
-            if st.button("⏭️ Skip", use_container_width=True):
-                st.session_state.awaiting_contact = False
-                st.session_state.pending_question = None
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": "No problem! Feel free to ask another question."
-                })
-                st.rerun()
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+        with st.container():
+            st.markdown('<div class="contact-form">', unsafe_allow_html=True)
+            st.subheader("📞 Contact Information")
+            st.write("Please provide at least one way for us to reach you:")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                user_phone = st.text_input("Phone Number (optional)", placeholder="+1 234 567 8900")
+            
+            with col2:
+                user_email = st.text_input("Email (optional)", placeholder="your@email.com")
+            
+            col_submit, col_skip = st.columns(2)
+            
+            with col_submit:
+                submitted = st.button("✅ Submit Contact Info", use_container_width=True, type="primary")
+            
+            with col_skip:
+                skipped = st.button("⏭️ Skip", use_container_width=True)
+            
+            st.markdown('</div>', unsafe_allow_html=True)
 
-    # Chat input
-    if not st.session_state.awaiting_contact:
-        if user_input := st.chat_input("Ask me anything related to this property..."):
-            process_user_message(user_input, guidebook)
-            st.rerun()
+        if submitted:
+            try:
+                saved, message = submit_contact_info(st.session_state, user_phone, user_email)
+            except Exception as e:
+                st.error(f"Error saving contact info: {e}")
+            else:
+                if not saved:
+                    st.error(message)
+                else:
+                    st.success("Contact information saved!")
+                    # Full rerun: the sidebar shows the saved contact
+                    st.rerun()
+        elif skipped:
+            skip_contact(st.session_state)
+            trim_transcript(st.session_state)
+            # The chat input was not drawn in this run
+            rerun_chat_panel()
 
 if __name__ == "__main__":
     main()
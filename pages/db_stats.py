@@ -0,0 +1,188 @@
+import streamlit as st
+from db import get_query_stats, reset_query_stats, get_replica_status, SLOW_QUERY_MS, REPLICA_MAX_LAG_SECONDS
+from ref_cache import get_reference_cache_stats, clear_reference_cache, REF_CACHE_TTL_SECONDS
+from session_memory import get_session_memory_stats, IDLE_SECONDS
+from profiling import get_profile_stats, reset_profile_stats, PROFILING, PROFILE_DUMP_DIR
+
+# ---------------- MAIN PAGE ----------------
+def show_db_stats_page():
+    st.title("🩺 DB Performance")
+
+    if st.button("⬅ Back to Dashboard"):
+        st.session_state.page = "dashboard"
+        st.rerun()
+
+    st.divider()
+
+    stats = get_query_stats(limit=25)
+    st.caption("Counters are per app process and reset on restart.")
+
+    # Read replica routing
+    replica = get_replica_status()
+    if replica['configured']:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Replica", "🟢 In use" if replica['healthy'] else "🔴 Bypassed")
+        with col2:
+            lag = replica['lag_seconds']
+            st.metric("Replica Lag", "n/a" if lag is None else f"{lag:.0f}s",
+                      help=f"Reads fall back to the primary above {REPLICA_MAX_LAG_SECONDS:.0f}s")
+        with col3:
+            st.metric("Replica Reads", replica['replica_reads'])
+        with col4:
+            st.metric("Primary Fallbacks", replica['primary_fallbacks'])
+        if replica['error']:
+            st.caption(f"⚠️ {replica['error']}")
+    else:
+        st.caption("No read replica configured (replica_host); reporting reads use the primary.")
+
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🔥 Top Queries", "📄 By Page", "🐢 Slow Queries",
+                                                  "🗂️ Reference Cache", "🧠 Guest Sessions", "⏱️ Profiling"])
+
+    # TAB 1: Top fingerprints by total time
+    with tab1:
+        if not stats['top']:
+            st.info("No queries recorded yet")
+        else:
+            st.dataframe([
+                {
+                    "Total ms": round(q['total_ms'], 1),
+                    "Calls": q['count'],
+                    "Avg ms": round(q['avg_ms'], 2),
+                    "Max ms": round(q['max_ms'], 1),
+                    "Rows": q['rows'],
+                    "Called from": ", ".join(q['callers']),
+                    "Pages": ", ".join(q['pages']),
+                    "Statement": q['fingerprint'],
+                }
+                for q in stats['top']
+            ], use_container_width=True, hide_index=True)
+
+    # TAB 2: Per-page rerun cost
+    with tab2:
+        if not stats['pages']:
+            st.info("No page data yet")
+        else:
+            rows = []
+            for page, p in sorted(stats['pages'].items(), key=lambda item: item[1]['total_ms'], reverse=True):
+                reruns = max(p['reruns'], 1)
+                rows.append({
+                    "Page": page,
+                    "Reruns": p['reruns'],
+                    "Queries / rerun": round(p['queries'] / reruns, 2),
+                    "DB ms / rerun": round(p['total_ms'] / reruns, 1),
+                    "Connections / rerun": round(p['connections'] / reruns, 2),
+                    "Max queries in a rerun": p['max_queries_per_rerun'],
+                    "Max DB ms in a rerun": round(p['max_ms_per_rerun'], 1),
+                })
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+
+    # TAB 3: Recent slow queries
+    with tab3:
+        st.caption(f"Statements slower than {SLOW_QUERY_MS:.0f} ms (SLOW_QUERY_MS)")
+        if not stats['slow']:
+            st.success("No slow queries recorded")
+        else:
+            st.dataframe(list(reversed(stats['slow'])), use_container_width=True, hide_index=True)
+
+    # TAB 4: Dropdown reference lists (ref_cache.py)
+    with tab4:
+        st.caption(f"Manager, property and guidebook lists cached for {REF_CACHE_TTL_SECONDS:.0f}s "
+                   f"(REF_CACHE_TTL_SECONDS) and dropped when they change")
+        cache_stats = get_reference_cache_stats()
+        if not cache_stats:
+            st.info("No reference lists requested yet")
+        else:
+            hits = sum(c['hits'] for c in cache_stats.values())
+            lookups = hits + sum(c['misses'] for c in cache_stats.values())
+            st.metric("Hit Rate", f"{hits / lookups:.0%}" if lookups else "n/a", help=f"{hits} of {lookups} lookups")
+            st.dataframe([
+                {
+                    "List": label,
+                    "Hit rate": f"{c['hit_rate']:.0%}",
+                    "Hits": c['hits'],
+                    "Misses": c['misses'],
+                    "Invalidations": c['invalidations'],
+                    "Cached entries": c['entries'],
+                }
+                for label, c in sorted(cache_stats.items())
+            ], use_container_width=True, hide_index=True)
+
+    # TAB 5: Guest transcripts held in memory (session_memory.py)
+    with tab5:
+        st.caption(f"Chat sessions active in the last {IDLE_SECONDS // 60} minutes in this process; "
+                   f"transcripts beyond the window are read from chat_messages on demand")
+        memory = get_session_memory_stats()
+        if not memory['sessions']:
+            st.info("No guest sessions yet")
+        else:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Sessions", memory['sessions'])
+            with col2:
+                st.metric("Messages Held", memory['messages'])
+            with col3:
+                st.metric("Total Memory", f"{memory['bytes'] / 1024 / 1024:.2f} MB")
+            with col4:
+                st.metric("Largest Session", f"{memory['max_bytes'] / 1024:.1f} KB")
+            st.dataframe([
+                {
+                    "Session": s['session_id'],
+                    "Source": s['source'],
+                    "Messages": s['messages'],
+                    "Earlier loaded": s['earlier'],
+                    "KB": round(s['bytes'] / 1024, 1),
+                    "Idle s": s['idle_seconds'],
+                }
+                for s in memory['largest']
+            ], use_container_width=True, hide_index=True)
+
+    # TAB 6: Per-rerun DB / LLM / render breakdown (profiling.py)
+    with tab6:
+        if not PROFILING:
+            st.info("Profiling is off. Set PROFILING = true in secrets (or APP_PROFILING=1) and restart.")
+        else:
+            st.caption("Recent page renders in this process"
+                       + (f"; cProfile dumps of the slowest are kept in {PROFILE_DUMP_DIR}" if PROFILE_DUMP_DIR else ""))
+            profile = get_profile_stats()
+            if not profile['slowest']:
+                st.info("No renders profiled yet")
+            else:
+                st.dataframe([
+                    {
+                        "Page": page,
+                        "Renders": p['reruns'],
+                        "p50 ms": round(p['total_p50'], 1),
+                        "p95 ms": round(p['total_p95'], 1),
+                        "DB p95 ms": round(p['db_p95'], 1),
+                        "LLM p95 ms": round(p['llm_p95'], 1),
+                        "Render p95 ms": round(p['render_p95'], 1),
+                    }
+                    for page, p in sorted(profile['pages'].items())
+                ], use_container_width=True, hide_index=True)
+                st.markdown("**Slowest renders**")
+                st.dataframe([
+                    {
+                        "At": r['at'],
+                        "Page": r['page'],
+                        "Total ms": r['total_ms'],
+                        "DB ms": r['db_ms'],
+                        "Queries": r['queries'],
+                        "LLM ms": r['llm_ms'],
+                        "Render ms": r['render_ms'],
+                        "Top span": f"{r['spans'][0]['label']} ({r['spans'][0]['ms']:.0f} ms)" if r['spans'] else "",
+                        "cProfile": r['dump'] or "",
+                    }
+                    for r in profile['slowest']
+                ], use_container_width=True, hide_index=True)
+
+    st.divider()
+
+    if st.button("🔄 Reset Counters"):
+        reset_query_stats()
+        clear_reference_cache()
+        reset_profile_stats()
+        st.rerun()
+
+if __name__ == "__main__":
+    show_db_stats_page()
@@ -1,23 +1,25 @@
 import streamlit as st
 import uuid
 import base64
-from io import BytesIO
 from datetime import datetime
-import qrcode
-from db import get_connection
-
-# ---------------- QR GENERATOR ----------------
-def generate_qr_base64(url: str) -> str:
-    qr = qrcode.make(url)
-    buffer = BytesIO()
-    qr.save(buffer, format="PNG")
-    return base64.b64encode(buffer.getvalue()).decode()
+from db import get_connection, get_read_connection
+from compression import pack
+from ref_cache import reference_data, invalidate
+from qr_codes import generate_qr_base64
+from guide_retrieval import index_guidebook
+from guide_versions import record_version
 
 # ---------------- GENERATE CHATBOT URL ----------------
-def generate_chatbot_url(guidebook_title: str) -> str:
-    """Generate a clean URL for the guidebook chatbot"""
+def guidebook_slug(guidebook_title: str) -> str:
     slug = guidebook_title.lower().replace(" ", "_").replace("-", "_")
-    slug = ''.join(c for c in slug if c.isalnum() or c == '_')
+    return ''.join(c for c in slug if c.isalnum() or c == '_')
+
+def generate_chatbot_url(guidebook_title: str, base_url: str = None) -> str:
+    """Generate a clean URL for the guidebook chatbot"""
+    slug = guidebook_slug(guidebook_title)
+
+    if base_url:
+        return f"{base_url.rstrip('/')}?guidebook={slug}"
     
     try:
         base_url = st.context.headers.get("Host", "localhost:8501")
@@ -29,6 +31,7 @@ def generate_chatbot_url(guidebook_title: str) -> str:
     return f"{protocol}{base_url}?guidebook={slug}"
 
 # ---------------- DB OPS ----------------
+@reference_data("property_registration")
 def get_all_properties():
     """Get all available properties"""
     conn = get_connection()
@@ -42,7 +45,7 @@ def get_all_properties():
 
 def get_guidebooks():
     """Get all guidebooks"""
-    conn = get_connection()
+    conn = get_read_connection()
     with conn.cursor() as cursor:
         cursor.execute(
             "SELECT * FROM guidebook_registration ORDER BY created_date DESC"
@@ -82,7 +85,7 @@ def insert_guidebook(title, text, original_url, description, user):
         cursor.execute(sql, (
             guideid,
             title,
-            text,
+            pack(text),
             original_url,
             chatbot_url,
             description,
@@ -90,18 +93,33 @@ def insert_guidebook(title, text, original_url, description, user):
             user,
             datetime.now()
         ))
+        record_version(cursor, guideid, title, text, original_url, user)
+        index_guidebook(cursor, guideid, text)
     conn.commit()
     conn.close()
+    invalidate("guidebook_registration")
     
     return guideid, chatbot_url, qr_base64
 
 def update_guidebook(guideid, title, text, original_url, description, user):
-    """Update existing guidebook"""
+    """
+    Update existing guidebook. Returns (version, changed): a new version is
+    recorded only when its content changed.
+    """
     chatbot_url = generate_chatbot_url(title)
-    qr_base64 = generate_qr_base64(chatbot_url)
 
     conn = get_connection()
     with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT guide_chatbot_url, qr_code_base64 FROM guidebook_registration WHERE guideid = %s",
+            (guideid,)
+        )
+        current = cursor.fetchone() or {}
+        # The QR code encodes only the chatbot URL
+        qr_base64 = current.get('qr_code_base64')
+        if not qr_base64 or current.get('guide_chatbot_url') != chatbot_url:
+            qr_base64 = generate_qr_base64(chatbot_url)
+
         sql = """
         UPDATE guidebook_registration
         SET guidebook_title=%s,
@@ -116,7 +134,7 @@ def update_guidebook(guideid, title, text, original_url, description, user):
         """
         cursor.execute(sql, (
             title,
-            text,
+            pack(text),
             original_url,
             chatbot_url,
             description,
@@ -125,8 +143,14 @@ def update_guidebook(guideid, title, text, original_url, description, user):
             user,
             guideid
         ))
+        version, changed = record_version(cursor, guideid, title, text, original_url, user)
+        # Also when unchanged: keeps current chunks, but retries a failed
+        # embedding and re-embeds after an EMBEDDING_PROVIDER switch
+        index_guidebook(cursor, guideid, text)
     conn.commit()
     conn.close()
+    invalidate("guidebook_registration")
+    return version, changed
 
 def map_guidebook_to_properties(guideid: str, property_ids: list, user: str):
     """Map a guidebook to multiple properties"""
@@ -371,12 +395,14 @@ def show_guidebook_page():
             st.image(qr_bytes, width=200, caption="Scan to open chatbot")
 
             st.caption(f"🆔 {g['guideid']}")
+            if g.get('current_version'):
+                st.caption(f"📘 Version {g['current_version']} · content {g['content_hash'][:12]}")
             st.caption(f"Created: {g['created_date']} by {g['created_by']}")
             if g.get('modified_date'):
                 st.caption(f"Modified: {g['modified_date']} by {g.get('modified_by', 'N/A')}")
 
             if st.button("💾 Update Guidebook", key=f"upd_{g['guideid']}", type="primary"):
-                update_guidebook(
+                version, changed = update_guidebook(
                     g["guideid"],
                     new_title,
                     new_text,
@@ -384,7 +410,10 @@ def show_guidebook_page():
                     new_description,
                     st.session_state.username
                 )
-                st.success("✏️ Updated successfully!")
+                if changed:
+                    st.success(f"✏️ Updated successfully! Saved as version {version}.")
+                else:
+                    st.success(f"✏️ Updated successfully! Content unchanged, still version {version}.")
                 st.rerun()
 
 if __name__ == "__main__":
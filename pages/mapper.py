@@ -1,9 +1,11 @@
 import streamlit as st
 import uuid
 from datetime import datetime
-from db import get_connection
+from db import get_connection, get_read_connection
+from ref_cache import reference_data
 
 # ---------------- DB FETCH ----------------
+@reference_data("property_registration")
 def get_properties():
     conn = get_connection()
     with conn.cursor() as cursor:
@@ -13,6 +15,7 @@ def get_properties():
     return rows
 
 
+@reference_data("guidebook_registration")
 def get_guidebooks():
     conn = get_connection()
     with conn.cursor() as cursor:
@@ -23,7 +26,7 @@ def get_guidebooks():
 
 
 def get_mappings():
-    conn = get_connection()
+    conn = get_read_connection()
     with conn.cursor() as cursor:
         cursor.execute("""
             SELECT m.id, p.property_address, g.guidebook_title,
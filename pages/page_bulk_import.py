@@ -0,0 +1,121 @@
+import csv
+import io
+import streamlit as st
+from bulk_import import detect_format, import_guidebooks, import_managers, import_properties, CHUNK_SIZE
+
+GUIDEBOOK_TEMPLATE = (
+    "title,guide_text,original_url,description,property_ids,property_addresses\n"
+    "Beach House,\"Check-in is from 4pm...\",https://example.com/beach,,,\"12 Ocean Dr\"\n"
+)
+MANAGER_TEMPLATE = (
+    "manager_name,contact_address,email,phone,password\n"
+    "Jane Doe,\"1 Main St\",jane@example.com,555-123-4567,ChangeMe123\n"
+)
+PROPERTY_TEMPLATE = (
+    "property_address,manager_email\n"
+    "\"12 Ocean Dr\",jane@example.com\n"
+)
+
+# ---------------- HELPERS ----------------
+def errors_csv(errors: list) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["line", "error"])
+    writer.writeheader()
+    writer.writerows(errors)
+    return buffer.getvalue()
+
+def run_upload(importer, uploaded, key: str, **options):
+    """Run an importer over an uploaded file with a live progress bar, then show the report"""
+    progress_bar = st.progress(0.0, text="Starting...")
+    size = max(uploaded.size, 1)
+
+    def progress(report):
+        fraction = min(report['bytes_read'] / size, 1.0)
+        progress_bar.progress(
+            fraction,
+            text=f"{report['read']} read · {report['imported']} imported · {report['rejected']} rejected "
+                 f"· {report['rows_per_sec']:.0f} rows/s"
+        )
+
+    uploaded.seek(0)
+    with st.spinner("Importing..."):
+        report = importer(uploaded, detect_format(uploaded.name), st.session_state.username,
+                          progress=progress, **options)
+    progress_bar.progress(1.0, text="Done")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Read", report['read'])
+    with col2:
+        st.metric("Valid" if options.get('dry_run') else "Imported", report['imported'])
+    with col3:
+        st.metric("Rejected", report['rejected'])
+    with col4:
+        st.metric("Rows / sec", f"{report['rows_per_sec']:.0f}")
+
+    if report['errors']:
+        st.warning(f"{len(report['errors'])} rows were rejected")
+        st.dataframe(report['errors'], use_container_width=True, hide_index=True)
+        st.download_button("⬇️ Download Rejected Rows", errors_csv(report['errors']),
+                           file_name=f"{key}_import_errors.csv", mime="text/csv", key=f"{key}_errors")
+    elif not options.get('dry_run'):
+        st.success(f"✅ Imported {report['imported']} rows")
+
+def show_simple_import(importer, key: str, label: str):
+    uploaded = st.file_uploader(label, type=["csv", "json", "jsonl"], key=f"{key}_upload")
+    col1, col2 = st.columns(2)
+    with col1:
+        chunk_size = st.number_input("Rows per transaction", min_value=10, max_value=5000,
+                                     value=CHUNK_SIZE, step=50, key=f"{key}_chunk")
+    with col2:
+        dry_run = st.checkbox("Validate only (dry run)", key=f"{key}_dry_run")
+
+    if uploaded and st.button("🚀 Start Import", type="primary", key=f"{key}_start"):
+        run_upload(importer, uploaded, key, chunk_size=int(chunk_size), dry_run=dry_run)
+
+# ---------------- MAIN PAGE ----------------
+def show_bulk_import_page():
+    st.title("📥 Bulk Import")
+
+    if st.button("⬅ Back to Dashboard"):
+        st.session_state.page = "dashboard"
+        st.rerun()
+
+    st.divider()
+
+    tab1, tab2, tab3 = st.tabs(["📘 Guidebooks", "👥 Property Managers", "🏢 Properties"])
+
+    # TAB 1: Guidebooks with property mappings
+    with tab1:
+        st.caption(
+            "CSV, JSON or JSON Lines with title, guide_text, original_url, optional description and "
+            "property_ids and/or property_addresses (separate several with ';'). "
+            "Chatbot URLs and QR codes are generated for every row."
+        )
+        st.download_button("⬇️ CSV Template", GUIDEBOOK_TEMPLATE, file_name="guidebooks_template.csv",
+                           mime="text/csv", key="guidebook_template")
+
+        show_simple_import(import_guidebooks, "guidebook", "Guidebook file")
+
+    # TAB 2: Property managers
+    with tab2:
+        st.caption(
+            "CSV, JSON or JSON Lines with manager_name, optional contact_address, email, phone and password. "
+            "Rows are validated like the registration form; emails already registered are rejected."
+        )
+        st.download_button("⬇️ CSV Template", MANAGER_TEMPLATE, file_name="managers_template.csv",
+                           mime="text/csv", key="manager_template")
+        show_simple_import(import_managers, "manager", "Property manager file")
+
+    # TAB 3: Properties
+    with tab3:
+        st.caption(
+            "CSV, JSON or JSON Lines with property_address and optionally manager_email or manager_id "
+            "of an active property manager. Addresses already registered are rejected."
+        )
+        st.download_button("⬇️ CSV Template", PROPERTY_TEMPLATE, file_name="properties_template.csv",
+                           mime="text/csv", key="property_template")
+        show_simple_import(import_properties, "property", "Property file")
+
+if __name__ == "__main__":
+    show_bulk_import_page()
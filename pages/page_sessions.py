@@ -1,11 +1,16 @@
+import os
 import streamlit as st
-from db import get_connection
-from datetime import datetime
+from db import get_read_connection
+from chat_archive import archived_before, read_archived_messages
+from transcript_search import search, SOURCE_MESSAGE, SOURCE_UNANSWERED
+from chat_export import export_to_file, read_export
+from llm import completion_cost, CHAT_MODEL
+from datetime import date, datetime, timedelta
 
 # ---------------- DB OPERATIONS ----------------
 def get_all_chat_sessions():
     """Get all chat sessions with guidebook info"""
-    conn = get_connection()
+    conn = get_read_connection()
     with conn.cursor() as cursor:
         sql = """
         SELECT 
@@ -20,24 +25,37 @@ def get_all_chat_sessions():
     conn.close()
     return rows
 
-def get_session_messages(session_id: str):
-    """Get all messages for a specific session"""
-    conn = get_connection()
+def get_session_messages(session_id: str, session_start: datetime = None):
+    """
+    Get all messages for a specific session, including months already moved to
+    the chat archive. Passing session_start lets MySQL prune older partitions.
+    """
+    conn = get_read_connection()
     with conn.cursor() as cursor:
         sql = """
         SELECT *
         FROM chat_messages
         WHERE session_id = %s
-        ORDER BY created_at ASC
         """
-        cursor.execute(sql, (session_id,))
+        params = [session_id]
+        if session_start:
+            sql += " AND created_at >= %s"
+            params.append(session_start)
+        sql += " ORDER BY created_at ASC"
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
     conn.close()
+
+    horizon = archived_before()
+    if horizon and (session_start is None or session_start.date() < horizon):
+        live_ids = {r['id'] for r in rows}
+        archived = [m for m in read_archived_messages(session_id, since=session_start) if m['id'] not in live_ids]
+        rows = archived + list(rows)
     return rows
 
 def get_unanswered_questions():
     """Get all unanswered questions"""
-    conn = get_connection()
+    conn = get_read_connection()
     with conn.cursor() as cursor:
         sql = """
         SELECT 
@@ -54,6 +72,42 @@ def get_unanswered_questions():
     conn.close()
     return rows
 
+# ---------------- SESSION VIEWER ----------------
+def show_session_transcript(session_id: str, session_start: datetime = None, highlight_id: int = None):
+    """Messages of one session; `highlight_id` marks the message a search result points at"""
+    messages = get_session_messages(session_id, session_start)
+    
+    for msg in messages:
+        role_icon = "👤" if msg['role'] == "user" else "🤖"
+        answer_status = ""
+        
+        if msg['role'] == "assistant" and not msg['was_answered']:
+            answer_status = " ⚠️ (Unable to answer)"
+        
+        if highlight_id is not None and msg['id'] == highlight_id:
+            st.markdown(f"**🔎 {role_icon} {msg['role'].title()}{answer_status}**")
+            st.info(msg['content'])
+        else:
+            st.markdown(f"**{role_icon} {msg['role'].title()}{answer_status}**")
+            st.write(msg['content'])
+        
+        token_info = []
+        if msg['input_tokens'] > 0:
+            token_info.append(f"Input: {msg['input_tokens']}")
+        if msg.get('cached_tokens'):
+            token_info.append(f"Cached: {msg['cached_tokens']}")
+        if msg['output_tokens'] > 0:
+            token_info.append(f"Output: {msg['output_tokens']}")
+        
+        if token_info:
+            st.caption(f"🔤 Tokens - {' | '.join(token_info)}")
+        
+        if msg.get('guide_version'):
+            st.caption(f"🕒 {msg['created_at']} · 📘 Guidebook v{msg['guide_version']}")
+        else:
+            st.caption(f"🕒 {msg['created_at']}")
+        st.divider()
+
 # ---------------- MAIN PAGE ----------------
 def show_chat_sessions_page():
     st.title("💬 Chat Sessions & Analytics")
@@ -65,7 +119,9 @@ def show_chat_sessions_page():
     st.divider()
 
     # Tabs for different views
-    tab1, tab2, tab3 = st.tabs(["📋 All Sessions", "❌ Unanswered Questions", "📊 Analytics"])
+    tab1, tab_search, tab2, tab3, tab_export = st.tabs(
+        ["📋 All Sessions", "🔎 Search", "❌ Unanswered Questions", "📊 Analytics", "📤 Export"]
+    )
 
     # TAB 1: All Sessions
     with tab1:
@@ -120,6 +176,8 @@ def show_chat_sessions_page():
                         total_tokens = session['total_input_tokens'] + session['total_output_tokens']
                         st.metric("Total Tokens", total_tokens)
                     
+                    if session['total_cached_tokens']:
+                        st.caption(f"**Cached input tokens:** {session['total_cached_tokens']:,}")
                     st.caption(f"**Session ID:** {session['session_id']}")
                     st.caption(f"**User:** {session['user_identifier']}")
                     st.caption(f"**Started:** {session['session_start']}")
@@ -137,34 +195,16 @@ def show_chat_sessions_page():
                     if st.session_state.get('selected_session') == session['session_id']:
                         st.subheader("💬 Chat History")
                         
-                        messages = get_session_messages(session['session_id'])
-                        
-                        for msg in messages:
-                            role_icon = "👤" if msg['role'] == "user" else "🤖"
-                            answer_status = ""
-                            
-                            if msg['role'] == "assistant" and not msg['was_answered']:
-                                answer_status = " ⚠️ (Unable to answer)"
-                            
-                            st.markdown(f"**{role_icon} {msg['role'].title()}{answer_status}**")
-                            st.write(msg['content'])
-                            
-                            token_info = []
-                            if msg['input_tokens'] > 0:
-                                token_info.append(f"Input: {msg['input_tokens']}")
-                            if msg['output_tokens'] > 0:
-                                token_info.append(f"Output: {msg['output_tokens']}")
-                            
-                            if token_info:
-                                st.caption(f"🔤 Tokens - {' | '.join(token_info)}")
-                            
-                            st.caption(f"🕒 {msg['created_at']}")
-                            st.divider()
+                        show_session_transcript(session['session_id'], session['session_start'])
                         
                         if st.button("Close Chat History", key=f"close_{session['session_id']}"):
                             st.session_state.selected_session = None
                             st.rerun()
 
+    # SEARCH: transcripts and unanswered questions (transcript_search.py)
+    with tab_search:
+        show_transcript_search(sessions)
+
     # TAB 2: Unanswered Questions
     with tab2:
         st.subheader("❌ Unanswered Questions")
@@ -236,6 +276,19 @@ def show_chat_sessions_page():
             with col4:
                 st.metric("Total Tokens", f"{total_tokens:,}")
             
+            # Prompt caching (chatbot.build_messages keeps each guidebook's prompt prefix stable)
+            total_input = sum(s['total_input_tokens'] for s in sessions)
+            total_cached = sum(s['total_cached_tokens'] for s in sessions)
+            total_cost = sum(session_cost(s) for s in sessions)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Prompt Cache Hit Rate", f"{total_cached / total_input:.0%}" if total_input else "–",
+                          help="Share of input tokens the provider served from its prompt cache")
+            with col2:
+                st.metric("Estimated Cost", f"${total_cost:,.4f}")
+            with col3:
+                st.metric("Saved by Caching", f"${sum(session_cost(s, cached=False) for s in sessions) - total_cost:,.4f}")
+            
             st.divider()
             
             # Guidebook stats
@@ -248,11 +301,17 @@ def show_chat_sessions_page():
                     guidebook_stats[title] = {
                         'sessions': 0,
                         'messages': 0,
-                        'tokens': 0
+                        'tokens': 0,
+                        'input': 0,
+                        'cached': 0,
+                        'cost': 0.0
                     }
                 guidebook_stats[title]['sessions'] += 1
                 guidebook_stats[title]['messages'] += s['total_messages']
                 guidebook_stats[title]['tokens'] += s['total_input_tokens'] + s['total_output_tokens']
+                guidebook_stats[title]['input'] += s['total_input_tokens']
+                guidebook_stats[title]['cached'] += s['total_cached_tokens']
+                guidebook_stats[title]['cost'] += session_cost(s)
             
             for guidebook, stats in guidebook_stats.items():
                 with st.expander(f"📖 {guidebook}"):
@@ -263,6 +322,158 @@ def show_chat_sessions_page():
                         st.metric("Messages", stats['messages'])
                     with col3:
                         st.metric("Tokens", f"{stats['tokens']:,}")
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Cache Hit Rate", f"{stats['cached'] / stats['input']:.0%}" if stats['input'] else "–")
+                    with col2:
+                        st.metric("Cost", f"${stats['cost']:,.4f}")
+                    with col3:
+                        st.metric("Cost per Session", f"${stats['cost'] / stats['sessions']:,.4f}")
+
+    # EXPORT: streamed CSV/Parquet files for BI (chat_export.py)
+    with tab_export:
+        show_chat_export(sessions)
+
+def session_cost(session: dict, cached: bool = True) -> float:
+    """Estimated USD cost of a session at the chat model's prices; cached=False ignores the cache discount"""
+    return completion_cost(
+        CHAT_MODEL,
+        session['total_input_tokens'],
+        session['total_output_tokens'],
+        session['total_cached_tokens'] if cached else 0
+    )
+
+def show_chat_export(sessions: list):
+    """Export form; the file is written to disk in chunks and only read back when downloaded"""
+    st.subheader("📤 Export Data")
+    st.caption("For very large ranges use the CLI instead: `python -m chat_export messages --start YYYY-MM-DD`")
+    
+    guidebooks = {s['guidebook_title']: s['guideid'] for s in sessions}
+    datasets = {"Messages": "messages", "Sessions": "sessions", "Unanswered questions": "unanswered"}
+    
+    with st.form("chat_export_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            dataset = st.selectbox("Data", list(datasets))
+            guidebook_title = st.selectbox("Guidebook", ["All"] + sorted(guidebooks))
+        with col2:
+            date_range = st.date_input("Date range", value=(date.today() - timedelta(days=30), date.today()))
+            fmt = st.radio("Format", ["CSV (gzip)", "Parquet"], horizontal=True)
+        
+        submitted = st.form_submit_button("📤 Prepare Export", type="primary")
+    
+    if submitted:
+        if not date_range:
+            st.warning("Choose a date range")
+        else:
+            start = date_range[0]
+            end = date_range[1] if len(date_range) > 1 else start
+            with st.spinner("Exporting..."):
+                try:
+                    st.session_state.chat_export = export_to_file(
+                        datasets[dataset], start, end,
+                        "parquet" if fmt == "Parquet" else "csv",
+                        guidebooks.get(guidebook_title)
+                    )
+                except Exception as e:
+                    st.session_state.chat_export = None
+                    st.error(f"Export failed: {e}")
+    
+    result = st.session_state.get('chat_export')
+    if not result:
+        return
+    if not os.path.exists(result['path']):
+        st.session_state.chat_export = None
+        st.info("That export has expired, prepare it again")
+        return
+    
+    st.success(f"{result['rows']:,} rows · {result['bytes'] / 1024:,.0f} KiB · {result['seconds']:.1f}s")
+    # A callable is only run when the button is clicked, so reruns don't read the file
+    st.download_button(
+        f"⬇️ Download {result['filename']}",
+        data=lambda: read_export(result['path']),
+        file_name=result['filename'],
+        mime="application/vnd.apache.parquet" if result['filename'].endswith(".parquet") else "application/gzip",
+        on_click="ignore"
+    )
+
+def show_transcript_search(sessions: list):
+    """Search form, ranked results and the session viewer a result opens"""
+    st.subheader("🔎 Search Conversations")
+    
+    guidebooks = {s['guidebook_title']: s['guideid'] for s in sessions}
+    
+    with st.form("transcript_search_form"):
+        query = st.text_input("Search messages and unanswered questions",
+                              placeholder="e.g. wifi password, parking, late checkout")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            guidebook_title = st.selectbox("Guidebook", ["All"] + sorted(guidebooks))
+        with col2:
+            date_range = st.date_input("Date range", value=(), help="Leave empty to search all dates")
+        with col3:
+            scope = st.selectbox("Search in", ["Messages & unanswered questions", "Messages", "Unanswered questions"])
+        
+        submitted = st.form_submit_button("🔎 Search", type="primary")
+    
+    if submitted:
+        st.session_state.search_open = None
+        st.session_state.search_request = {
+            'query': query,
+            'guideid': guidebooks.get(guidebook_title),
+            'start': date_range[0] if len(date_range) > 0 else None,
+            'end': date_range[1] if len(date_range) > 1 else (date_range[0] if date_range else None),
+            'sources': {
+                "Messages": (SOURCE_MESSAGE,),
+                "Unanswered questions": (SOURCE_UNANSWERED,),
+            }.get(scope, (SOURCE_MESSAGE, SOURCE_UNANSWERED)),
+        }
+    
+    request = st.session_state.get('search_request')
+    if not request or not request['query'].strip():
+        st.caption("Words are matched whole and case-insensitively; results containing more of them rank first.")
+        return
+    
+    found = search(**request)
+    if not found['terms']:
+        st.warning("Enter at least one word to search for")
+        return
+    if not found['results']:
+        st.info("No matching messages")
+        return
+    
+    st.caption(f"{found['matched']} matching documents, showing the top {len(found['results'])}"
+               + (" (searched the newest matches of very common words only)" if found['truncated'] else ""))
+    
+    for result in found['results']:
+        if result['source'] == SOURCE_UNANSWERED:
+            label = "❓ Unanswered question"
+        else:
+            label = "👤 User" if result['role'] == "user" else "🤖 Assistant"
+        
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.markdown(f"**{label}** · {result['guidebook_title']} · {result['created_at']}")
+            st.markdown(result['snippet'])
+        with col2:
+            if st.button("Open session", key=f"open_{result['source']}_{result['doc_id']}"):
+                st.session_state.search_open = result
+        
+        # Deep link: the whole conversation with the matching message highlighted
+        opened = st.session_state.get('search_open')
+        if opened and (opened['source'], opened['doc_id']) == (result['source'], result['doc_id']):
+            with st.container(border=True):
+                st.caption(f"**Session ID:** {result['session_id']}")
+                show_session_transcript(
+                    result['session_id'],
+                    result['session_start'],
+                    highlight_id=result['doc_id'] if result['source'] == SOURCE_MESSAGE else None
+                )
+                if st.button("Close Session", key=f"close_search_{result['source']}_{result['doc_id']}"):
+                    st.session_state.search_open = None
+                    st.rerun()
+        st.divider()
 
 if __name__ == "__main__":
     show_chat_sessions_page()
@@ -3,6 +3,7 @@ import uuid
 import re
 from datetime import datetime
 from db import get_connection
+from ref_cache import reference_data, invalidate
 import hashlib
 
 # ---------------- PASSWORD HASHING ----------------
@@ -11,25 +12,30 @@ def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 # ---------------- VALIDATION ----------------
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_SEPARATORS = re.compile(r'[\s\-\(\)]')
+UPPERCASE = re.compile(r'[A-Z]')
+LOWERCASE = re.compile(r'[a-z]')
+DIGIT = re.compile(r'[0-9]')
+
 def validate_email(email: str) -> bool:
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_phone(phone: str) -> bool:
     """Validate phone number"""
-    cleaned = re.sub(r'[\s\-\(\)]', '', phone)
+    cleaned = PHONE_SEPARATORS.sub('', phone)
     return cleaned.isdigit() and 10 <= len(cleaned) <= 15
 
 def validate_password(password: str) -> tuple[bool, str]:
     """Validate password strength"""
     if len(password) < 8:
         return False, "Password must be at least 8 characters long"
-    if not re.search(r'[A-Z]', password):
+    if not UPPERCASE.search(password):
         return False, "Password must contain at least one uppercase letter"
-    if not re.search(r'[a-z]', password):
+    if not LOWERCASE.search(password):
         return False, "Password must contain at least one lowercase letter"
-    if not re.search(r'[0-9]', password):
+    if not DIGIT.search(password):
         return False, "Password must contain at least one number"
     return True, "Password is valid"
 
@@ -69,8 +75,10 @@ def insert_property_manager(name: str, address: str, email: str, phone: str, pas
         ))
     conn.commit()
     conn.close()
+    invalidate("property_manager")
     return manager_id
 
+@reference_data("property_manager")
 def get_all_property_managers():
     """Get all property managers"""
     conn = get_connection()
@@ -96,6 +104,7 @@ def update_property_manager(manager_id: str, name: str, address: str, phone: str
         cursor.execute(sql, (name, address, phone, manager_id))
     conn.commit()
     conn.close()
+    invalidate("property_manager")
 
 def update_manager_password(manager_id: str, new_password: str):
     """Update property manager password"""
@@ -108,6 +117,7 @@ def update_manager_password(manager_id: str, new_password: str):
         )
     conn.commit()
     conn.close()
+    invalidate("property_manager")
 
 def toggle_manager_status(manager_id: str, is_active: bool):
     """Activate or deactivate property manager"""
@@ -119,6 +129,7 @@ def toggle_manager_status(manager_id: str, is_active: bool):
         )
     conn.commit()
     conn.close()
+    invalidate("property_manager")
 
 # ---------------- PAGE UI ----------------
 def show_property_manager_page():
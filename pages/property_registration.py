@@ -1,9 +1,15 @@
 import streamlit as st
+import re
 import uuid
 from datetime import datetime
-from db import get_connection
+from db import get_connection, get_read_connection
+from ref_cache import reference_data, invalidate
+
+PROPERTY_PAGE_SIZE = 25
+FT_MIN_TOKEN_SIZE = 3  # innodb_ft_min_token_size: shorter words are not in the FULLTEXT index
 
 # ---------------- DB OPS ----------------
+@reference_data("property_manager")
 def get_all_property_managers():
     """Get all active property managers"""
     conn = get_connection()
@@ -15,35 +21,101 @@ def get_all_property_managers():
     conn.close()
     return rows
 
-def get_properties():
-    """Get properties based on user type"""
-    conn = get_connection()
-    with conn.cursor() as cursor:
-        if st.session_state.get('user_type') == "property_manager":
-            # Property manager sees only their properties
-            cursor.execute(
-                """
-                SELECT p.*, pm.manager_name 
-                FROM property_registration p
-                LEFT JOIN property_manager pm ON p.manager_id = pm.manager_id
-                WHERE p.manager_id = %s 
-                ORDER BY p.created_date DESC
-                """,
-                (st.session_state.user_id,)
-            )
+def _property_filters(search: str = "") -> tuple[list[str], list]:
+    """
+    WHERE conditions for the signed-in user's properties matching `search`.
+    Words long enough for the FULLTEXT index (m0004) become `+word*` prefix
+    terms; shorter tokens (house numbers, "St") are matched with LIKE on the
+    rows the FULLTEXT search returns. A search of only short tokens falls back
+    to an indexed "address starts with" match.
+    """
+    conditions, args = [], []
+    if st.session_state.get('user_type') == "property_manager":
+        # Property manager sees only their properties
+        conditions.append("p.manager_id = %s")
+        args.append(st.session_state.user_id)
+
+    search = search.strip()
+    if search:
+        words = re.findall(r"\w+", search)
+        long_words = [w for w in words if len(w) >= FT_MIN_TOKEN_SIZE]
+        if long_words:
+            conditions.append("MATCH(p.property_address) AGAINST (%s IN BOOLEAN MODE)")
+            args.append(" ".join(f"+{w}*" for w in long_words))
+            for w in words:
+                if len(w) < FT_MIN_TOKEN_SIZE:
+                    conditions.append("p.property_address LIKE %s")
+                    args.append(f"%{_escape_like(w)}%")
         else:
-            # Admin sees all properties
-            cursor.execute(
-                """
-                SELECT p.*, pm.manager_name 
-                FROM property_registration p
-                LEFT JOIN property_manager pm ON p.manager_id = pm.manager_id
-                ORDER BY p.created_date DESC
-                """
-            )
+            conditions.append("p.property_address LIKE %s")
+            args.append(f"{_escape_like(search)}%")
+    return conditions, args
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def get_properties(search: str = "", after: tuple = None, limit: int = PROPERTY_PAGE_SIZE):
+    """
+    One page of the list view, newest first, with only the columns it shows.
+    `after` is the (created_date, propId) cursor returned for the previous
+    page. Returns (rows, cursor of the next page or None).
+    """
+    conditions, args = _property_filters(search)
+    if after:
+        conditions.append("(p.created_date < %s OR (p.created_date = %s AND p.propId < %s))")
+        args += [after[0], after[0], after[1]]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = get_read_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT p.propId, p.property_address, p.created_date, p.manager_id, pm.manager_name
+            FROM property_registration p
+            LEFT JOIN property_manager pm ON p.manager_id = pm.manager_id
+            {where}
+            ORDER BY p.created_date DESC, p.propId DESC
+            LIMIT %s
+            """,
+            args + [limit + 1]
+        )
         rows = cursor.fetchall()
     conn.close()
-    return rows
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]['created_date'], rows[-1]['propId'])
+
+def count_properties(search: str = "") -> int:
+    conditions, args = _property_filters(search)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = get_read_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) AS n FROM property_registration p {where}", args)
+        total = cursor.fetchone()['n']
+    conn.close()
+    return total
+
+def get_property(prop_id: str):
+    """Full row of one property for the edit form, within the user's scope"""
+    conditions, args = _property_filters()
+    conditions.append("p.propId = %s")
+    args.append(prop_id)
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT p.*, pm.manager_name
+            FROM property_registration p
+            LEFT JOIN property_manager pm ON p.manager_id = pm.manager_id
+            WHERE {' AND '.join(conditions)}
+            """,
+            args
+        )
+        row = cursor.fetchone()
+    conn.close()
+    return row
 
 def insert_property(address, user, manager_id=None):
     """Create new property"""
@@ -59,6 +131,7 @@ def insert_property(address, user, manager_id=None):
         )
     conn.commit()
     conn.close()
+    invalidate("property_registration")
 
 def update_property(prop_id, address, user, manager_id=None):
     """Update property"""
@@ -77,6 +150,7 @@ def update_property(prop_id, address, user, manager_id=None):
         )
     conn.commit()
     conn.close()
+    invalidate("property_registration")
 
 # ---------------- PAGE UI ----------------
 def show_property_page():
@@ -140,104 +214,155 @@ def show_property_page():
     # EXISTING PROPERTIES
     st.subheader("🏘️ Existing Properties")
 
-    properties = get_properties()
+    search = st.text_input("🔍 Search by address", key="property_search",
+                           placeholder="e.g. 12 Ocean Drive")
+
+    # Keyset pagination: property_cursors[i] is where page i starts; a new search restarts at page 1
+    if st.session_state.get('property_search_applied') != search:
+        st.session_state.property_search_applied = search
+        st.session_state.property_cursors = [None]
+    cursors = st.session_state.property_cursors
+    page = len(cursors) - 1
+
+    properties, next_cursor = get_properties(search, cursors[-1])
 
     if not properties:
-        if st.session_state.get('user_type') == "property_manager":
+        if search.strip():
+            st.info("🔍 No properties match your search")
+        elif st.session_state.get('user_type') == "property_manager":
             st.info("📭 No properties assigned to you yet")
         else:
             st.info("📭 No properties registered yet")
     else:
         # Show count
-        st.caption(f"Total Properties: {len(properties)}")
-        
+        first = page * PROPERTY_PAGE_SIZE + 1
+        st.caption(f"Showing {first}-{first + len(properties) - 1} of {count_properties(search)} properties")
+
         for prop in properties:
             # Property title with manager info
             manager_info = ""
             if prop.get('manager_name'):
                 manager_info = f" | 👤 {prop['manager_name']}"
-            
-            with st.expander(f"📍 {prop['property_address'][:50]}...{manager_info}"):
-                # Property details
-                new_addr = st.text_area(
-                    "Property Address",
-                    prop["property_address"],
-                    height=100,
-                    key=f"addr_{prop['propId']}"
-                )
 
-                # Manager assignment (Admin only)
-                if st.session_state.get('user_type') == "admin":
-                    st.divider()
-                    st.subheader("👤 Property Manager")
-                    
-                    managers = get_all_property_managers()
-                    
-                    if managers:
-                        # Get current manager
-                        current_manager = None
-                        if prop.get('manager_id'):
-                            for m in managers:
-                                if m['manager_id'] == prop['manager_id']:
-                                    current_manager = f"{m['manager_name']} ({m['email']})"
-                                    break
-                        
-                        manager_options = {"-- None --": None}
-                        manager_options.update({
-                            f"{m['manager_name']} ({m['email']})": m['manager_id'] 
-                            for m in managers
-                        })
-                        
-                        # Set default to current manager or None
-                        default_index = 0
-                        if current_manager and current_manager in manager_options:
-                            default_index = list(manager_options.keys()).index(current_manager)
-                        
-                        selected_manager = st.selectbox(
-                            "Assign to Property Manager",
-                            options=list(manager_options.keys()),
-                            index=default_index,
-                            key=f"manager_{prop['propId']}"
-                        )
-                        
-                        new_manager_id = manager_options[selected_manager]
-                    else:
-                        st.warning("No property managers available")
-                        new_manager_id = None
-                else:
-                    # Property manager cannot change assignment
-                    new_manager_id = prop.get('manager_id')
-                    if prop.get('manager_name'):
-                        st.info(f"👤 Managed by: **{prop['manager_name']}**")
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                address = " ".join(prop['property_address'].split())
+                st.markdown(f"📍 {address[:80]}{'...' if len(address) > 80 else ''}{manager_info}")
+            with col2:
+                if st.button("✏️ Edit", key=f"edit_{prop['propId']}"):
+                    st.session_state.edit_property_id = prop['propId']
 
-                st.divider()
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬅ Previous", disabled=page == 0):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            st.caption(f"Page {page + 1}")
+        with col3:
+            if st.button("Next ➡", disabled=next_cursor is None):
+                cursors.append(next_cursor)
+                st.rerun()
 
-                # Metadata
-                col1, col2 = st.columns(2)
+    # Only the selected property gets edit widgets (and its full row and the manager list)
+    if st.session_state.get('edit_property_id'):
+        st.divider()
+        show_property_editor(st.session_state.edit_property_id)
+
+def show_property_editor(prop_id: str):
+    prop = get_property(prop_id)
+    if prop is None:
+        st.session_state.edit_property_id = None
+        st.warning("This property no longer exists or is not assigned to you")
+        return
+
+    with st.expander(f"✏️ Editing: {prop['property_address'][:50]}...", expanded=True):
+        # Property details
+        new_addr = st.text_area(
+            "Property Address",
+            prop["property_address"],
+            height=100,
+            key=f"addr_{prop['propId']}"
+        )
+
+        # Manager assignment (Admin only)
+        if st.session_state.get('user_type') == "admin":
+            st.divider()
+            st.subheader("👤 Property Manager")
+            
+            managers = get_all_property_managers()
+            
+            if managers:
+                # Get current manager
+                current_manager = None
+                if prop.get('manager_id'):
+                    for m in managers:
+                        if m['manager_id'] == prop['manager_id']:
+                            current_manager = f"{m['manager_name']} ({m['email']})"
+                            break
+                
+                manager_options = {"-- None --": None}
+                manager_options.update({
+                    f"{m['manager_name']} ({m['email']})": m['manager_id'] 
+                    for m in managers
+                })
+                
+                # Set default to current manager or None
+                default_index = 0
+                if current_manager and current_manager in manager_options:
+                    default_index = list(manager_options.keys()).index(current_manager)
                 
-                with col1:
-                    st.caption(f"🆔 ID: {prop['propId']}")
-                    st.caption(f"📅 Created: {prop['created_date']}")
-                    st.caption(f"👤 Created By: {prop['created_by']}")
+                selected_manager = st.selectbox(
+                    "Assign to Property Manager",
+                    options=list(manager_options.keys()),
+                    index=default_index,
+                    key=f"manager_{prop['propId']}"
+                )
                 
-                with col2:
-                    if prop.get('modified_date'):
-                        st.caption(f"📝 Modified: {prop['modified_date']}")
-                        st.caption(f"👤 Modified By: {prop.get('modified_by', 'N/A')}")
-
-                # Update button
-                if st.button("💾 Update Property", key=f"upd_{prop['propId']}", type="primary"):
-                    if not new_addr.strip():
-                        st.error("Property address cannot be empty")
-                    else:
-                        update_property(
-                            prop["propId"],
-                            new_addr,
-                            st.session_state.username,
-                            new_manager_id
-                        )
-                        st.success("✅ Property updated successfully!")
-                        st.rerun()
+                new_manager_id = manager_options[selected_manager]
+            else:
+                st.warning("No property managers available")
+                new_manager_id = None
+        else:
+            # Property manager cannot change assignment
+            new_manager_id = prop.get('manager_id')
+            if prop.get('manager_name'):
+                st.info(f"👤 Managed by: **{prop['manager_name']}**")
+
+        st.divider()
+
+        # Metadata
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.caption(f"🆔 ID: {prop['propId']}")
+            st.caption(f"📅 Created: {prop['created_date']}")
+            st.caption(f"👤 Created By: {prop['created_by']}")
+        
+        with col2:
+            if prop.get('modified_date'):
+                st.caption(f"📝 Modified: {prop['modified_date']}")
+                st.caption(f"👤 Modified By: {prop.get('modified_by', 'N/A')}")
+
+        # Update button
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("💾 Update Property", key=f"upd_{prop['propId']}", type="primary"):
+                if not new_addr.strip():
+                    st.error("Property address cannot be empty")
+                else:
+                    update_property(
+                        prop["propId"],
+                        new_addr,
+                        st.session_state.username,
+                        new_manager_id
+                    )
+                    st.success("✅ Property updated successfully!")
+                    st.rerun()
+        with col2:
+            if st.button("✖ Close", key=f"close_{prop['propId']}"):
+                st.session_state.edit_property_id = None
+                st.rerun()
 
 if __name__ == "__main__":
     show_property_page()
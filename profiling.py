@@ -0,0 +1,201 @@
+import contextlib
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import deque
+import streamlit as st
+
+# ---------------- SETTINGS ----------------
+# Opt-in per-rerun profiling: PROFILING = true in secrets or APP_PROFILING=1.
+# Every page render gets a trace that DB statements (db.py) and LLM calls
+# (llm.py) add spans to. With PROFILE_DUMP_DIR set, reruns also run under
+# cProfile and the slowest PROFILE_KEEP_SLOWEST are kept there as .prof files
+# (open with `python -m pstats` or snakeviz).
+PROFILING = bool(st.secrets.get("PROFILING", False)) or os.environ.get("APP_PROFILING") == "1"
+PROFILE_DUMP_DIR = os.environ.get("APP_PROFILE_DIR") or st.secrets.get("PROFILE_DUMP_DIR", "")
+PROFILE_KEEP_SLOWEST = int(st.secrets.get("PROFILE_KEEP_SLOWEST", 10))
+BREAKDOWN_KINDS = ("db", "llm")
+
+_current = contextvars.ContextVar("profile_trace", default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=500)   # finished rerun summaries, newest last
+_dumps = []                   # (total_ms, path) of the kept cProfile dumps
+
+class Trace:
+    """Spans of one rerun. Async turns and to_thread workers inherit it through the context."""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.spans = {}   # (kind, label) -> [count, ms]
+        self.dump = None
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, label: str, ms: float):
+        with self._lock:
+            span = self.spans.get((kind, label))
+            if span is None:
+                span = self.spans[(kind, label)] = [0, 0.0]
+            span[0] += 1
+            span[1] += ms
+
+    def summary(self) -> dict:
+        with self._lock:
+            spans = sorted(
+                ({'kind': kind, 'label': label, 'count': count, 'ms': round(ms, 2)}
+                 for (kind, label), (count, ms) in self.spans.items()),
+                key=lambda s: s['ms'], reverse=True
+            )
+        totals = {kind: sum(s['ms'] for s in spans if s['kind'] == kind) for kind in BREAKDOWN_KINDS}
+        # Async turns overlap DB writes with the model call; render time can't go negative
+        render_ms = max(0.0, self.total_ms - sum(totals.values()))
+        return {
+            'at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'page': self.page,
+            'total_ms': round(self.total_ms, 2),
+            'db_ms': round(totals['db'], 2),
+            'llm_ms': round(totals['llm'], 2),
+            'render_ms': round(render_ms, 2),
+            'queries': sum(s['count'] for s in spans if s['kind'] == "db"),
+            'spans': spans,
+            'dump': self.dump,
+        }
+
+def record(kind: str, label: str, ms: float):
+    """Add a finished span to the current rerun's trace, if one is being profiled"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(kind, label, ms)
+
+@contextlib.contextmanager
+def span(kind: str, label: str):
+    """Time the block as a `kind` span (db, llm, ...) of the current rerun"""
+    if _current.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, label, (time.perf_counter() - started) * 1000)
+
+@contextlib.contextmanager
+def rerun(page: str):
+    """
+    Profile one page render. st.rerun()/st.stop() inside the page end the
+    trace too; the summary is kept for the overlay and the DB Stats page.
+    Nested inside another render (a fragment during a full rerun) it adds
+    nothing, so fragment reruns are profiled and full reruns aren't split.
+    """
+    if not PROFILING or _current.get() is not None:
+        yield
+        return
+    trace = Trace(page)
+    token = _current.set(trace)
+    profiler = _start_profiler()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _current.reset(token)
+        trace.total_ms = (time.perf_counter() - trace.started) * 1000
+        if profiler is not None:
+            trace.dump = _keep_dump(profiler, trace)
+        summary = trace.summary()
+        with _lock:
+            _recent.append(summary)
+        try:
+            st.session_state["_profile_last"] = summary
+        except Exception:
+            pass
+
+def _start_profiler():
+    if not PROFILE_DUMP_DIR:
+        return None
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None  # another profiler is already active on this thread
+    return profiler
+
+def _keep_dump(profiler, trace: Trace):
+    """Write the profile if this rerun is among the slowest kept; returns its path or None"""
+    with _lock:
+        if len(_dumps) >= PROFILE_KEEP_SLOWEST and trace.total_ms <= _dumps[0][0]:
+            return None
+    os.makedirs(PROFILE_DUMP_DIR, exist_ok=True)
+    page = re.sub(r"[^A-Za-z0-9_-]", "_", trace.page)
+    path = os.path.join(PROFILE_DUMP_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{page}-{trace.total_ms:.0f}ms.prof")
+    profiler.dump_stats(path)
+    with _lock:
+        _dumps.append((trace.total_ms, path))
+        _dumps.sort()
+        evicted = _dumps[:-PROFILE_KEEP_SLOWEST] if PROFILE_KEEP_SLOWEST > 0 else list(_dumps)
+        del _dumps[:len(evicted)]
+    for _, old in evicted:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return None if (trace.total_ms, path) in evicted else path
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def get_profile_stats(slowest: int = 20) -> dict:
+    """Per-page percentiles of the recent reruns, plus the slowest reruns"""
+    with _lock:
+        recent = list(_recent)
+    pages = {}
+    for summary in recent:
+        pages.setdefault(summary['page'], []).append(summary)
+    return {
+        'pages': {
+            page: {
+                'reruns': len(rows),
+                'total_p50': _percentile([r['total_ms'] for r in rows], 0.50),
+                'total_p95': _percentile([r['total_ms'] for r in rows], 0.95),
+                'db_p95': _percentile([r['db_ms'] for r in rows], 0.95),
+                'llm_p95': _percentile([r['llm_ms'] for r in rows], 0.95),
+                'render_p95': _percentile([r['render_ms'] for r in rows], 0.95),
+            }
+            for page, rows in pages.items()
+        },
+        'slowest': sorted(recent, key=lambda r: r['total_ms'], reverse=True)[:slowest],
+    }
+
+def reset_profile_stats():
+    with _lock:
+        _recent.clear()
+
+# ---------------- OVERLAY ----------------
+def show_overlay():
+    """Breakdown of this session's latest page render, in the sidebar (admins only)"""
+    if not PROFILING or st.session_state.get('user_type') != "admin":
+        return
+    summary = st.session_state.get("_profile_last")
+    if not summary:
+        return
+    with st.sidebar.expander(f"⏱️ Last render: {summary['total_ms']:.0f} ms", expanded=False):
+        st.caption(f"{summary['page']} at {summary['at']}")
+        st.markdown(
+            f"**DB** {summary['db_ms']:.0f} ms ({summary['queries']} queries)  \n"
+            f"**LLM** {summary['llm_ms']:.0f} ms  \n"
+            f"**Render** {summary['render_ms']:.0f} ms"
+        )
+        if summary['spans']:
+            st.dataframe([
+                {"Kind": s['kind'], "Span": s['label'], "Calls": s['count'], "ms": s['ms']}
+                for s in summary['spans'][:15]
+            ], use_container_width=True, hide_index=True)
+        if summary['dump']:
+            st.caption(f"cProfile: {summary['dump']}")
@@ -0,0 +1,15 @@
+import base64
+from io import BytesIO
+
+# Kept free of Streamlit/DB imports so process-pool workers start quickly; qrcode
+# (and PIL behind it) loads on the first QR, not when an admin page imports this
+def generate_qr_base64(url: str) -> str:
+    import qrcode
+    qr = qrcode.make(url)
+    buffer = BytesIO()
+    qr.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+def generate_qr_batch(urls: list[str]) -> list[str]:
+    """One process-pool task per batch keeps pickling/IPC overhead per QR small"""
+    return [generate_qr_base64(url) for url in urls]
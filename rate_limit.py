@@ -0,0 +1,168 @@
+import threading
+import time
+from datetime import date
+import streamlit as st
+from db import get_connection
+
+# ---------------- SETTINGS ----------------
+# Rates are messages per minute; burst is the bucket capacity.
+# A daily budget of 0 disables the per-guidebook token budget.
+SESSION_RATE = float(st.secrets.get("RATE_LIMIT_SESSION_PER_MIN", 10))
+SESSION_BURST = float(st.secrets.get("RATE_LIMIT_SESSION_BURST", 5))
+IP_RATE = float(st.secrets.get("RATE_LIMIT_IP_PER_MIN", 30))
+IP_BURST = float(st.secrets.get("RATE_LIMIT_IP_BURST", 15))
+GUIDEBOOK_RATE = float(st.secrets.get("RATE_LIMIT_GUIDEBOOK_PER_MIN", 120))
+GUIDEBOOK_BURST = float(st.secrets.get("RATE_LIMIT_GUIDEBOOK_BURST", 60))
+GUIDEBOOK_DAILY_TOKENS = int(st.secrets.get("GUIDEBOOK_DAILY_TOKEN_BUDGET", 0))
+# Reverse proxies in front of the app that append to X-Forwarded-For. Hops
+# left of theirs are written by the client and never trusted; 0 uses the
+# peer address of the connection.
+TRUSTED_PROXY_HOPS = int(st.secrets.get("TRUSTED_PROXY_HOPS", 0))
+
+# How long a guidebook's usage counter is trusted before it is re-read from
+# chat_sessions (picks up usage recorded by other app replicas).
+BUDGET_REFRESH_SECONDS = 300
+IDLE_BUCKET_SECONDS = 3600
+
+_lock = threading.Lock()
+_buckets = {}
+_usage = {}
+_takes_since_prune = 0
+
+# ---------------- CLIENT ADDRESS ----------------
+def client_ip(forwarded_for: str, peer: str) -> str:
+    """
+    Address the per-IP limit applies to: the hop our trusted proxies recorded
+    for the client (TRUSTED_PROXY_HOPS from the right of X-Forwarded-For),
+    else the connection's peer address.
+    """
+    if TRUSTED_PROXY_HOPS and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return peer or "unknown"
+
+# ---------------- TOKEN BUCKET ----------------
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self) -> float:
+        """Seconds until one token is available"""
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+def _bucket(scope: str, key: str, per_minute: float, burst: float, now: float) -> TokenBucket:
+    bucket = _buckets.get((scope, key))
+    if bucket is None:
+        bucket = TokenBucket(per_minute / 60.0, max(burst, 1))
+        bucket.updated = now
+        _buckets[(scope, key)] = bucket
+    else:
+        bucket.refill(now)
+    return bucket
+
+def _prune(now: float):
+    """Drop buckets that have been idle long enough to be full again"""
+    idle = [k for k, b in _buckets.items() if now - b.updated > IDLE_BUCKET_SECONDS]
+    for k in idle:
+        del _buckets[k]
+    today = date.today()
+    for k in [k for k in _usage if k[1] != today]:
+        del _usage[k]
+
+# ---------------- DAILY TOKEN BUDGET ----------------
+def _load_guidebook_tokens_today(guideid: str) -> int:
+    """Sum today's token counters for a guidebook from chat_sessions"""
+    conn = get_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COALESCE(SUM(total_input_tokens + total_output_tokens), 0) AS used
+            FROM chat_sessions
+            WHERE guideid = %s AND session_start >= CURDATE()
+            """,
+            (guideid,)
+        )
+        row = cursor.fetchone()
+    conn.close()
+    return int(row['used']) if row else 0
+
+def _guidebook_usage(guideid: str, now: float) -> dict:
+    """Return the cached usage counter, seeding it from the DB on a miss or after expiry"""
+    key = (guideid, date.today())
+    entry = _usage.get(key)
+    if entry is None or now - entry['loaded_at'] > BUDGET_REFRESH_SECONDS:
+        try:
+            used = _load_guidebook_tokens_today(guideid)
+        except Exception as e:
+            print(f"Error loading token usage: {e}")
+            used = entry['used'] if entry else 0
+        entry = {'used': used, 'loaded_at': now}
+        _usage[key] = entry
+    return entry
+
+# ---------------- PUBLIC API ----------------
+def check_chat_allowed(session_id: str, client_ip: str, guideid: str) -> tuple[bool, str]:
+    """
+    Take one message from the session, IP and guidebook buckets.
+    Returns: (allowed: bool, message to show the guest when not allowed)
+    """
+    global _takes_since_prune
+    now = time.monotonic()
+
+    if GUIDEBOOK_DAILY_TOKENS > 0:
+        # The DB seed happens outside the lock; concurrent misses just both seed.
+        usage = _guidebook_usage(guideid, now)
+        if usage['used'] >= GUIDEBOOK_DAILY_TOKENS:
+            return False, "This guidebook's assistant has reached its daily limit. Please try again tomorrow or contact the property manager directly."
+
+    with _lock:
+        _takes_since_prune += 1
+        if _takes_since_prune >= 1000:
+            _prune(now)
+            _takes_since_prune = 0
+
+        buckets = [
+            _bucket("session", session_id, SESSION_RATE, SESSION_BURST, now),
+            _bucket("ip", client_ip or "unknown", IP_RATE, IP_BURST, now),
+            _bucket("guidebook", guideid, GUIDEBOOK_RATE, GUIDEBOOK_BURST, now),
+        ]
+        # All-or-nothing: only spend tokens when every bucket has one
+        wait = max(b.retry_after() for b in buckets)
+        if wait > 0:
+            return False, f"You're sending messages too quickly. Please wait about {int(wait) + 1} seconds and try again."
+        for b in buckets:
+            b.tokens -= 1
+
+    return True, ""
+
+def record_token_usage(guideid: str, tokens: int):
+    """Add tokens spent by a completed turn to the in-memory daily counter"""
+    if GUIDEBOOK_DAILY_TOKENS <= 0:
+        return
+    with _lock:
+        entry = _usage.get((guideid, date.today()))
+        if entry is not None:
+            entry['used'] += tokens
+
+def get_limiter_stats() -> dict:
+    """Snapshot of limiter state for ops pages"""
+    with _lock:
+        scopes = {}
+        for scope, _ in _buckets:
+            scopes[scope] = scopes.get(scope, 0) + 1
+        return {
+            'buckets': scopes,
+            'guidebook_usage': {k[0]: v['used'] for k, v in _usage.items() if k[1] == date.today()},
+        }
@@ -0,0 +1,91 @@
+import functools
+import threading
+import time
+import streamlit as st
+import metrics
+
+# ---------------- SETTINGS ----------------
+# Reference lists (managers, properties, guidebooks) feed selectboxes on every
+# rerun. They are cached per process for a short TTL and dropped explicitly by
+# the helpers that change them; other app processes see changes within the TTL.
+REF_CACHE_TTL_SECONDS = float(st.secrets.get("REF_CACHE_TTL_SECONDS", 30))
+
+_lock = threading.Lock()
+_entries = {}   # (label, args) -> (expires_at, tables, value)
+_stats = {}     # label -> counters
+_generation = 0  # bumped by invalidate(); a load that raced an invalidation isn't stored
+
+def _counters(label: str) -> dict:
+    stats = _stats.get(label)
+    if stats is None:
+        stats = _stats[label] = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    return stats
+
+def reference_data(*tables: str, ttl: float = None):
+    """
+    Cache a reference-list getter's result per arguments, shared by every
+    user: getters must not filter by who is signed in, and should read the
+    primary so a reload right after invalidate() can't cache replica lag.
+    `tables` are the tables it reads; invalidate(table) drops the entry.
+    Callers get a shallow copy, so the cached list itself is never mutated.
+    """
+    def decorate(fn):
+        label = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = (label, args)
+            now = time.monotonic()
+            with _lock:
+                entry = _entries.get(key)
+                if entry is not None and entry[0] > now:
+                    _counters(label)['hits'] += 1
+                    return list(entry[2])
+                _counters(label)['misses'] += 1
+                generation = _generation
+            value = fn(*args)
+            with _lock:
+                if generation == _generation:
+                    _entries[key] = (now + (ttl or REF_CACHE_TTL_SECONDS), frozenset(tables), value)
+            return list(value)
+        return wrapper
+    return decorate
+
+def invalidate(*tables: str):
+    """Drop every cached list that reads any of `tables`"""
+    global _generation
+    with _lock:
+        _generation += 1
+        for key in [k for k, entry in _entries.items() if entry[1].intersection(tables)]:
+            del _entries[key]
+            _counters(key[0])['invalidations'] += 1
+
+def clear_reference_cache():
+    with _lock:
+        _entries.clear()
+        _stats.clear()
+
+def get_reference_cache_stats() -> dict:
+    """Per-getter hits, misses, invalidations, hit rate and live entries"""
+    with _lock:
+        live = {}
+        for label, _ in _entries:
+            live[label] = live.get(label, 0) + 1
+        stats = {label: dict(c) for label, c in _stats.items()}
+    for label, c in stats.items():
+        lookups = c['hits'] + c['misses']
+        c['hit_rate'] = c['hits'] / lookups if lookups else 0.0
+        c['entries'] = live.get(label, 0)
+    return stats
+
+def _collect_cache_metrics():
+    stats = get_reference_cache_stats()
+    return [
+        ("ref_cache_lookups_total", "counter", "Reference-list lookups by result",
+         [({'list': label, 'result': result}, c[key]) for label, c in sorted(stats.items())
+          for result, key in (("hit", 'hits'), ("miss", 'misses'))]),
+        ("ref_cache_invalidations_total", "counter", "Cached reference lists dropped because their tables changed",
+         [({'list': label}, c['invalidations']) for label, c in sorted(stats.items())]),
+    ]
+
+metrics.register_collector(_collect_cache_metrics)
@@ -0,0 +1,63 @@
+import sys
+import threading
+import time
+import metrics
+
+# ---------------- TRANSCRIPT MEMORY ACCOUNTING ----------------
+# Guest transcripts live in process memory (st.session_state on the chatbot
+# page, chat_api's session store). Each chat turn reports its session's size
+# here so ops can see what guest sessions cost per app process.
+IDLE_SECONDS = 3600
+
+_lock = threading.Lock()
+_sessions = {}  # session_id -> {'source', 'messages', 'earlier', 'bytes', 'updated'}
+
+def transcript_bytes(messages: list) -> int:
+    """Approximate in-memory size of message dicts, their keys and values"""
+    total = 0
+    for message in messages:
+        total += sys.getsizeof(message)
+        for key, value in message.items():
+            total += sys.getsizeof(key) + sys.getsizeof(value)
+    return total
+
+def record(session_id: str, messages: list, earlier: list = (), source: str = "page"):
+    now = time.monotonic()
+    entry = {
+        'source': source,
+        'messages': len(messages),
+        'earlier': len(earlier),
+        'bytes': transcript_bytes(messages) + transcript_bytes(earlier),
+        'updated': now,
+    }
+    with _lock:
+        _sessions[session_id] = entry
+        for sid in [s for s, e in _sessions.items() if now - e['updated'] > IDLE_SECONDS]:
+            del _sessions[sid]
+
+def forget(session_id: str):
+    with _lock:
+        _sessions.pop(session_id, None)
+
+def get_session_memory_stats(top: int = 20) -> dict:
+    """Totals across sessions active in the last hour, plus the largest sessions"""
+    now = time.monotonic()
+    with _lock:
+        live = {sid: dict(e) for sid, e in _sessions.items() if now - e['updated'] <= IDLE_SECONDS}
+    largest = sorted(live.items(), key=lambda item: item[1]['bytes'], reverse=True)[:top]
+    return {
+        'sessions': len(live),
+        'messages': sum(e['messages'] + e['earlier'] for e in live.values()),
+        'bytes': sum(e['bytes'] for e in live.values()),
+        'max_bytes': max((e['bytes'] for e in live.values()), default=0),
+        'largest': [{'session_id': sid, **e, 'idle_seconds': round(now - e['updated'])} for sid, e in largest],
+    }
+
+def _collect_memory_metrics():
+    stats = get_session_memory_stats(top=0)
+    return [
+        ("guest_sessions_in_memory", "gauge", "Guest chat sessions active in the last hour", [({}, stats['sessions'])]),
+        ("guest_transcript_bytes", "gauge", "Approximate memory held by guest transcripts", [({}, stats['bytes'])]),
+    ]
+
+metrics.register_collector(_collect_memory_metrics)
@@ -0,0 +1,171 @@
+import math
+import re
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+import metrics
+from db import get_read_connection
+
+# ---------------- INVERTED INDEX ----------------
+# chat_messages.content is stored compressed (m0003) in a partitioned table
+# (m0002), and MySQL FULLTEXT supports neither. The write helpers add each
+# message's and unanswered question's terms to chat_search_terms (m0005)
+# instead: one row per (term, document) with the term's count, clustered by
+# term, so a search reads only the postings of its own terms.
+SOURCE_MESSAGE = "m"      # doc_id is chat_messages.id
+SOURCE_UNANSWERED = "q"   # doc_id is unanswered_questions.id
+MAX_TERM_LENGTH = 32
+MAX_QUERY_TERMS = 8
+POSTINGS_PER_TERM = 5000  # newest postings read per term; idf saturates beyond this
+POSTINGS_PER_STATEMENT = 500
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have how i if in is it its me my no not of on or our
+so that the their them then there these they this to was we were what when where which who why will with you your
+""".split())
+_TOKEN = re.compile(r"\w+")
+
+SEARCH_SECONDS = metrics.histogram("transcript_search_duration_seconds", "Transcript search latency")
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased words of at least 2 characters, minus stopwords, cut to MAX_TERM_LENGTH"""
+    if not text:
+        return []
+    return [t[:MAX_TERM_LENGTH] for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def posting_rows(source: str, doc_id: int, session_id: str, guideid: str, text: str, created_at=None) -> list[tuple]:
+    """(term, guideid, created_at, source, doc_id, session_id, tf) rows for one document"""
+    return [(term, guideid, created_at, source, doc_id, session_id, min(tf, 65535))
+            for term, tf in Counter(tokenize(text)).items()]
+
+def postings_statements(rows: list[tuple]) -> list[tuple[str, list]]:
+    """
+    Multi-row INSERT IGNORE statements for posting rows; indexing a document
+    twice is a no-op. A created_at of None means NOW() on the server, the same
+    clock as the document's own created_at default.
+    """
+    statements = []
+    for start in range(0, len(rows), POSTINGS_PER_STATEMENT):
+        values, params = [], []
+        for term, guideid, created_at, source, doc_id, session_id, tf in rows[start:start + POSTINGS_PER_STATEMENT]:
+            if created_at is None:
+                values.append("(%s, %s, NOW(), %s, %s, %s, %s)")
+                params += [term, guideid, source, doc_id, session_id, tf]
+            else:
+                values.append("(%s, %s, %s, %s, %s, %s, %s)")
+                params += [term, guideid, created_at, source, doc_id, session_id, tf]
+        statements.append((
+            "INSERT IGNORE INTO chat_search_terms (term, guideid, created_at, source, doc_id, session_id, tf) "
+            f"VALUES {', '.join(values)}",
+            params
+        ))
+    return statements
+
+def index_document(cursor, source: str, doc_id: int, session_id: str, guideid: str, text: str, created_at=None):
+    """Index one document on the cursor that just inserted it (commit with it)"""
+    for sql, params in postings_statements(posting_rows(source, doc_id, session_id, guideid, text, created_at)):
+        cursor.execute(sql, params)
+
+# ---------------- SEARCH ----------------
+def _postings(cursor, term: str, guideid: str, start: date, end: date, sources: tuple) -> list[dict]:
+    sql = "SELECT source, doc_id, session_id, guideid, created_at, tf FROM chat_search_terms WHERE term = %s"
+    params = [term]
+    if guideid:
+        sql += " AND guideid = %s"
+        params.append(guideid)
+    if start:
+        sql += " AND created_at >= %s"
+        params.append(datetime.combine(start, datetime.min.time()))
+    if end:
+        sql += " AND created_at < %s"
+        params.append(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if len(sources) == 1:
+        sql += " AND source = %s"
+        params.append(sources[0])
+    sql += " ORDER BY created_at DESC LIMIT %s"
+    params.append(POSTINGS_PER_TERM)
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+def _in_clause(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+def snippet(text: str, terms: list[str], width: int = 200) -> str:
+    """Window of `text` around the first query term, with the terms in bold"""
+    text = " ".join((text or "").split())
+    words = {m.group(0).lower(): m.start() for m in reversed(list(_TOKEN.finditer(text)))}
+    hits = [words[t] for t in terms if t in words]
+    begin = max(0, min(hits) - width // 3) if hits else 0
+    window = text[begin:begin + width]
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\b", re.IGNORECASE)
+    window = pattern.sub(lambda m: f"**{m.group(0)}**", window) if terms else window
+    return ("…" if begin else "") + window + ("…" if begin + width < len(text) else "")
+
+def search(query: str, guideid: str = None, start: date = None, end: date = None,
+           sources: tuple = (SOURCE_MESSAGE, SOURCE_UNANSWERED), limit: int = 50) -> dict:
+    """
+    Ranked matches for `query`. Documents containing more of the query terms
+    come first, then by tf-idf, then newest first. Returns {'results', 'terms',
+    'matched', 'truncated'}; each result carries the session for deep links.
+    """
+    started = time.perf_counter()
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return {'results': [], 'terms': [], 'matched': 0, 'truncated': False}
+
+    conn = get_read_connection()
+    try:
+        with conn.cursor() as cursor:
+            docs, truncated = {}, False
+            for term in terms:
+                postings = _postings(cursor, term, guideid, start, end, tuple(sources))
+                truncated = truncated or len(postings) >= POSTINGS_PER_TERM
+                idf = math.log(1 + POSTINGS_PER_TERM / max(len(postings), 1))
+                for p in postings:
+                    key = (p['source'], p['doc_id'])
+                    doc = docs.get(key)
+                    if doc is None:
+                        doc = docs[key] = {**p, 'matched': 0, 'score': 0.0}
+                    doc['matched'] += 1
+                    doc['score'] += (1 + math.log(p['tf'])) * idf
+            ranked = sorted(docs.values(), key=lambda d: (d['matched'], d['score'], d['created_at']), reverse=True)
+            top = ranked[:limit]
+            _hydrate(cursor, top, terms)
+    finally:
+        conn.close()
+    SEARCH_SECONDS.observe(time.perf_counter() - started)
+    return {'results': top, 'terms': terms, 'matched': len(docs), 'truncated': truncated}
+
+def _hydrate(cursor, results: list[dict], terms: list[str]):
+    """Add text, snippet, guidebook title and session start to the page of results"""
+    message_ids = [r['doc_id'] for r in results if r['source'] == SOURCE_MESSAGE]
+    question_ids = [r['doc_id'] for r in results if r['source'] == SOURCE_UNANSWERED]
+    texts = {}
+    if message_ids:
+        cursor.execute(f"SELECT id, role, content FROM chat_messages WHERE id IN ({_in_clause(message_ids)})",
+                       message_ids)
+        texts.update({(SOURCE_MESSAGE, r['id']): (r['role'], r['content']) for r in cursor.fetchall()})
+    if question_ids:
+        cursor.execute(f"SELECT id, user_question FROM unanswered_questions WHERE id IN ({_in_clause(question_ids)})",
+                       question_ids)
+        texts.update({(SOURCE_UNANSWERED, r['id']): ("user", r['user_question']) for r in cursor.fetchall()})
+
+    titles, starts = {}, {}
+    guideids = sorted({r['guideid'] for r in results})
+    if guideids:
+        cursor.execute(f"SELECT guideid, guidebook_title FROM guidebook_registration WHERE guideid IN ({_in_clause(guideids)})",
+                       guideids)
+        titles = {r['guideid']: r['guidebook_title'] for r in cursor.fetchall()}
+    session_ids = sorted({r['session_id'] for r in results})
+    if session_ids:
+        cursor.execute(f"SELECT session_id, session_start FROM chat_sessions WHERE session_id IN ({_in_clause(session_ids)})",
+                       session_ids)
+        starts = {r['session_id']: r['session_start'] for r in cursor.fetchall()}
+
+    for r in results:
+        # chat_archive.py deletes a month's postings before its messages; one archived
+        # since the postings were read is still in the session viewer
+        role, text = texts.get((r['source'], r['doc_id']), (None, None))
+        r['role'] = role
+        r['snippet'] = snippet(text, terms) if text is not None else "_(archived message)_"
+        r['guidebook_title'] = titles.get(r['guideid'], r['guideid'])
+        r['session_start'] = starts.get(r['session_id'])